@@ -1,10 +1,17 @@
 import os
+import asyncio
 import logging
-from fastapi import FastAPI, Request, Response, HTTPException, Form
+from fastapi import FastAPI, Request, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 import uvicorn
 from src.utils import setup_logging
+from src.limiter import OverloadedError
+from src.deadline import DeadlineExceededError
+from src.metrics import registry, rejections, start_metrics, CONTENT_TYPE
+from src.middleware import SecurityHeadersMiddleware, TraceMiddleware
+from src.responses import FastJSONResponse
 
 # Load environment variables
 load_dotenv()
@@ -17,7 +24,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="ZUS Coffee Chatbot API",
     description="A conversational AI chatbot for ZUS Coffee products and outlets",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson when installed; endpoints may also return pre-encoded bytes through it
+    default_response_class=FastJSONResponse
 )
 
 # CORS setup
@@ -30,15 +39,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response: Response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["Referrer-Policy"] = "no-referrer"
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=()"
-    return response
+# Security headers and tracing, as pure ASGI middleware; the last added runs outermost
+app.add_middleware(SecurityHeadersMiddleware, headers={
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "Referrer-Policy": "no-referrer",
+    "Permissions-Policy": "geolocation=(), microphone=()",
+})
+app.add_middleware(TraceMiddleware)
+
+# Shed load early instead of letting every request slow down together
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    logger.warning(f"Shedding request to {request.url.path}: {exc}")
+    rejections.inc("overloaded")
+    return FastJSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy. Please try again later."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# A request that ran out of its latency budget is a gateway timeout, not a busy server
+@app.exception_handler(DeadlineExceededError)
+async def deadline_handler(request: Request, exc: DeadlineExceededError):
+    logger.warning(f"Deadline exceeded for {request.url.path}: {exc}")
+    rejections.inc("deadline")
+    return FastJSONResponse(
+        status_code=504,
+        content={"detail": "The request could not be answered in time. Please try again."}
+    )
 
 # Global variables for models (will be initialized in startup)
 embedding_model = None
@@ -55,15 +84,26 @@ async def startup_event():
     
     try:
         # Import here to avoid circular imports
-        from src.vectorstore import initialize_vectorstore, get_openai_embedding
-        from src.openai_chain import initialize_chains
+        from src.vectorstore import initialize_vectorstore, aget_openai_embedding
+        from src.openai_chain import initialize_chains, create_query_plan_chain, use_http_clients
         from src.text2SQL import initialize_database
+        from src.preload import PRELOAD_ENABLED, load_shared_data
+        from src.http_clients import http_clients
+        
+        # Created here, in the worker, and shared by every OpenAI and Pinecone caller
+        logger.info("Starting pooled HTTP clients...")
+        http_clients.start()
+        use_http_clients(http_clients)
+        
+        if PRELOAD_ENABLED:
+            logger.info("Mapping shared data...")
+            await asyncio.to_thread(load_shared_data)
         
         logger.info("Initializing vector store...")
         pinecone_index = await initialize_vectorstore()
         
         logger.info("Initializing embedding model...")
-        embedding_model = get_openai_embedding
+        embedding_model = aget_openai_embedding
         
         logger.info("Initializing OpenAI chains...")
         product_summary_chain, outlet_write_query_chain, outlet_summary_chain, intent_chain = await initialize_chains()
@@ -80,15 +120,38 @@ async def startup_event():
             outlet_summary_chain, 
             pinecone_index, 
             outlets_sql_db,
-            intent_chain
+            intent_chain,
+            create_query_plan_chain()
         )
         
+        start_metrics()
+
         logger.info("All components initialized successfully!")
         
+        # After readiness: popular queries are answered into the caches while real traffic is already served
+        from src.cache_warmer import WARMER_ENABLED, DATA_CHECK_INTERVAL, cache_warmer
+        from src.router import warm_chat_cache, reload_data
+        if WARMER_ENABLED:
+            cache_warmer.start(warm_chat_cache, reload_data, DATA_CHECK_INTERVAL)
+        
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop cache warm-up, write out queued sessions, query log records and spans, and close pooled connections"""
+    from src.cache_warmer import cache_warmer
+    from src.http_clients import http_clients
+    from src.session_store import session_store
+    from src.query_log import query_log
+    from src.tracing import exporter
+    await cache_warmer.stop()
+    for writer in (session_store, query_log, exporter):
+        if writer is not None:
+            await asyncio.to_thread(writer.close)
+    await http_clients.aclose()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -98,6 +161,12 @@ async def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    # Reading the other workers' snapshots is file I/O, so keep it off the event loop
+    return PlainTextResponse(await asyncio.to_thread(registry.render), media_type=CONTENT_TYPE)
+
 # Include router
 from src.router import router
 app.include_router(router, prefix="/api/v1")
@@ -105,11 +174,19 @@ app.include_router(router, prefix="/api/v1")
 if __name__ == "__main__":
     # Get port from environment variable (for Render)
     port = int(os.environ.get("PORT", 8000))
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    
+    if workers > 1:
+        from src.preload import PRELOAD_ENABLED, build_shared_data
+        if PRELOAD_ENABLED:
+            # Built once here, then mapped by every worker instead of each parsing the data itself
+            build_shared_data()
     
     # Run the application
     uvicorn.run(
         "app:app",
         host="0.0.0.0",  # Bind to all interfaces
         port=port,
+        workers=workers,
         reload=False  # Disable reload in production
     )
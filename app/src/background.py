@@ -0,0 +1,96 @@
+import os
+import abc
+import time
+import queue
+import logging
+import threading
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Queued by close(); the worker writes what came before it and exits
+_CLOSE = object()
+
+
+class BackgroundWriter(abc.ABC):
+    """Hands items to a background thread that writes them in batches, off the request path.
+
+    Items queue up to `max_queue`; beyond that they are dropped and counted
+    rather than slowing requests down. Subclasses implement `write_batch`.
+    `close` writes out whatever is still queued, for shutdown.
+    """
+
+    def __init__(self, name: str, max_queue: int = 1000, batch_size: int = 64, flush_interval: float = 2.0):
+        self.name = name
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def _ensure_worker(self):
+        # Started lazily, and again in a forked worker, since threads do not survive fork
+        if self._thread is None or self._pid != os.getpid():
+            self._queue = queue.Queue(self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item: Any):
+        if self._closed:
+            self.dropped += 1
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is _CLOSE:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self.write_batch(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"[{self.name}] Writing {len(batch)} items failed: {e}")
+
+    def close(self, timeout: float = 5.0):
+        """Write out the queued items and stop the worker, waiting at most `timeout` seconds; blocking"""
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"[{self.name}] Queue still full at shutdown; {self._queue.qsize()} items not written")
+            return
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"[{self.name}] Not drained within {timeout}s at shutdown")
+
+    @abc.abstractmethod
+    def write_batch(self, batch: List[Any]):
+        """Write one batch of submitted items"""
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "dropped": self.dropped}
@@ -0,0 +1,124 @@
+import time
+import glob
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .utils import load_config, normalize_prompt
+from .scheduler import current_user
+from .query_log import query_log_config, rotated_files, read_records
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+warmer_config = config.get("cache_warmer", {})
+WARMER_ENABLED = warmer_config.get("enabled", True)
+WARM_TOP_N = warmer_config.get("top_n", 25)
+WARM_CONCURRENCY = warmer_config.get("concurrency", 2)
+WARM_MIN_COUNT = warmer_config.get("min_count", 2)
+WARM_QUERIES = warmer_config.get("queries", [])
+WARM_LOG_FILES = warmer_config.get("log_files", 3)
+DATA_CHECK_INTERVAL = warmer_config.get("data_check_interval", 60.0)
+WarmOne = Callable[[str], Awaitable[str]]
+# Warm-up runs as its own user, so the fair scheduler keeps it from crowding out real traffic
+WARMER_USER = "system:cache-warmer"
+
+
+def popular_queries(paths: List[str], top_n: int, min_count: int = 2) -> List[str]:
+    """The most frequent answered /chat prompts in query logs, most frequent first"""
+    counts: Counter = Counter()
+    examples: Dict[str, str] = {}
+    for record in read_records(paths):
+        prompt = record.get("prompt")
+        # Follow-ups depend on a conversation and answers to them are cached under the rewritten question
+        if record.get("endpoint") != "chat" or record.get("status") != 200 or not prompt or record.get("follow_up"):
+            continue
+        key = normalize_prompt(prompt)
+        counts[key] += 1
+        examples.setdefault(key, prompt)
+    return [examples[key] for key, count in counts.most_common(top_n) if count >= min_count]
+
+
+def warm_up_queries(top_n: int = WARM_TOP_N) -> List[str]:
+    """Curated queries from config first, then the most popular logged ones, without duplicates"""
+    path = query_log_config.get("path", "logs/queries.jsonl.gz")
+    paths = (rotated_files(path) + glob.glob(path))[-WARM_LOG_FILES:] if WARM_LOG_FILES else []
+    try:
+        logged = popular_queries(paths, top_n, WARM_MIN_COUNT)
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning(f"[CacheWarmer] Could not read query logs: {e}")
+        logged = []
+    queries, seen = [], set()
+    for prompt in list(WARM_QUERIES) + logged:
+        key = normalize_prompt(prompt)
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(prompt)
+    return queries[:top_n]
+
+
+class CacheWarmer:
+    """Pre-populates the answer, plan and embedding caches by answering popular queries in the background.
+
+    `warm_one(prompt)` answers one prompt through the normal pipeline and
+    returns "warmed", "cached" (it already was) or "skipped" (the answer is
+    not cacheable). At most `concurrency` run at once. `watch` re-warms
+    whenever `reload()` reports that the product or outlet data changed.
+    """
+
+    def __init__(self, concurrency: int = 2):
+        self.concurrency = concurrency
+        self.progress: Dict[str, Any] = {"status": "not started"}
+        self._task: Optional[asyncio.Task] = None
+
+    async def warm(self, warm_one: WarmOne, queries: List[str], reason: str = "startup"):
+        current_user.set(WARMER_USER)
+        progress = self.progress = {"status": "running", "reason": reason, "total": len(queries), "done": 0,
+                                    "warmed": 0, "cached": 0, "skipped": 0, "failed": 0, "started_at": time.time()}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(prompt: str):
+            async with semaphore:
+                try:
+                    progress[await warm_one(prompt)] += 1
+                except Exception as e:
+                    progress["failed"] += 1
+                    logger.warning(f"[CacheWarmer] Warming {prompt!r} failed: {e}")
+                progress["done"] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(prompt) for prompt in queries))
+        progress["duration_s"] = round(time.perf_counter() - start, 3)
+        progress["status"] = "done"
+        logger.info(f"[CacheWarmer] Warmed {progress['warmed']} of {len(queries)} queries "
+                    f"({progress['failed']} failed) in {progress['duration_s']}s")
+
+    async def watch(self, warm_one: WarmOne, reload: Callable[[], Awaitable[bool]],
+                    interval: float = 60.0):
+        await self.warm(warm_one, await asyncio.to_thread(warm_up_queries))
+        while interval:
+            await asyncio.sleep(interval)
+            try:
+                changed = await reload()
+            except Exception as e:
+                logger.error(f"[CacheWarmer] Reloading changed data failed: {e}")
+                continue
+            if changed:
+                await self.warm(warm_one, await asyncio.to_thread(warm_up_queries), reason="data changed")
+
+    def start(self, warm_one: WarmOne, reload: Callable[[], Awaitable[bool]],
+              interval: float = 60.0) -> asyncio.Task:
+        self._task = asyncio.create_task(self.watch(warm_one, reload, interval))
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.progress)
+
+
+cache_warmer = CacheWarmer(WARM_CONCURRENCY)
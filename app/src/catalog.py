@@ -0,0 +1,187 @@
+import sys
+import math
+import hashlib
+import logging
+import numpy as np
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from .shared_data import TextColumn, write_array_file, read_array_file
+
+logger = logging.getLogger(__name__)
+
+# Few distinct values: stored once each and referenced by small integer codes
+CATEGORICAL_COLUMNS = ("category_title", "color")
+TEXT_COLUMNS = ("name", "image", "description")
+
+
+def _text(value: Any) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    value = str(value)
+    return "" if value.lower() == "nan" else value
+
+
+def _number(value: Any) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+
+def product_ids(products: List[Dict[str, Any]]) -> List[str]:
+    """Vector ids derived from each product's name and category, so they survive reordering and edits.
+
+    Products that share both get a numbered suffix in file order.
+    """
+    ids, seen = [], {}
+    for product in products:
+        key = f"{_text(product.get('category_title')).strip().lower()}|{_text(product.get('name')).strip().lower()}"
+        pid = "prod-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        seen[pid] = seen.get(pid, 0) + 1
+        ids.append(pid if seen[pid] == 1 else f"{pid}-{seen[pid]}")
+    return ids
+
+
+class CatalogColumns(NamedTuple):
+    """Every column of one catalog version"""
+    ids: List[str]
+    rows: Dict[str, int]
+    price: np.ndarray
+    text: Dict[str, Any]
+    codes: Dict[str, np.ndarray]
+    values: Dict[str, List[str]]
+
+
+class ProductCatalog:
+    """Read-only, column-oriented product catalog that vector matches are hydrated from by id.
+
+    Prices are a float64 array, low-cardinality columns are dictionary
+    encoded (one interned string per distinct value plus a code array), and
+    the free-text columns are plain lists, so each product field exists once
+    per worker rather than once per row dict and again in the vector index.
+    A catalog saved with `save` and opened with `load` is memory-mapped, so
+    the columns exist once per host however many workers read them.
+
+    `build` and `load` prepare a complete `CatalogColumns` and swap it in as
+    one reference, so a request reading during a reload sees either the old
+    catalog or the new one, never a mix of the two.
+    """
+
+    def __init__(self, columns: Optional[CatalogColumns] = None):
+        self._columns = columns or CatalogColumns(
+            [], {}, np.zeros(0, dtype=np.float64), {column: [] for column in TEXT_COLUMNS}, {},
+            {column: [] for column in CATEGORICAL_COLUMNS})
+
+    @property
+    def ids(self) -> List[str]:
+        return self._columns.ids
+
+    @property
+    def price(self) -> np.ndarray:
+        return self._columns.price
+
+    def snapshot(self) -> "ProductCatalog":
+        """A catalog fixed at the current version, unaffected by later reloads of this one"""
+        return ProductCatalog(self._columns)
+
+    def build(self, products: Iterable[Dict[str, Any]]):
+        products = list(products)
+        ids = product_ids(products)
+        codes, values = {}, {}
+        for column in CATEGORICAL_COLUMNS:
+            lookup: Dict[str, int] = {}
+            column_codes = [lookup.setdefault(sys.intern(_text(p.get(column))), len(lookup)) for p in products]
+            values[column] = list(lookup)
+            codes[column] = np.array(column_codes, dtype=np.uint16 if len(lookup) < 2 ** 16 else np.uint32)
+        self._columns = CatalogColumns(
+            ids=ids,
+            rows={pid: row for row, pid in enumerate(ids)},
+            price=np.array([_number(p.get("price")) for p in products], dtype=np.float64),
+            text={column: [_text(p.get(column)) for p in products] for column in TEXT_COLUMNS},
+            codes=codes,
+            values=values,
+        )
+        logger.info(f"[Catalog] {len(ids)} products, {self.memory_bytes() / 1024:.0f} KiB")
+
+    def save(self, path: str):
+        columns = self._columns
+        sections = {"price": columns.price}
+        for column in ("ids",) + TEXT_COLUMNS:
+            strings = columns.ids if column == "ids" else columns.text[column]
+            sections[f"{column}.data"], sections[f"{column}.offsets"] = TextColumn.encode(strings)
+        for column in CATEGORICAL_COLUMNS:
+            sections[f"{column}.codes"] = columns.codes[column]
+        write_array_file(path, "catalog", {"values": columns.values}, sections)
+
+    def load(self, path: str):
+        """Replace the contents with a saved catalog, memory-mapped read-only"""
+        header, sections = read_array_file(path, "catalog")
+        text = {column: TextColumn(sections[f"{column}.data"], sections[f"{column}.offsets"])
+                for column in ("ids",) + TEXT_COLUMNS}
+        # Ids are looked up by every query and are short, so they are decoded once into a dict
+        ids = text.pop("ids").tolist()
+        self._columns = CatalogColumns(
+            ids=ids,
+            rows={pid: row for row, pid in enumerate(ids)},
+            price=sections["price"],
+            text=text,
+            codes={column: sections[f"{column}.codes"] for column in CATEGORICAL_COLUMNS},
+            values={column: [sys.intern(v) for v in header["values"][column]] for column in CATEGORICAL_COLUMNS},
+        )
+        logger.info(f"[Catalog] Mapped {len(ids)} products from {path}")
+
+    def __len__(self) -> int:
+        return len(self._columns.ids)
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self._columns.rows
+
+    @staticmethod
+    def _record(columns: CatalogColumns, row: int) -> Dict[str, Any]:
+        # .item() returns plain Python scalars, much faster than indexing into numpy scalars
+        return {
+            "name": columns.text["name"][row],
+            "category_title": columns.values["category_title"][columns.codes["category_title"].item(row)],
+            "image": columns.text["image"][row],
+            "price": columns.price.item(row),
+            "color": columns.values["color"][columns.codes["color"].item(row)],
+            "description": columns.text["description"][row],
+        }
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """One product as a plain dict, in the shape load_product_data returns"""
+        return self._record(self._columns, row)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        columns = self._columns
+        for row in range(len(columns.ids)):
+            yield self._record(columns, row)
+
+    def product(self, row: int, score: float) -> Dict[str, Any]:
+        """A search result for a row, in the shape the summary chains and templates expect"""
+        product = self.record(row)
+        product["score"] = score
+        return product
+
+    def get(self, pid: str, score: float) -> Optional[Dict[str, Any]]:
+        columns = self._columns
+        row = columns.rows.get(pid)
+        if row is None:
+            return None
+        product = self._record(columns, row)
+        product["score"] = score
+        return product
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: arrays, strings and the containers holding them"""
+        columns = self._columns
+        size = columns.price.nbytes + sum(codes.nbytes for codes in columns.codes.values())
+        size += sys.getsizeof(columns.ids) + sum(sys.getsizeof(pid) for pid in columns.ids) + sys.getsizeof(columns.rows)
+        for strings in list(columns.text.values()) + list(columns.values.values()):
+            # Mapped columns live in the shared page cache, not in this worker
+            if isinstance(strings, list):
+                size += sys.getsizeof(strings) + sum(sys.getsizeof(s) for s in strings)
+        return size
+
+
+product_catalog = ProductCatalog()
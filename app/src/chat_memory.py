@@ -0,0 +1,264 @@
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, NamedTuple, Optional
+from .utils import load_config, UNAUTHENTICATED_USER
+from .context_builder import count_tokens
+from .session_store import SessionStore, session_store, encode_session, decode_session, LOCAL_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+memory_config = config.get("chat_memory", {})
+# Turns kept verbatim per session; older ones are folded into the rolling summary
+CHAT_MEMORY_WINDOW = memory_config.get("window_size", 5)
+HISTORY_TOKENS = memory_config.get("max_history_tokens", 400)
+SUMMARY_TOKENS = memory_config.get("summary_tokens", 120)
+ANSWER_ENTITIES = memory_config.get("answer_entities", 5)
+SESSION_TTL_SECONDS = memory_config.get("session_ttl_seconds", 1800)
+MAX_SESSIONS = memory_config.get("max_sessions", 10000)
+MAX_TOTAL_TOKENS = memory_config.get("max_total_tokens", 2000000)
+
+# Pronouns and phrases that only make sense with an earlier turn ("which of those open late?").
+# Words common in standalone questions ("it", "there", "more", "first") are left out: a false match
+# costs a rewrite call before every such question.
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(those|these|them|they|their"
+    r"|(?:that|this|which|either|the|a|an|any) (?:(?:first|second|third|last|other|same|previous|cheaper|cheapest"
+    r"|bigger|smaller|larger) )?ones?"
+    r"|the (?:above|previous|same|latter|former)|any others?|anything else|what about|how about"
+    r"|same (?:one|ones|outlet|product|thing)|both of (?:them|those))\b",
+    re.IGNORECASE,
+)
+
+
+class Turn(NamedTuple):
+    question: str
+    answer: str
+    tokens: int
+
+
+class Session:
+    __slots__ = ("turns", "summary", "summary_tokens", "tokens", "last_used", "revision", "synced_at")
+
+    def __init__(self, revision: int = 0, summary: str = "", turns=()):
+        self.turns: deque = deque(Turn(*turn) for turn in turns)
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary) if summary else 0
+        self.tokens = self.summary_tokens + sum(turn.tokens for turn in self.turns)
+        self.last_used = time.monotonic()
+        # Bumped on every turn, so a worker only replaces its copy with a newer one from the shared tier
+        self.revision = revision
+        self.synced_at = self.last_used
+
+    def render(self) -> str:
+        lines = [f"Earlier: {self.summary}"] if self.summary else []
+        for turn in self.turns:
+            lines.append(f"User: {turn.question}")
+            lines.append(f"Assistant: {turn.answer}")
+        return "\n".join(lines)
+
+
+def compact_answer(response: Any) -> str:
+    """What a follow-up can refer to: the intent and the names of what was returned, not the prose"""
+    if hasattr(response, "retrieved_products"):
+        names = [p.get("name", "") for p in response.retrieved_products]
+        kind = "products"
+    elif hasattr(response, "executed_sql_result"):
+        names = [r.get("name", "") for r in response.executed_sql_result]
+        kind = "outlets"
+    elif isinstance(response, dict):
+        return " ".join(str(response.get("message", "")).split())
+    else:
+        return ""
+    names = [str(name) for name in names if name]
+    if not names:
+        return f"no matching {kind}"
+    shown = ", ".join(names[:ANSWER_ENTITIES])
+    more = f" (+{len(names) - ANSWER_ENTITIES} more)" if len(names) > ANSWER_ENTITIES else ""
+    return f"{kind}: {shown}{more}"
+
+
+def _trim_front(text: str, max_tokens: int) -> str:
+    """Keep the newest end of a rolling summary within max_tokens"""
+    while text and count_tokens(text) > max_tokens:
+        cut = text.find("; ")
+        text = text[cut + 2:] if cut >= 0 else ""
+    return text
+
+
+class ConversationMemory:
+    """Per-session ring buffer of recent turns with a rolling summary, bounded per session and in total.
+
+    Each session keeps at most `window_size` turns and `max_history_tokens`
+    of rendered history; turns pushed out are folded into a short extractive
+    summary. Sessions idle for `ttl` are dropped, and the least recently
+    used ones go first once `max_sessions` or `max_total_tokens` is reached.
+
+    This is the in-process LRU tier. With a `store`, every turn is also saved
+    to the shared tier behind it, and a local copy older than `local_ttl` is
+    refreshed from there, so sessions survive restarts and move between workers.
+    """
+
+    def __init__(self, window_size: int = 5, max_history_tokens: int = 400, summary_tokens: int = 120,
+                 ttl: float = 1800, max_sessions: int = 10000, max_total_tokens: int = 2000000,
+                 store: Optional[SessionStore] = None, local_ttl: float = 2.0):
+        self.window_size = window_size
+        self.max_history_tokens = max_history_tokens
+        self.summary_tokens = summary_tokens
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.store = store
+        self.local_ttl = local_ttl
+        self.total_tokens = 0
+        self.evicted = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled_for(session_id: str) -> bool:
+        # Anonymous requests all share one session id, so they must not share memory
+        return bool(session_id) and session_id != UNAUTHENTICATED_USER
+
+    def history(self, session_id: str) -> str:
+        """Compact rendering of a session's history, or "" for a new or expired session"""
+        if not self.window_size or not self.enabled_for(session_id):
+            return ""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return ""
+            if now - session.last_used > self.ttl:
+                self._drop(session_id)
+                return ""
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session.render()
+
+    async def ahistory(self, session_id: str) -> str:
+        """history(), first refreshing a missing or stale local copy from the shared tier"""
+        if not self.window_size or not self.enabled_for(session_id):
+            return ""
+        if self.store is not None:
+            session = self._sessions.get(session_id)
+            if session is None or time.monotonic() - session.synced_at > self.local_ttl:
+                blob = await asyncio.to_thread(self.store.load, session_id)
+                self._install(session_id, blob)
+        return self.history(session_id)
+
+    def _install(self, session_id: str, blob: Optional[bytes]):
+        try:
+            loaded = Session(*decode_session(blob)) if blob else None
+        except Exception as e:
+            logger.warning(f"[Memory] Ignoring an unreadable stored session: {e}")
+            loaded = None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if loaded is not None and (session is None or loaded.revision > session.revision):
+                if session is not None:
+                    self.total_tokens -= session.tokens
+                self._sessions[session_id] = session = loaded
+                self.total_tokens += loaded.tokens
+                self._sessions.move_to_end(session_id)
+                self._evict()
+            if session is not None:
+                session.synced_at = time.monotonic()
+
+    def add_turn(self, session_id: str, question: str, answer: str):
+        if not self.window_size or not self.enabled_for(session_id):
+            return
+        question = " ".join(question.split())
+        turn = Turn(question, answer, count_tokens(f"User: {question}\nAssistant: {answer}"))
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session()
+            session.turns.append(turn)
+            session.tokens += turn.tokens
+            self.total_tokens += turn.tokens
+            self._roll_up(session)
+            session.revision += 1
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            if self.store is not None:
+                blob = encode_session(session.revision, session.summary, session.turns)
+        if self.store is not None:
+            self.store.save(session_id, blob, self.ttl)
+
+    def _roll_up(self, session: Session):
+        """Fold the oldest turns into the summary until the window and token budget are met"""
+        while len(session.turns) > 1 and (
+                len(session.turns) > self.window_size or session.tokens > self.max_history_tokens):
+            oldest = session.turns.popleft()
+            session.tokens -= oldest.tokens
+            self.total_tokens -= oldest.tokens
+            entry = f"{oldest.question} -> {oldest.answer}"
+            summary = _trim_front(f"{session.summary}; {entry}" if session.summary else entry, self.summary_tokens)
+            tokens = count_tokens(summary) if summary else 0
+            self.total_tokens += tokens - session.summary_tokens
+            session.tokens += tokens - session.summary_tokens
+            session.summary, session.summary_tokens = summary, tokens
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self.total_tokens -= session.tokens
+        self.evicted += 1
+
+    def _evict(self):
+        now = time.monotonic()
+        # Least recently used first, so expired sessions are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            over_cap = len(self._sessions) > self.max_sessions or self.total_tokens > self.max_total_tokens
+            if not over_cap and now - session.last_used <= self.ttl:
+                break
+            self._drop(session_id)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self.total_tokens = 0
+
+    def stats(self) -> Dict[str, object]:
+        stats = {"sessions": len(self._sessions), "tokens": self.total_tokens, "evicted": self.evicted}
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        return stats
+
+
+conversation_memory = ConversationMemory(
+    window_size=CHAT_MEMORY_WINDOW,
+    max_history_tokens=HISTORY_TOKENS,
+    summary_tokens=SUMMARY_TOKENS,
+    ttl=SESSION_TTL_SECONDS,
+    max_sessions=MAX_SESSIONS,
+    max_total_tokens=MAX_TOTAL_TOKENS,
+    store=session_store,
+    local_ttl=LOCAL_TTL_SECONDS,
+)
+
+
+def is_follow_up(prompt: str) -> bool:
+    return bool(FOLLOW_UP_PATTERN.search(prompt))
+
+
+async def resolve_follow_up(prompt: str, history: str) -> str:
+    """Rewrite a follow-up as a standalone question; the history goes to this chain only"""
+    from .limiter import OverloadedError
+    from .resilience import with_timeout
+    try:
+        from .openai_chain import create_follow_up_chain
+        chain = create_follow_up_chain()
+        result = await with_timeout("follow_up", chain.ainvoke({"history": history, "question": prompt}))
+        return " ".join(str(result).split()).strip('"') or prompt
+    except OverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"[Memory] Resolving follow-up failed, answering it as asked: {e}")
+        return prompt
@@ -0,0 +1,191 @@
+import re
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+import tiktoken
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+budget_config = config.get("context_budget", {})
+CHAIN_BUDGETS = {
+    "product_summary": budget_config.get("product_summary", 1200),
+    "outlet_summary": budget_config.get("outlet_summary", 1500),
+}
+SNIPPET_TOKENS = budget_config.get("snippet_tokens", 60)
+MODEL_NAME = config.get("models", {}).get("llm_model", {}).get("name", "gpt-4o")
+
+DAY_ABBREVIATIONS = {
+    "Monday": "Mon", "Tuesday": "Tue", "Wednesday": "Wed", "Thursday": "Thu",
+    "Friday": "Fri", "Saturday": "Sat", "Sunday": "Sun",
+}
+
+# Question keywords that make an outlet column worth sending to the summary chain
+OUTLET_COLUMN_KEYWORDS = {
+    "opens_at": ("open", "close", "hour", "time", "late", "early", "am", "pm", "24"),
+    "services": ("service", "delivery", "pickup", "pick-up", "drive", "dine", "takeaway", "kerbside"),
+    "reviews_average": ("review", "rating", "rated", "best", "star", "popular"),
+    "reviews_count": ("review", "popular", "busiest"),
+    "phone_number": ("phone", "call", "contact", "number"),
+    "place_type": ("type", "mall", "restaurant", "shop", "cafe"),
+    "link": ("map", "link", "direction", "google"),
+}
+ALWAYS_OUTLET_COLUMNS = ("name", "address")
+
+# Running totals of prompt tokens saved, per chain
+context_stats = {chain: {"requests": 0, "tokens_saved": 0} for chain in CHAIN_BUDGETS}
+
+# Description -> snippet, filled from the product catalog at load time
+snippet_cache: Dict[str, str] = {}
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.encoding_for_model(MODEL_NAME)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+
+def make_snippet(description: str, max_tokens: int = SNIPPET_TOKENS) -> str:
+    """Cut a description to at most max_tokens, ending on a sentence boundary where possible"""
+    description = " ".join(str(description or "").split())
+    tokens = _encoding().encode(description)
+    if len(tokens) <= max_tokens:
+        return description
+    head = _encoding().decode(tokens[:max_tokens])
+    cut = max(head.rfind(". "), head.rfind("! "), head.rfind("? "))
+    if cut > len(head) // 2:
+        return head[:cut + 1]
+    return head.rstrip() + "..."
+
+
+def precompute_snippets(products: Iterable[Dict[str, Any]]):
+    """Build snippets for every catalog description once, off the request path"""
+    for product in products:
+        description = product.get("description")
+        if isinstance(description, str) and description not in snippet_cache:
+            snippet_cache[description] = make_snippet(description)
+    logger.info(f"Precomputed {len(snippet_cache)} product description snippets")
+
+
+def get_snippet(description: str) -> str:
+    snippet = snippet_cache.get(description)
+    if snippet is None:
+        snippet = make_snippet(description)
+        snippet_cache[description] = snippet
+    return snippet
+
+
+def compact_opening_hours(opens_at: str) -> str:
+    """Collapse "Monday, 8am–9pm, Tuesday, 8am–9pm, ..." into "Mon–Sun 8am–9pm"."""
+    parts = [p.strip() for p in str(opens_at or "").split(",")]
+    if len(parts) < 2 or len(parts) % 2 or parts[0] not in DAY_ABBREVIATIONS:
+        return str(opens_at or "")
+    groups: List[List[str]] = []
+    for day, hours in zip(parts[::2], parts[1::2]):
+        day = DAY_ABBREVIATIONS.get(day, day)
+        if groups and groups[-1][2] == hours:
+            groups[-1][1] = day
+        else:
+            groups.append([day, day, hours])
+    return "; ".join(
+        f"{start} {hours}" if start == end else f"{start}–{end} {hours}"
+        for start, end, hours in groups
+    )
+
+
+def select_outlet_columns(question: str, sql_query: str, available) -> List[str]:
+    """Columns the summary needs: name/address, plus any the question or the SQL filter refers to"""
+    text = question.lower()
+    words = set(re.findall(r"[a-z0-9\-]+", text))
+    sql = (sql_query or "").lower()
+    where_clause = sql.split("where", 1)[1] if "where" in sql else ""
+    selected = [c for c in ALWAYS_OUTLET_COLUMNS if c in available]
+    for column, keywords in OUTLET_COLUMN_KEYWORDS.items():
+        if column not in available or column in selected:
+            continue
+        mentioned = any((kw in words) if len(kw) <= 3 else (kw in text) for kw in keywords)
+        if mentioned or column in where_clause:
+            selected.append(column)
+    # Computed columns such as COUNT(*) or aliases are always relevant
+    known = set(OUTLET_COLUMN_KEYWORDS) | set(ALWAYS_OUTLET_COLUMNS) | {"id"}
+    selected += [c for c in available if c not in known]
+    return selected
+
+
+def _record(chain: str, full_chars: int, context: str, used_tokens: int):
+    # Tokenizing the raw input only to report the savings would cost more than building the context,
+    # so its size is estimated at the context's own characters per token
+    full_tokens = round(full_chars * used_tokens / max(1, len(context)))
+    saved = max(0, full_tokens - used_tokens)
+    stats = context_stats.setdefault(chain, {"requests": 0, "tokens_saved": 0})
+    stats["requests"] += 1
+    stats["tokens_saved"] += saved
+    logger.info(f"[Context] {chain}: {used_tokens} prompt tokens ({saved} saved)")
+
+
+def _fill_budget(docs: List[str], separator: str, budget: int) -> Tuple[List[str], int]:
+    """Keep documents in rank order until the token budget is reached (always at least one)"""
+    kept, used = [], 0
+    sep_tokens = count_tokens(separator)
+    for doc in docs:
+        cost = count_tokens(doc) + (sep_tokens if kept else 0)
+        if kept and used + cost > budget:
+            break
+        kept.append(doc)
+        used += cost
+    return kept, used
+
+
+def build_product_context(question: str, products: List[Dict[str, Any]], budget: int = None) -> str:
+    """Context for product_summary_chain within its token budget"""
+    budget = budget or CHAIN_BUDGETS["product_summary"]
+    separator = "\n\n---\n\n"
+    full_docs, docs = [], []
+    for product in products:
+        fields = (
+            f"Product Name: {product['name']}\n"
+            f"Category: {product['category_title']}\n"
+            f"Colors Available: {product['color']}\n"
+            f"Price: {product['price']}\n"
+        )
+        full_docs.append(fields + f"Description Snippet: {product.get('description', '')}")
+        docs.append(fields + f"Description Snippet: {get_snippet(product.get('description', ''))}")
+    kept, used = _fill_budget(docs, separator, budget)
+    if len(kept) < len(docs):
+        kept.append(f"(+{len(docs) - len(kept)} more products not shown)")
+    context = separator.join(kept)
+    full_chars = sum(len(doc) for doc in full_docs) + len(separator) * (len(full_docs) - 1)
+    _record("product_summary", full_chars, context, used)
+    return context
+
+
+def build_outlet_context(question: str, sql_query: str, rows: List[Dict[str, Any]], budget: int = None) -> str:
+    """Compact, column-projected rendering of SQL rows for outlet_summary_chain"""
+    budget = budget or CHAIN_BUDGETS["outlet_summary"]
+    if not rows:
+        return "[]"
+    columns = select_outlet_columns(question, sql_query, list(rows[0].keys()))
+    lines = []
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row.get(column)
+            if value is None or str(value) in ("", "nan"):
+                continue
+            if column == "opens_at":
+                value = compact_opening_hours(value)
+            values.append(f"{column}: {value}")
+        lines.append("- " + " | ".join(values))
+    kept, used = _fill_budget(lines, "\n", budget)
+    if len(kept) < len(lines):
+        kept.append(f"(+{len(lines) - len(kept)} more outlets not shown)")
+    context = "\n".join(kept)
+    _record("outlet_summary", len(str(rows)), context, used)
+    return context
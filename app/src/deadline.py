@@ -0,0 +1,102 @@
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+from fastapi import Request
+from .utils import load_config
+from .limiter import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+deadline_config = config.get("deadline", {})
+DEADLINE_HEADER = deadline_config.get("header", "X-Request-Timeout-Ms")
+DEFAULT_BUDGET = deadline_config.get("default_budget_ms", 25000) / 1000
+MAX_BUDGET = deadline_config.get("max_budget_ms", 60000) / 1000
+# Below these remaining budgets a stage switches to its cheaper strategy
+MIN_LLM_INTENT_BUDGET = deadline_config.get("min_llm_intent_ms", 6000) / 1000
+MIN_LLM_SUMMARY_BUDGET = deadline_config.get("min_llm_summary_ms", 4000) / 1000
+
+# Absolute time.monotonic() deadline of the current request, and the time each stage took
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+# Stages that fell back to a cheaper strategy; such answers are not cached
+degraded_stages: ContextVar[Optional[Set[str]]] = ContextVar("degraded_stages", default=None)
+
+
+class DeadlineExceededError(OverloadedError):
+    """The request ran out of its latency budget"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def has_budget(seconds: float) -> bool:
+    """Whether at least `seconds` of the request's budget are left"""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def check_deadline(stage: str):
+    """Abort before starting a stage the request no longer has time for"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceededError(f"deadline passed before {stage}")
+
+
+def start_request(budget: Optional[float] = None) -> Dict[str, float]:
+    """Set the deadline for the current request and start a fresh timing record"""
+    budget = DEFAULT_BUDGET if budget is None else budget
+    request_deadline.set(time.monotonic() + min(budget, MAX_BUDGET) if budget > 0 else None)
+    timings = {}
+    stage_timings.set(timings)
+    degraded_stages.set(set())
+    return timings
+
+
+def degrade(stage: str):
+    """Record that a stage switched to its cheaper strategy to meet the deadline"""
+    logger.info(f"[Deadline] {remaining():.2f}s left, using the cheaper {stage} strategy")
+    stages = degraded_stages.get()
+    if stages is not None:
+        stages.add(stage)
+
+
+def is_degraded() -> bool:
+    return bool(degraded_stages.get())
+
+
+@contextmanager
+def timed(stage: str):
+    """Add the wall time of a block to the current request's stage timings"""
+    check_deadline(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+async def get_request_deadline(request: Request) -> Dict[str, float]:
+    """Dependency: start the request's deadline from the header or the configured default"""
+    budget = None
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            budget = float(header) / 1000
+        except ValueError:
+            logger.warning(f"[Deadline] Ignoring invalid {DEADLINE_HEADER} header: {header!r}")
+    return start_request(budget)
@@ -0,0 +1,240 @@
+import re
+import csv
+import math
+import logging
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+POSTCODE_PATTERN = re.compile(r"\b(\d{5})\b")
+# Google Maps URLs carry the place as "@lat,lng", "!3dlat!4dlng" or a "q=lat,lng" parameter
+LINK_PATTERNS = (
+    re.compile(r"!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)"),
+    re.compile(r"@(-?\d+\.\d+),(-?\d+\.\d+)"),
+    re.compile(r"[?&](?:q|query|ll|center)=(-?\d+\.\d+),\s*(-?\d+\.\d+)"),
+)
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points"""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def coordinates_from_link(link: Any) -> Optional[Tuple[float, float]]:
+    """Latitude and longitude in a Google Maps URL, or None (short maps.app.goo.gl links carry none)"""
+    for pattern in LINK_PATTERNS:
+        match = pattern.search(str(link or ""))
+        if match:
+            lat, lng = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                return lat, lng
+    return None
+
+
+def postcode_of(address: Any) -> Optional[str]:
+    """The last five-digit postcode in an address"""
+    codes = POSTCODE_PATTERN.findall(str(address or ""))
+    return codes[-1] if codes else None
+
+
+# Malaysian postcode ranges by first two digits, a few of which cross state lines in rural areas
+STATE_BY_POSTCODE = (
+    ("01", "02", "Perlis"), ("05", "09", "Kedah"), ("10", "14", "Penang"), ("15", "18", "Kelantan"),
+    ("20", "24", "Terengganu"), ("25", "28", "Pahang"), ("30", "36", "Perak"), ("39", "39", "Pahang"),
+    ("40", "48", "Selangor"), ("49", "49", "Pahang"), ("50", "60", "Kuala Lumpur"), ("62", "62", "Putrajaya"),
+    ("63", "68", "Selangor"), ("69", "69", "Pahang"), ("70", "73", "Negeri Sembilan"), ("75", "78", "Melaka"),
+    ("79", "86", "Johor"), ("87", "87", "Labuan"), ("88", "91", "Sabah"), ("93", "98", "Sarawak"),
+)
+# Words after the postcode that name the state or country rather than the town
+NOT_TOWN_PATTERN = re.compile(r"\b((?<!kuala )selangor|darul ehsan|wilayah persekutuan|w\.?\s?p\.?|federal territory|malaysia)\b",
+                              re.IGNORECASE)
+TOWN_PATTERN = re.compile(r"\b\d{5}\s+([^,]+)")
+
+
+def state_of(postcode: Optional[str]) -> Optional[str]:
+    """The state a Malaysian postcode belongs to"""
+    if not postcode:
+        return None
+    prefix = str(postcode).zfill(5)[:2]
+    for first, last, state in STATE_BY_POSTCODE:
+        if first <= prefix <= last:
+            return state
+    return None
+
+
+def town_of(address: Any) -> Optional[str]:
+    """The town written after the last postcode in an address, e.g. "Petaling Jaya" """
+    towns = TOWN_PATTERN.findall(str(address or ""))
+    if not towns:
+        return None
+    town = NOT_TOWN_PATTERN.sub(" ", towns[-1])
+    town = " ".join(re.sub(r"[^\w' -]", " ", town).split())
+    if len(town) < 3:
+        return None
+    return town.upper() if len(town) <= 4 else town.title()
+
+
+class PostcodeCentroids:
+    """Approximate coordinates for postcodes and place names, from a bundled CSV table.
+
+    Rows have postcode (may be empty), place, state, latitude and longitude.
+    A postcode missing from the table falls back to the mean of the known
+    postcodes sharing its first three, then first two digits, which in
+    Malaysia still narrows it to a district.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]] = ()):
+        self.postcodes: Dict[str, List[Tuple[float, float]]] = {}
+        self.places: Dict[str, Tuple[float, float]] = {}
+        for row in rows:
+            point = (float(row["latitude"]), float(row["longitude"]))
+            if row.get("postcode"):
+                self.postcodes.setdefault(str(row["postcode"]).zfill(5), []).append(point)
+            if row.get("place"):
+                self.places.setdefault(str(row["place"]).lower(), point)
+
+    @classmethod
+    def load(cls, path: str) -> "PostcodeCentroids":
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                return cls(list(csv.DictReader(f)))
+        except OSError as e:
+            logger.warning(f"[Geo] No postcode centroids at {path}: {e}")
+            return cls()
+
+    def __len__(self) -> int:
+        return len(self.postcodes)
+
+    def postcode(self, code: str) -> Optional[Tuple[float, float, str]]:
+        """(lat, lng, precision) of a postcode, where precision is "postcode" or "area"; None if unknown"""
+        code = str(code).zfill(5)
+        for digits, precision in ((5, "postcode"), (3, "area"), (2, "area")):
+            points = [point for known, found in self.postcodes.items() if known[:digits] == code[:digits]
+                      for point in found]
+            if points:
+                lat, lng = np.mean(points, axis=0)
+                return float(lat), float(lng), precision
+        return None
+
+    def place(self, name: str) -> Optional[Tuple[float, float]]:
+        return self.places.get(name.lower())
+
+    def find_place(self, text: str) -> Optional[Tuple[str, Tuple[float, float]]]:
+        """The longest known place name mentioned in text, with its coordinates"""
+        text = text.lower()
+        for name in sorted(self.places, key=len, reverse=True):
+            if re.search(rf"\b{re.escape(name)}\b", text):
+                return name, self.places[name]
+        return None
+
+
+class GridIndex:
+    """Uniform latitude/longitude grid over points for k-nearest and radius queries.
+
+    Points are sorted by cell, so the points of a cell are one contiguous
+    run of `order` between `starts[cell]` and `starts[cell + 1]`. A query
+    reads the cells in rings around its own until no unread cell can hold
+    anything closer. Points with NaN coordinates are left out. All state is
+    plain arrays plus a few scalars, so it saves and memory-maps like the
+    other outlet columns.
+    """
+
+    def __init__(self, coords: np.ndarray, order: np.ndarray, starts: np.ndarray, params: Dict[str, float]):
+        self.coords = coords
+        self.order = order
+        self.starts = starts
+        self.params = params
+        self.rows, self.cols = int(params.get("rows", 0)), int(params.get("cols", 0))
+
+    @classmethod
+    def build(cls, coords: np.ndarray, cell_km: float = 2.0) -> "GridIndex":
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        located = np.flatnonzero(~np.isnan(coords).any(axis=1))
+        if not len(located):
+            return cls(coords, np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64), {})
+        lats, lngs = coords[located, 0], coords[located, 1]
+        widest = max(abs(lats.min()), abs(lats.max()))
+        params = {
+            "lat0": float(lats.min()), "lng0": float(lngs.min()), "cell_km": cell_km,
+            "dlat": cell_km / KM_PER_DEGREE,
+            "dlng": cell_km / (KM_PER_DEGREE * math.cos(math.radians(float(lats.mean())))),
+            # Narrowest cell width in km anywhere in the grid, less 1% for the flat-grid approximation
+            "min_cell_km": 0.99 * cell_km * min(1.0, math.cos(math.radians(widest)) / math.cos(math.radians(float(lats.mean())))),
+        }
+        params["rows"] = int((lats.max() - params["lat0"]) // params["dlat"]) + 1
+        params["cols"] = int((lngs.max() - params["lng0"]) // params["dlng"]) + 1
+        index = cls(coords, np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64), params)
+        cells = index._cell_ids(*index._cell(lats, lngs))
+        ranked = np.argsort(cells, kind="stable")
+        index.order = located[ranked].astype(np.int32)
+        index.starts = np.searchsorted(cells[ranked], np.arange(index.rows * index.cols + 1)).astype(np.int64)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _cell(self, lat, lng):
+        return (np.floor((np.asarray(lat) - self.params["lat0"]) / self.params["dlat"]).astype(np.int64),
+                np.floor((np.asarray(lng) - self.params["lng0"]) / self.params["dlng"]).astype(np.int64))
+
+    def _cell_ids(self, row, col):
+        return row * self.cols + col
+
+    def _ring(self, row: int, col: int, ring: int) -> np.ndarray:
+        """Point indices in the cells exactly `ring` cells away from (row, col), clipped to the grid"""
+        rows = range(max(row - ring, 0), min(row + ring, self.rows - 1) + 1)
+        found = []
+        for r in rows:
+            if abs(r - row) == ring:
+                cols = range(max(col - ring, 0), min(col + ring, self.cols - 1) + 1)
+            else:
+                cols = [c for c in (col - ring, col + ring) if 0 <= c < self.cols]
+            for c in cols:
+                cell = r * self.cols + c
+                if self.starts[cell] != self.starts[cell + 1]:
+                    found.append(self.order[self.starts[cell]:self.starts[cell + 1]])
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int32)
+
+    def _max_ring(self, row: int, col: int) -> int:
+        return max(abs(row), abs(row - self.rows + 1), abs(col), abs(col - self.cols + 1))
+
+    def nearest(self, lat: float, lng: float, k: int, mask: Optional[np.ndarray] = None,
+                radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and km distances of the k closest points passing mask (and within radius_km), closest first"""
+        if not len(self) or k <= 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        row, col = (int(v) for v in self._cell(lat, lng))
+        ids, distances = [], []
+        # A query outside the grid starts at the first ring that reaches it
+        first = max(0, -row, row - self.rows + 1, -col, col - self.cols + 1)
+        for ring in range(first, self._max_ring(row, col) + 1):
+            # Anything in this ring or beyond is at least this far away
+            floor_km = max(ring - 1, 0) * self.params["min_cell_km"]
+            if radius_km is not None and floor_km > radius_km:
+                break
+            if len(distances) >= k and np.partition(np.concatenate(distances), k - 1)[k - 1] <= floor_km:
+                break
+            found = self._ring(row, col, ring)
+            if mask is not None and len(found):
+                found = found[mask[found]]
+            if len(found):
+                ids.append(found)
+                distances.append(haversine_km(lat, lng, self.coords[found, 0], self.coords[found, 1]))
+        if not ids:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        ids, distances = np.concatenate(ids), np.concatenate(distances)
+        if radius_km is not None:
+            keep = distances <= radius_km
+            ids, distances = ids[keep], distances[keep]
+        ranked = np.lexsort((ids, distances))[:k]
+        return ids[ranked], distances[ranked]
+
+    def within(self, lat: float, lng: float, radius_km: float, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Every point passing mask within radius_km, closest first"""
+        return self.nearest(lat, lng, len(self), mask, radius_km)
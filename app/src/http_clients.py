@@ -0,0 +1,105 @@
+import os
+import logging
+import httpx
+from typing import Any, Dict
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+http_config = config.get("http_clients", {})
+UPSTREAMS = ("openai", "pinecone")
+
+
+class UpstreamHTTPError(Exception):
+    """A non-2xx answer from an upstream called over the pooled clients directly"""
+
+    def __init__(self, upstream: str, status_code: int, body: str = ""):
+        super().__init__(f"{upstream} answered HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+
+
+class HttpClients:
+    """Keep-alive connection pools for the upstream APIs, created at startup and closed at shutdown.
+
+    Each upstream gets one async and one sync httpx client, shared by every
+    caller of that upstream, so requests reuse warm TCP and TLS connections
+    instead of each SDK keeping its own pool at library defaults. Pool
+    limits, keep-alive, HTTP/2 and timeouts come from the `http_clients`
+    config, with per-upstream overrides. A forked worker builds its own
+    clients rather than sharing the parent's sockets.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self._async: Dict[str, httpx.AsyncClient] = {}
+        self._sync: Dict[str, httpx.Client] = {}
+        self._pid = None
+
+    def client_options(self, upstream: str) -> Dict[str, Any]:
+        settings = {**self.settings, **self.settings.get("upstreams", {}).get(upstream, {})}
+        timeouts = {**self.settings.get("timeouts", {}), **settings.get("timeouts", {})}
+        return {
+            "http2": settings.get("http2", False),
+            "limits": httpx.Limits(
+                max_connections=settings.get("max_connections", 100),
+                max_keepalive_connections=settings.get("max_keepalive_connections", 20),
+                keepalive_expiry=settings.get("keepalive_expiry", 30.0),
+            ),
+            "timeout": httpx.Timeout(
+                connect=timeouts.get("connect", 5.0),
+                read=timeouts.get("read", 60.0),
+                write=timeouts.get("write", 10.0),
+                pool=timeouts.get("pool", 5.0),
+            ),
+        }
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        self._async, self._sync = {}, {}
+        for upstream in UPSTREAMS:
+            options = self.client_options(upstream)
+            if options["http2"]:
+                try:
+                    import h2  # noqa: F401
+                except ImportError as e:
+                    raise RuntimeError(f"http_clients.http2 is on for {upstream} but the h2 package is not installed") from e
+            self._async[upstream] = httpx.AsyncClient(**options)
+            self._sync[upstream] = httpx.Client(**options)
+        self._pid = os.getpid()
+        logger.info(f"[HttpClients] Started pooled clients for {', '.join(UPSTREAMS)}")
+
+    def async_client(self, upstream: str) -> httpx.AsyncClient:
+        # Started lazily too, for scripts that skip app startup, and again in a forked worker
+        self.start()
+        return self._async[upstream]
+
+    def sync_client(self, upstream: str) -> httpx.Client:
+        self.start()
+        return self._sync[upstream]
+
+    async def aclose(self):
+        if self._pid != os.getpid():
+            return
+        for client in self._async.values():
+            await client.aclose()
+        for client in self._sync.values():
+            client.close()
+        self._async, self._sync, self._pid = {}, {}, None
+        logger.info("[HttpClients] Closed pooled clients")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"started": self._pid == os.getpid()}
+        for upstream in UPSTREAMS:
+            options = self.client_options(upstream)
+            limits = options["limits"]
+            stats[upstream] = {
+                "http2": options["http2"],
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+            }
+        return stats
+
+
+http_clients = HttpClients(http_config)
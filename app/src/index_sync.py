@@ -0,0 +1,280 @@
+"""Incremental sync of the product CSV into the vector index.
+
+Compares the catalog with a manifest of what was last written (id -> hash of
+the embedded text and of the metadata) and only embeds and upserts new or
+re-worded products, updates metadata in place when only that changed, and
+deletes products that left the CSV, all in batches. The manifest is saved
+after every batch, so an interrupted sync resumes where it stopped. Each
+vector also carries its text hash, so a lost manifest is rebuilt from the
+index instead of re-embedding everything.
+
+Usage (from the app directory):
+    python -m src.index_sync --dry-run
+    python -m src.index_sync [--full]
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import argparse
+from typing import Any, Dict, List, NamedTuple, Optional
+from .utils import load_config
+from .catalog import ProductCatalog
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+sync_config = config.get("index_sync", {})
+MANIFEST_PATH = sync_config.get("manifest_path", "data/index_manifest.json")
+SYNC_BATCH_SIZE = sync_config.get("batch_size", 100)
+DELETE_BATCH_SIZE = sync_config.get("delete_batch_size", 1000)
+FETCH_BATCH_SIZE = sync_config.get("fetch_batch_size", 200)
+SYNC_ON_STARTUP = sync_config.get("on_startup", True)
+# Batches of up to SYNC_BATCH_SIZE texts run under their own resilience stage (see resilience.timeouts),
+# unhedged, and queue in the fair scheduler as their own user rather than as whoever started the sync
+SYNC_EMBEDDING_STAGE = "index_sync_embedding"
+SYNC_USER = "system:index-sync"
+embedding_config = config.get("models", {}).get("embedding_model", {})
+EMBEDDING_MODEL = embedding_config.get("name", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = embedding_config.get("dimensions")
+
+# Outcome of the latest sync in this process, for /health
+last_sync: Dict[str, Any] = {"status": "not run"}
+
+
+def embedding_text(product: Dict[str, Any]) -> str:
+    return f"{product['name']} {product['category_title']} {product['description']}"
+
+
+def index_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    # Only what helps browsing the index or filtering; results are hydrated from the catalog
+    return {"name": product["name"], "category_title": product["category_title"], "price": product["price"]}
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[IndexSync] Ignoring unreadable manifest {path}: {e}")
+        return None
+
+
+def save_manifest(manifest: Dict[str, Any], path: str = MANIFEST_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class IndexDiff(NamedTuple):
+    embed: List[str]
+    update: List[str]
+    delete: List[str]
+    unchanged: int
+
+
+def compute_diff(entries: Dict[str, Dict[str, Any]], manifest: Dict[str, Any]) -> IndexDiff:
+    """What to embed, what to re-tag and what to delete to bring the index from the manifest to the catalog"""
+    known = manifest.get("vectors", {})
+    embed, update, unchanged = [], [], 0
+    for pid, entry in entries.items():
+        previous = known.get(pid)
+        if previous is None or previous.get("text") != entry["text"]:
+            embed.append(pid)
+        elif previous.get("metadata") != entry["metadata"]:
+            update.append(pid)
+        else:
+            unchanged += 1
+    delete = [pid for pid in known if pid not in entries]
+    return IndexDiff(embed, update, delete, unchanged)
+
+
+def catalog_entries(catalog: ProductCatalog) -> Dict[str, Dict[str, Any]]:
+    entries = {}
+    # Ids and records from one version, even if the catalog is reloaded while this runs
+    catalog = catalog.snapshot()
+    for pid, product in zip(catalog.ids, catalog.records()):
+        metadata = index_metadata(product)
+        # The model and size are part of the hash: vectors from another model are not comparable
+        key = [EMBEDDING_MODEL, EMBEDDING_DIMENSIONS] if EMBEDDING_DIMENSIONS else [EMBEDDING_MODEL]
+        text_hash = _digest(key + [embedding_text(product)])
+        entries[pid] = {
+            "product": product,
+            "text": text_hash,
+            "metadata": _digest(metadata),
+            "index_metadata": {**metadata, "text_hash": text_hash},
+        }
+    return entries
+
+
+def _recover_manifest(index, ids: List[str]) -> Dict[str, Any]:
+    """Rebuild the manifest from the hashes stored with each vector, so a lost manifest costs no embeddings"""
+    vectors = {}
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        fetched = index.fetch(ids=ids[start:start + FETCH_BATCH_SIZE]).vectors
+        for pid, vector in fetched.items():
+            metadata = dict(vector.metadata or {})
+            text_hash = metadata.pop("text_hash", None)
+            if text_hash:
+                vectors[pid] = {"text": text_hash, "metadata": _digest(metadata)}
+    return {"vectors": vectors}
+
+
+def _vector_count(index) -> int:
+    return index.describe_index_stats().get("total_vector_count", 0)
+
+
+def _untracked_ids(index, tracked) -> List[str]:
+    """Ids in the index that no manifest accounts for, e.g. the positional ids of older builds"""
+    try:
+        return [pid for page in index.list() for pid in page if pid not in tracked]
+    except Exception as e:
+        # Listing ids is serverless-only; pod indexes only ever held the old positional ids
+        logger.info(f"[IndexSync] Could not list index ids ({e}); assuming positional ids")
+        count = _vector_count(index)
+        return [f"product_{i}" for i in range(count) if f"product_{i}" not in tracked]
+
+
+def _try_lock(path: str):
+    """Non-blocking exclusive lock, so only one worker syncs at a time; None if another holds it"""
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handle = open(f"{path}.lock", "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+async def sync_index(index, catalog: ProductCatalog, manifest_path: str = MANIFEST_PATH,
+                     dry_run: bool = False, full: bool = False) -> Dict[str, Any]:
+    """Bring the vector index in line with the catalog, touching only what changed"""
+    from .vectorstore import aget_openai_embeddings
+
+    lock = _try_lock(manifest_path)
+    if lock is None:
+        logger.info("[IndexSync] Another worker is syncing the index; skipping")
+        return {"status": "skipped"}
+    try:
+        entries = catalog_entries(catalog)
+        manifest = load_manifest(manifest_path)
+        reconcile = full or manifest is None
+        if full:
+            manifest = {"vectors": {}}
+        elif manifest is None:
+            logger.info("[IndexSync] No manifest; recovering it from the index")
+            manifest = await asyncio.to_thread(_recover_manifest, index, list(entries))
+        elif manifest.get("vectors") and not await asyncio.to_thread(_vector_count, index):
+            # A new or wiped index (e.g. a local index file that was deleted) holds nothing the manifest lists
+            logger.info("[IndexSync] Index is empty; ignoring the manifest")
+            manifest = {"vectors": {}}
+        diff = compute_diff(entries, manifest)
+        delete = diff.delete
+        if reconcile:
+            delete = delete + await asyncio.to_thread(_untracked_ids, index, set(entries) | set(diff.delete))
+        summary = {"embedded": len(diff.embed), "updated": len(diff.update), "deleted": len(delete),
+                   "unchanged": diff.unchanged}
+        logger.info(f"[IndexSync] {'Planned' if dry_run else 'Syncing'}: {summary}")
+        if dry_run:
+            return {"status": "dry run", **summary}
+
+        vectors = dict(manifest["vectors"])
+        state = {"model": EMBEDDING_MODEL, "vectors": vectors}
+
+        async def checkpoint():
+            # The local index is a file; it must hold every vector the manifest claims before the manifest does
+            if hasattr(index, "save"):
+                await asyncio.to_thread(index.save)
+            save_manifest(state, manifest_path)
+
+        for start in range(0, len(diff.embed), SYNC_BATCH_SIZE):
+            batch = diff.embed[start:start + SYNC_BATCH_SIZE]
+            embeddings = await aget_openai_embeddings([embedding_text(entries[pid]["product"]) for pid in batch],
+                                                      EMBEDDING_MODEL, use_cache=False, stage=SYNC_EMBEDDING_STAGE,
+                                                      hedge=False, user_id=SYNC_USER)
+            await asyncio.to_thread(index.upsert, vectors=[
+                {"id": pid, "values": embedding, "metadata": entries[pid]["index_metadata"]}
+                for pid, embedding in zip(batch, embeddings)
+            ])
+            for pid in batch:
+                vectors[pid] = {"text": entries[pid]["text"], "metadata": entries[pid]["metadata"]}
+            await checkpoint()
+            logger.info(f"[IndexSync] Upserted {start + len(batch)}/{len(diff.embed)}")
+
+        # Pinecone has no batch metadata update, so these go one by one; they are rare and cheap
+        for i, pid in enumerate(diff.update, 1):
+            await asyncio.to_thread(index.update, id=pid, set_metadata=entries[pid]["index_metadata"])
+            vectors[pid]["metadata"] = entries[pid]["metadata"]
+            if i % SYNC_BATCH_SIZE == 0 or i == len(diff.update):
+                await checkpoint()
+
+        for start in range(0, len(delete), DELETE_BATCH_SIZE):
+            batch = delete[start:start + DELETE_BATCH_SIZE]
+            await asyncio.to_thread(index.delete, ids=batch)
+            for pid in batch:
+                vectors.pop(pid, None)
+            await checkpoint()
+
+        if reconcile and not (diff.embed or diff.update or delete):
+            save_manifest(state, manifest_path)
+        return {"status": "ok", **summary}
+    finally:
+        if hasattr(lock, "close"):
+            lock.close()
+
+
+async def run_index_sync(index, catalog: ProductCatalog) -> Dict[str, Any]:
+    """sync_index for a background task: failures are logged and reported on /health, never raised"""
+    global last_sync
+    last_sync = {"status": "running"}
+    try:
+        last_sync = await sync_index(index, catalog)
+    except Exception as e:
+        logger.error(f"[IndexSync] Sync failed: {e}")
+        last_sync = {"status": "failed", "error": str(e)}
+    return last_sync
+
+
+def index_sync_stats() -> Dict[str, Any]:
+    return dict(last_sync)
+
+
+def main():
+    from dotenv import load_dotenv
+    from .utils import setup_logging
+    from .vectorstore import open_vector_index, load_product_data
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing anything")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and reconcile against the index")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    catalog = ProductCatalog()
+    catalog.build(load_product_data())
+    result = asyncio.run(sync_index(open_vector_index(), catalog, args.manifest, dry_run=args.dry_run, full=args.full))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
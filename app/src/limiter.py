@@ -0,0 +1,172 @@
+import time
+import math
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+
+
+class OverloadedError(Exception):
+    """Raised when an upstream call cannot get a concurrency slot in time"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an upstream error is a provider 429"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+class AdaptiveLimiter:
+    """Adaptive (AIMD) concurrency limit with a bounded wait queue.
+
+    The limit grows by roughly one slot per window of successful calls whose
+    latency stays within `latency_tolerance` of the observed baseline, and is
+    cut multiplicatively on 429s or when latency rises above it. Callers that
+    find every slot taken wait in a FIFO queue until a slot frees up or their
+    deadline passes; when the queue itself is full they are rejected at once.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 max_queue: int = 32, queue_timeout: float = 10.0, latency_tolerance: float = 2.0,
+                 backoff: float = 0.7, history_size: int = 1000):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.avg_latency = None
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.rate_limited = 0
+        self.history = deque(maxlen=history_size)
+        self._waiters = deque()
+
+    def _record(self):
+        self.history.append((time.time(), round(self.limit, 2), len(self._waiters), self.in_flight))
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued call would get a slot"""
+        latency = self.avg_latency or 1.0
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / max(1, int(self.limit))))
+
+    async def acquire(self, deadline: Optional[float] = None):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            self._record()
+            raise OverloadedError(f"{self.name} queue is full", self.retry_after())
+
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            self.timed_out += 1
+            raise OverloadedError(f"{self.name} deadline passed before a slot was free", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._record()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise OverloadedError(f"{self.name} slot wait timed out", self.retry_after())
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future):
+        """Drop a waiter that gave up, handing its slot on if it had already been granted one"""
+        if waiter.done() and not waiter.cancelled():
+            self.in_flight -= 1
+            self._wake()
+        else:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(True)
+
+    def release(self, latency: float, rate_limited: bool = False):
+        self.in_flight -= 1
+        self.completed += 1
+        self.avg_latency = latency if self.avg_latency is None else 0.9 * self.avg_latency + 0.1 * latency
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            # Let the baseline drift up slowly so one lucky fast call does not pin it forever
+            self.baseline_latency = 0.99 * self.baseline_latency + 0.01 * latency
+
+        if rate_limited:
+            self.rate_limited += 1
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif latency > self.baseline_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit * (1 - (1 - self.backoff) / 2))
+        elif self.in_flight + 1 >= int(self.limit):
+            # Only grow when the limit was actually the bottleneck
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._record()
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        await self.acquire(deadline)
+        start = time.monotonic()
+        rate_limited = False
+        try:
+            yield
+        except Exception as e:
+            rate_limited = is_rate_limited(e)
+            raise
+        finally:
+            self.release(time.monotonic() - start, rate_limited)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "rate_limited": self.rate_limited,
+            "avg_latency_s": round(self.avg_latency, 4) if self.avg_latency else None,
+        }
+
+
+def _build_limiter(name: str) -> AdaptiveLimiter:
+    settings = config.get("concurrency_limit", {}).get(name, {})
+    return AdaptiveLimiter(name, **settings)
+
+
+# Shared by every ChatOpenAI call and every embeddings call respectively
+llm_limiter = _build_limiter("llm")
+embedding_limiter = _build_limiter("embedding")
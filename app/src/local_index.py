@@ -0,0 +1,70 @@
+import re
+import math
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+from .catalog import ProductCatalog
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(text or "").lower())
+
+
+class LocalProductIndex:
+    """BM25 keyword index over the product catalog, used when the vector store is unavailable"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # (catalog, postings, document lengths, average length), replaced together by build
+        self._state = (ProductCatalog(), {}, [], 0.0)
+
+    @property
+    def catalog(self) -> ProductCatalog:
+        return self._state[0]
+
+    def build(self, catalog: ProductCatalog):
+        # Pinned to this version of the catalog, so doc ids keep matching its rows while it is reloaded
+        catalog = catalog.snapshot()
+        postings: Dict[str, List[tuple]] = defaultdict(list)
+        lengths: List[int] = []
+        for doc_id, product in enumerate(catalog.records()):
+            # Name and category count twice so they outweigh the marketing copy
+            text = " ".join([
+                str(product.get("name", "")), str(product.get("name", "")),
+                str(product.get("category_title", "")), str(product.get("category_title", "")),
+                str(product.get("color", "")), str(product.get("description", "")),
+            ])
+            counts = Counter(tokenize(text))
+            for term, freq in counts.items():
+                postings[term].append((doc_id, freq))
+            lengths.append(sum(counts.values()))
+        avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self._state = (catalog, dict(postings), lengths, avg_length)
+        logger.info(f"Local fallback index built with {len(catalog)} products")
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        catalog, postings_by_term, lengths, avg_length = self._state
+        if not len(catalog):
+            return []
+        scores = defaultdict(float)
+        n_docs = len(catalog)
+        for term in set(tokenize(query)):
+            postings = postings_by_term.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        top_score = ranked[0][1] if ranked else 1.0
+        # Normalized to [0, 1] so it reads like a similarity score
+        return [catalog.product(doc_id, score / top_score) for doc_id, score in ranked]
+
+
+fallback_index = LocalProductIndex()
@@ -0,0 +1,212 @@
+import os
+import glob
+import json
+import bisect
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+metrics_config = config.get("metrics", {})
+# Shared directory for per-worker snapshots when running several uvicorn workers; clear it on deploy
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", metrics_config.get("multiproc_dir"))
+FLUSH_INTERVAL = metrics_config.get("flush_interval", 5.0)
+DEFAULT_BUCKETS = tuple(metrics_config.get(
+    "latency_buckets", [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The upstream stage the current task is running, used to label LLM token counts by chain
+current_stage: ContextVar[str] = ContextVar("current_stage", default="unknown")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels; one uncontended lock per increment"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict, other: Dict):
+        for labels, value in other.items():
+            total[labels] = total.get(labels, 0.0) + value
+
+    def render(self, values: Dict) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in sorted(values.items())]
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels; observe is a bisect and three adds under one lock"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict, other: Dict):
+        for labels, series in other.items():
+            if labels in total:
+                total[labels] = [a + b for a, b in zip(total[labels], series)]
+            else:
+                total[labels] = list(series)
+
+    def render(self, values: Dict) -> List[str]:
+        lines = []
+        for labels, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Every metric of this process, rendered alone or merged with the other workers' snapshots"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def flush(self):
+        """Write this worker's snapshot where the other workers can read it"""
+        if not self.directory:
+            return
+        data = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in self.snapshot().items()
+        }
+        path = self._snapshot_path()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        # Atomic on POSIX, so readers never see a half-written file
+        os.replace(tmp, path)
+
+    def collect(self) -> Dict[str, Dict]:
+        """This worker's values, plus every other worker's last snapshot in multiprocess mode"""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        return self.merge_snapshots()
+
+    def merge_snapshots(self) -> Dict[str, Dict]:
+        """Sum the snapshots every worker has written"""
+        totals = {name: {} for name in self.metrics}
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"[Metrics] Skipping unreadable snapshot {path}: {e}")
+                continue
+            for name, entries in data.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(totals[name], {tuple(labels): value for labels, value in entries})
+        return totals
+
+    def render(self) -> str:
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(MULTIPROC_DIR)
+
+stage_latency = registry.register(Histogram(
+    "chatbot_stage_latency_seconds", "Latency of successful upstream pipeline stages", ["stage"]))
+upstream_errors = registry.register(Counter(
+    "chatbot_upstream_errors_total", "Failed upstream stage calls by error type", ["stage", "error"]))
+cache_requests = registry.register(Counter(
+    "chatbot_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]))
+rejections = registry.register(Counter(
+    "chatbot_rejections_total", "Requests rejected by rate limiting, load shedding or deadlines", ["reason"]))
+llm_tokens = registry.register(Counter(
+    "chatbot_llm_tokens_total", "LLM tokens used by chain, model and kind", ["chain", "model", "kind"]))
+
+
+async def flush_periodically():
+    """Keep this worker's snapshot fresh for scrapes served by the other workers"""
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(registry.flush)
+        except Exception as e:
+            logger.warning(f"[Metrics] Could not write snapshot: {e}")
+
+
+def start_metrics() -> Optional[asyncio.Task]:
+    """Start periodic snapshots when several workers share a snapshot directory"""
+    if not registry.directory:
+        return None
+    os.makedirs(registry.directory, exist_ok=True)
+    logger.info(f"[Metrics] Multiprocess mode, snapshots in {registry.directory}")
+    return asyncio.get_running_loop().create_task(flush_periodically())
@@ -0,0 +1,60 @@
+from typing import Dict, List, Tuple
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .tracing import start_trace, end_trace, TRACE_HEADER
+
+
+# Pure ASGI rather than @app.middleware("http"): BaseHTTPMiddleware runs the rest of the app in
+# a separate task and pipes the body through a memory stream, which every request pays for
+class SecurityHeadersMiddleware:
+    """Sets fixed headers on every HTTP response, replacing any the app set itself"""
+
+    def __init__(self, app: ASGIApp, headers: Dict[str, str]):
+        self.app = app
+        self.headers: List[Tuple[bytes, bytes]] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                                   for name, value in headers.items()]
+        self.names = {name for name, _ in self.headers}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = [header for header in message.get("headers", ()) if header[0].lower() not in self.names]
+                message["headers"] = headers + self.headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class TraceMiddleware:
+    """One trace per request; the id is returned in a header so a slow request can be looked up"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.header = TRACE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        root = start_trace(f"{scope['method']} {scope['path']}", request_headers.get("traceparent"))
+        root.set_attribute("http.method", scope["method"])
+        root.set_attribute("http.route", scope["path"])
+
+        async def send_with_trace(message: Message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers", ())) + [(self.header, root.trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as e:
+            root.record_error(e)
+            raise
+        finally:
+            end_trace(root)
@@ -1,21 +1,76 @@
 import os
 import logging
+from typing import Literal
+from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from .utils import load_config
+from .limiter import llm_limiter
+from .scheduler import llm_scheduler
+from .resilience import llm_breaker
+from .deadline import request_deadline
+from .metrics import llm_tokens, current_stage
+from .tracing import get_current_span
 
 logger = logging.getLogger(__name__)
 
 config = load_config()
-CHAT_MEMORY_WINDOW = config.get("chat_memory", {}).get("window_size", 5)
+
+# Shared SQL guidance for the outlet query and combined query-plan prompts
+OUTLET_SQL_NOTES = """NOTES:
+- The `opens_at` column contains weekly opening hours in a comma-separated text format, e.g.:
+  "Monday, 8am–9:40pm, Tuesday, 8am–9:40pm, ..."
+- For time-based queries (e.g., outlets open after 9pm), you only need to check for the time pattern (e.g., '%–9:%pm%' or '%–1%pm%') in the opens_at column, not per day. This is sufficient if all days have the same hours, which is common.
+- For Selangor, use address LIKE '%Selangor%'.
+- Use LOWER(column) for case-insensitive checks if needed.
+- If the question asks for outlets open after a certain time, match any closing time later than that (e.g., 9:00pm, 9:10pm, 10pm, etc.).
+
+EXAMPLES:
+- For "Which outlets in Selangor open after 9pm?":
+  SELECT * FROM outlets WHERE address LIKE '%Selangor%' AND (opens_at LIKE '%–9:%pm%' OR opens_at LIKE '%–1%pm%') LIMIT {top_k};
+- Adjust the time pattern as needed for the user's question.
+"""
+
+class LimitedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose async calls are fair-scheduled per user, concurrency limited and circuit broken"""
+
+    async def _agenerate(self, *args, **kwargs):
+        async def generate():
+            # Queue waits give up at the request deadline rather than the queue timeout alone
+            deadline = request_deadline.get()
+            async with llm_scheduler.slot(deadline=deadline):
+                async with llm_limiter.slot(deadline):
+                    return await super(LimitedChatOpenAI, self)._agenerate(*args, **kwargs)
+        result = await llm_breaker.call(generate)
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        chain = current_stage.get()
+        llm_tokens.inc(chain, self.model_name, "prompt", amount=usage.get("prompt_tokens", 0))
+        llm_tokens.inc(chain, self.model_name, "completion", amount=usage.get("completion_tokens", 0))
+        get_current_span().set_attributes(
+            llm__model=self.model_name,
+            llm__prompt_tokens=usage.get("prompt_tokens", 0),
+            llm__completion_tokens=usage.get("completion_tokens", 0),
+        )
+        return result
+
+def create_llm(**client_options) -> LimitedChatOpenAI:
+    return LimitedChatOpenAI(
+        model=config.get("models", {}).get("llm_model", {}).get("name", "gpt-3.5-turbo"),
+        temperature=config.get("models", {}).get("llm_model", {}).get("temperature", 0),
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # Generations are not retried blindly; stage timeouts bound them instead
+        max_retries=config.get("resilience", {}).get("llm_max_retries", 0),
+        **client_options
+    )
 
 # Initialize OpenAI client
-llm = ChatOpenAI(
-    model=config.get("models", {}).get("llm_model", {}).get("name", "gpt-3.5-turbo"),
-    temperature=config.get("models", {}).get("llm_model", {}).get("temperature", 0),
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
+llm = create_llm()
+
+def use_http_clients(clients):
+    """Move the LLM onto the pooled HTTP clients; call before initialize_chains so every chain uses them"""
+    global llm
+    llm = create_llm(http_client=clients.sync_client("openai"), http_async_client=clients.async_client("openai"))
 
 async def initialize_chains():
     """Initialize all LangChain components with direct prompt templates, including intent_chain."""
@@ -57,19 +112,9 @@ Do not add markdown blocks for the SQL Query.
 
 {table_info}
 
-NOTES:
-- The `opens_at` column contains weekly opening hours in a comma-separated text format, e.g.:
-  "Monday, 8am–9:40pm, Tuesday, 8am–9:40pm, ..."
-- For time-based queries (e.g., outlets open after 9pm), you only need to check for the time pattern (e.g., '%–9:%pm%' or '%–1%pm%') in the opens_at column, not per day. This is sufficient if all days have the same hours, which is common.
-- For Selangor, use address LIKE '%Selangor%'.
-- Use LOWER(column) for case-insensitive checks if needed.
-- If the question asks for outlets open after a certain time, match any closing time later than that (e.g., 9:00pm, 9:10pm, 10pm, etc.).
-
-EXAMPLES:
-- For "Which outlets in Selangor open after 9pm?":
-  SELECT * FROM outlets WHERE address LIKE '%Selangor%' AND (opens_at LIKE '%–9:%pm%' OR opens_at LIKE '%–1%pm%') LIMIT {top_k};
-- Adjust the time pattern as needed for the user's question.
-
+"""
+            + OUTLET_SQL_NOTES
+            + """
 Be careful not to use columns that don't exist.
 """
         )
@@ -118,3 +163,78 @@ Respond with only one word: "product", "outlet", or "general"
     )
     
     return prompt | llm | StrOutputParser()
+
+
+def create_batch_intent_classification_chain():
+    """Create a chain that classifies a numbered list of inputs in a single call"""
+    prompt = PromptTemplate.from_template(
+        """
+Classify each numbered user input into one of the following categories:
+- product: Questions about ZUS Coffee products (drinkware, cups, tumblers, etc.)
+- outlet: Questions about ZUS Coffee outlets (locations, stores, branches, etc.)
+- general: General conversation or other topics
+
+User inputs:
+{inputs}
+
+Respond with exactly one line per input in the form "<number>: <category>", e.g. "1: product".
+"""
+    )
+    
+    return prompt | llm | StrOutputParser()
+
+
+def create_follow_up_chain():
+    """Create a chain that rewrites a follow-up message as a standalone question"""
+    prompt = PromptTemplate.from_template(
+        """
+Rewrite the user's latest message as a standalone question for a ZUS Coffee assistant.
+Use the conversation so far only to resolve references such as "those", "there" or "the second one".
+If the message already stands on its own, return it unchanged.
+
+Conversation so far:
+{history}
+
+Latest message: {question}
+
+Respond with only the standalone question.
+"""
+    )
+
+    return prompt | llm | StrOutputParser()
+
+
+class QueryPlan(BaseModel):
+    """Intent plus everything needed to answer it, returned by one structured-output call"""
+    intent: Literal["product", "outlet", "general"] = Field(description="The category of the user's question")
+    sql: str = Field(default="", description="For outlet questions, the SQL query that answers it; otherwise empty")
+    product_query: str = Field(default="", description="For product questions, a concise semantic search query; otherwise empty")
+    top_k: int = Field(default=3, description="How many results the user asked for, 3 if unspecified")
+
+def create_query_plan_chain():
+    """Create a chain that classifies intent and plans the retrieval in a single structured-output call"""
+    prompt = PromptTemplate.from_template(
+        """
+You are the query planner for a ZUS Coffee assistant. Classify the user's question and plan how to answer it.
+
+Categories:
+- product: Questions about ZUS Coffee products (drinkware, cups, tumblers, etc.)
+- outlet: Questions about ZUS Coffee outlets (locations, stores, branches, etc.)
+- general: General conversation or other topics
+
+User Question: {question}
+
+For outlet questions, write a syntactically correct {dialect} SQL query in `sql`.
+Unless the user specifies a specific number of results, limit the query to at most {top_k} results using LIMIT.
+Always use pattern matching with LIKE and wrap values in %%. Use only these tables and columns:
+
+{table_info}
+
+"""
+        + OUTLET_SQL_NOTES
+        + """
+For product questions, put a short search query describing the wanted products in `product_query`.
+"""
+    )
+
+    return prompt | llm.with_structured_output(QueryPlan)
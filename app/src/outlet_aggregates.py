@@ -0,0 +1,299 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .geo import STATE_BY_POSTCODE, postcode_of, state_of, town_of
+from .outlets import SERVICE_TERMS, parse_services
+from .utils import load_config, extract_top_k_from_query
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+aggregates_config = config.get("outlet_aggregates", {})
+AGGREGATES_ENABLED = aggregates_config.get("enabled", True)
+# Below this many reviews an average says little, so the rating leaderboard leaves the outlet out
+LEADERBOARD_MIN_REVIEWS = aggregates_config.get("leaderboard_min_reviews", 20)
+LEADERBOARD_MAX_K = aggregates_config.get("leaderboard_max_k", 20)
+# Bumped when the aggregate tables change shape, so existing databases are rebuilt
+AGGREGATES_VERSION = 1
+DIMENSIONS = ("state", "city", "service", "place_type")
+METRICS = ("reviews_average", "reviews_count")
+
+SCHEMA = """
+DROP TABLE IF EXISTS outlet_locations;
+DROP TABLE IF EXISTS outlet_services;
+DROP TABLE IF EXISTS outlet_counts;
+DROP TABLE IF EXISTS outlet_leaderboard;
+CREATE TABLE IF NOT EXISTS outlet_aggregates_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE outlet_locations (outlet_id INTEGER PRIMARY KEY, postcode TEXT, city TEXT, state TEXT);
+CREATE INDEX idx_outlet_locations_state ON outlet_locations (state);
+CREATE INDEX idx_outlet_locations_city ON outlet_locations (city);
+CREATE TABLE outlet_services (outlet_id INTEGER NOT NULL, service TEXT NOT NULL, PRIMARY KEY (outlet_id, service)) WITHOUT ROWID;
+CREATE INDEX idx_outlet_services_service ON outlet_services (service, outlet_id);
+CREATE TABLE outlet_counts (dimension TEXT NOT NULL, value TEXT NOT NULL, outlet_count INTEGER NOT NULL,
+                            PRIMARY KEY (dimension, value)) WITHOUT ROWID;
+CREATE TABLE outlet_leaderboard (metric TEXT NOT NULL, rank INTEGER NOT NULL, outlet_id INTEGER NOT NULL,
+                                 reviews_average REAL, reviews_count INTEGER, PRIMARY KEY (metric, rank)) WITHOUT ROWID;
+"""
+
+AGGREGATE_QUERIES = (
+    "INSERT INTO outlet_counts SELECT 'all', 'all', COUNT(*) FROM outlets",
+    "INSERT INTO outlet_counts SELECT 'state', state, COUNT(*) FROM outlet_locations WHERE state IS NOT NULL GROUP BY state",
+    "INSERT INTO outlet_counts SELECT 'city', city, COUNT(*) FROM outlet_locations WHERE city IS NOT NULL GROUP BY city",
+    "INSERT INTO outlet_counts SELECT 'service', service, COUNT(*) FROM outlet_services GROUP BY service",
+    "INSERT INTO outlet_counts SELECT 'place_type', place_type, COUNT(*) FROM outlets "
+    "WHERE place_type IS NOT NULL AND place_type NOT IN ('', 'N/A', 'nan') GROUP BY place_type",
+    "INSERT INTO outlet_leaderboard SELECT 'reviews_average', "
+    "ROW_NUMBER() OVER (ORDER BY reviews_average DESC, reviews_count DESC, id), id, reviews_average, reviews_count "
+    "FROM outlets WHERE reviews_count >= :min_reviews",
+    "INSERT INTO outlet_leaderboard SELECT 'reviews_count', "
+    "ROW_NUMBER() OVER (ORDER BY reviews_count DESC, reviews_average DESC, id), id, reviews_average, reviews_count "
+    "FROM outlets WHERE reviews_count > 0",
+)
+
+COUNT_PATTERN = re.compile(r"\b(how many|number of|count of|count the|total (?:number of )?outlets)\b", re.IGNORECASE)
+RANKING_PATTERNS = {
+    "reviews_average": re.compile(r"\b(best|top|highest)[- ]?(rated|ratings?|reviewed|reviews)\b|\bhighest[- ]rating\b"
+                                  r"|\bbest (customer )?reviews\b", re.IGNORECASE),
+    "reviews_count": re.compile(r"\bmost (reviews|reviewed|popular)\b|\b(highest|largest|biggest) (number of )?reviews\b"
+                                r"|\bmost number of reviews\b", re.IGNORECASE),
+}
+OUTLET_NOUN = re.compile(r"\b(outlets?|stores?|branch(es)?|shops?|cafes?|locations?|kiosks?)\b", re.IGNORECASE)
+# Only the phrasings extract_top_k_from_query reads; any other number is left over and declines the question
+TOP_K_PATTERN = re.compile(r"\b(top|first|show\s+me|give\s+me|list)\s+\d+\b|\b\d+\s+outlets?\b", re.IGNORECASE)
+# The only words a question may have besides the recognised count, ranking, noun and filter phrases.
+# Anything else ("wifi", "closed", "opened this year", "Bahru") is a condition the tables cannot
+# answer, so the question takes the SQL path instead of getting an unfiltered count.
+ALLOWED_WORDS = frozenset("""
+    a an the of in at across around and how what which where is are do does there you your we i me
+    have has got offer offers offering provide provides providing support supports with that can
+    show list give tell find please zus coffee total number count all altogether currently exist
+    located based malaysia state city town area rated rating ratings review reviews reviewed customer
+""".split())
+STATE_ALIASES = {"kl": "Kuala Lumpur", "wp": "Kuala Lumpur", "wilayah persekutuan": "Kuala Lumpur",
+                 "pulau pinang": "Penang", "malacca": "Melaka", "n9": "Negeri Sembilan"}
+SERVICE_PATTERNS = {term: re.compile(r"\b(" + "|".join(re.escape(alias) for alias in aliases) + r")\b")
+                    for term, aliases in SERVICE_TERMS.items()}
+
+
+def _outlet_fingerprint(conn: sqlite3.Connection) -> str:
+    digest = hashlib.sha1(f"{AGGREGATES_VERSION}:{LEADERBOARD_MIN_REVIEWS}".encode())
+    for row in conn.execute("SELECT * FROM outlets ORDER BY id"):
+        digest.update(json.dumps(row, default=str).encode())
+    return digest.hexdigest()
+
+
+def refresh_outlet_aggregates(db_path: str, force: bool = False) -> bool:
+    """Rebuild the aggregate tables unless they already describe the current outlets rows; True if rebuilt"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # One writer at a time; a worker that waited here finds the tables current and leaves them alone
+        conn.execute("BEGIN IMMEDIATE")
+        fingerprint = _outlet_fingerprint(conn)
+        conn.execute("CREATE TABLE IF NOT EXISTS outlet_aggregates_meta (key TEXT PRIMARY KEY, value TEXT)")
+        current = conn.execute("SELECT value FROM outlet_aggregates_meta WHERE key = 'fingerprint'").fetchone()
+        if not force and current and current[0] == fingerprint:
+            conn.execute("ROLLBACK")
+            return False
+
+        start = time.perf_counter()
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        rows = conn.execute("SELECT id, address, services FROM outlets").fetchall()
+        locations = []
+        for outlet_id, address, _ in rows:
+            postcode = postcode_of(address)
+            locations.append((outlet_id, postcode, town_of(address), state_of(postcode)))
+        conn.executemany("INSERT INTO outlet_locations VALUES (?, ?, ?, ?)", locations)
+        conn.executemany("INSERT INTO outlet_services VALUES (?, ?)",
+                         [(outlet_id, name) for outlet_id, _, services in rows for name in set(parse_services(services))])
+        for query in AGGREGATE_QUERIES:
+            conn.execute(query, {"min_reviews": LEADERBOARD_MIN_REVIEWS} if ":min_reviews" in query else {})
+        conn.execute("INSERT OR REPLACE INTO outlet_aggregates_meta VALUES ('fingerprint', ?)", (fingerprint,))
+        conn.execute("ANALYZE")
+        conn.execute("COMMIT")
+        logger.info(f"[OutletAggregates] Rebuilt aggregates for {len(rows)} outlets in "
+                    f"{(time.perf_counter() - start) * 1000:.1f}ms")
+        return True
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _quote(value: Any) -> str:
+    return str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+
+
+class OutletAggregates:
+    """Answers counting and rating-ranking questions about outlets from the aggregate tables, without an LLM.
+
+    `answer` recognises "how many outlets ..." and "best rated / most
+    reviewed outlets ..." questions filtered by state, city, service and
+    place type, and declines (None) anything else, which then takes the SQL
+    path: once the recognised phrases are taken out, every word left must be
+    in ALLOWED_WORDS, so an unknown condition ("with wifi", "opened this
+    year", "in Johor Bahru") is never answered with a broader count. Location
+    names match longest first. A single filter is one
+    primary-key lookup in outlet_counts; several are an indexed join.
+    """
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+        # Held while a query runs, so open() never closes a connection still in use
+        self._lock = threading.Lock()
+        self.values: Dict[str, Dict[str, str]] = {dimension: {} for dimension in DIMENSIONS}
+        self.names: Dict[str, List[Tuple[str, str]]] = {}
+        self.pattern: Optional[re.Pattern] = None
+        self.answered = 0
+        self.declined = 0
+        self.seconds = 0.0
+
+    def open(self, db_path: str):
+        """Read-only connection and the filter vocabulary; safe to call again after the data is refreshed"""
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        values = {dimension: {} for dimension in DIMENSIONS}
+        for dimension, value in conn.execute("SELECT dimension, value FROM outlet_counts WHERE dimension != 'all'"):
+            values[dimension][value.lower()] = value
+        # Every state is known, so "how many outlets in Penang" is answered (none) rather than sent to the LLM
+        for _, _, state in STATE_BY_POSTCODE:
+            values["state"].setdefault(state.lower(), state)
+        for alias, state in STATE_ALIASES.items():
+            values["state"][alias] = state
+        names: Dict[str, List[Tuple[str, str]]] = {}
+        for dimension in ("state", "city", "place_type"):
+            for key, value in values[dimension].items():
+                names.setdefault(key, []).append((dimension, value))
+        # One alternation, longest names first, so "Kuala Selangor" is a town rather than the state of Selangor
+        pattern = re.compile(r"\b(" + "|".join(re.escape(key) for key in sorted(names, key=len, reverse=True)) + r")s?\b")
+        # Swapped in whole, so a query on the event loop never sees a half-loaded vocabulary
+        with self._lock:
+            old = self.conn
+            self.conn, self.values, self.names, self.pattern = conn, values, names, pattern
+            if old is not None:
+                old.close()
+        logger.info(f"[OutletAggregates] {', '.join(f'{len(v)} {k}' for k, v in values.items())} values")
+
+    def parse(self, question: str) -> Optional[Dict[str, Any]]:
+        """The aggregate a question asks for, or None if the tables cannot answer it"""
+        text = question.lower()
+        metric = next((metric for metric, pattern in RANKING_PATTERNS.items() if pattern.search(text)), None)
+        kind = "ranking" if metric else "count" if COUNT_PATTERN.search(text) else None
+        if kind is None:
+            return None
+
+        filters: Dict[str, Any] = {}
+        # Character spans of every recognised phrase; whatever is outside them must be an allowed word
+        taken: List[Tuple[int, int]] = [match.span() for pattern in (COUNT_PATTERN, OUTLET_NOUN, TOP_K_PATTERN,
+                                                                     *RANKING_PATTERNS.values())
+                                        for match in pattern.finditer(text)]
+        for match in self.pattern.finditer(text):
+            # A name that is both a state and a city ("Kuala Lumpur") counts as the state
+            dimension, value = self.names[match.group(1)][0]
+            if dimension in filters and filters[dimension] != value:
+                return None
+            filters[dimension] = value
+            taken.append(match.span())
+        services = []
+        for term, pattern in SERVICE_PATTERNS.items():
+            found = list(pattern.finditer(text))
+            if found:
+                names = [value for key, value in self.values["service"].items() if term in key]
+                if not names:
+                    return None
+                services.append((term, names))
+                taken.extend(match.span() for match in found)
+        if services:
+            filters["service"] = services
+        rest = list(text)
+        for start, end in taken:
+            rest[start:end] = " " * (end - start)
+        if any(word not in ALLOWED_WORDS for word in re.findall(r"[\w']+", "".join(rest))):
+            return None
+        if kind == "count" and not (OUTLET_NOUN.search(text) or filters):
+            return None
+        if kind == "ranking" and not OUTLET_NOUN.search(text):
+            return None
+        return {"kind": kind, "metric": metric, "filters": filters,
+                "top_k": min(extract_top_k_from_query(question), LEADERBOARD_MAX_K)}
+
+    def sql(self, plan: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """The query on the aggregate tables that answers a parsed question, with its parameters"""
+        filters = plan["filters"]
+        # Tables are joined only when a filter needs them; `ref` is the outlet id column of the driving table
+        ref = "b.outlet_id" if plan["kind"] == "ranking" else "l.outlet_id"
+        conditions, params, joins = [], [], []
+        for dimension, column in (("state", "l.state"), ("city", "l.city"), ("place_type", "o.place_type")):
+            if dimension in filters:
+                conditions.append(f"{column} = ?")
+                params.append(filters[dimension])
+        for _, names in filters.get("service", []):
+            conditions.append(f"{ref} IN (SELECT outlet_id FROM outlet_services WHERE service IN ({', '.join('?' * len(names))}))")
+            params.extend(names)
+
+        if plan["kind"] == "ranking":
+            if "state" in filters or "city" in filters:
+                joins.append(" JOIN outlet_locations l ON l.outlet_id = b.outlet_id")
+            where = "".join(f" AND {condition}" for condition in conditions)
+            return ("SELECT b.rank, o.id, o.name, o.address, b.reviews_average, b.reviews_count "
+                    f"FROM outlet_leaderboard b JOIN outlets o ON o.id = b.outlet_id{''.join(joins)} "
+                    f"WHERE b.metric = ?{where} ORDER BY b.rank LIMIT ?", [plan["metric"], *params, plan["top_k"]])
+        if not filters:
+            return "SELECT outlet_count FROM outlet_counts WHERE dimension = 'all'", []
+        services = filters.get("service", [])
+        if len(filters) == 1 and (not services or (len(services) == 1 and len(services[0][1]) == 1)):
+            dimension = next(iter(filters))
+            value = services[0][1][0] if services else filters[dimension]
+            return "SELECT outlet_count FROM outlet_counts WHERE dimension = ? AND value = ?", [dimension, value]
+        if "place_type" in filters:
+            joins.append(" JOIN outlets o ON o.id = l.outlet_id")
+        return (f"SELECT COUNT(*) AS outlet_count FROM outlet_locations l{''.join(joins)} "
+                f"WHERE {' AND '.join(conditions)}", params)
+
+    def answer(self, question: str, locale: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Summary, SQL and rows for an aggregate question, or None to let the SQL path answer it"""
+        from .templates import render_outlet_count, render_outlet_ranking
+
+        if not AGGREGATES_ENABLED or self.conn is None:
+            return None
+        start = time.perf_counter()
+        plan = self.parse(question)
+        if plan is None:
+            self.declined += 1
+            return None
+        sql, params = self.sql(plan)
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        filters = {"in": plan["filters"].get("city") or plan["filters"].get("state"),
+                   "with": ", ".join(term for term, _ in plan["filters"].get("service", [])) or None,
+                   "place_type": plan["filters"].get("place_type")}
+        if plan["kind"] == "count":
+            summary = render_outlet_count(rows[0]["outlet_count"] if rows else 0, filters, locale)
+        else:
+            summary = render_outlet_ranking(rows, filters, locale)
+        # Inlined for display; the values come from the tables' own vocabulary
+        for param in params:
+            sql = sql.replace("?", _quote(param), 1)
+        self.answered += 1
+        self.seconds += time.perf_counter() - start
+        return {"summary": summary, "sql_query": sql, "rows": rows}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": AGGREGATES_ENABLED and self.conn is not None,
+            "answered": self.answered,
+            "declined": self.declined,
+            "mean_answer_us": round(self.seconds / self.answered * 1e6, 1) if self.answered else None,
+        }
+
+
+outlet_aggregates = OutletAggregates()
@@ -0,0 +1,369 @@
+import re
+import sqlite3
+import logging
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from .shared_data import TextColumn, write_array_file, read_array_file
+from .geo import GridIndex, PostcodeCentroids, coordinates_from_link, postcode_of
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+geo_config = config.get("geo", {})
+POSTCODE_CENTROIDS_PATH = geo_config.get("postcode_centroids", "data/postcode_centroids.csv")
+GRID_CELL_KM = geo_config.get("grid_cell_km", 2.0)
+NEARBY_DEFAULT_K = geo_config.get("default_k", 5)
+NEARBY_MAX_K = geo_config.get("max_k", 50)
+NEARBY_MAX_RADIUS_KM = geo_config.get("max_radius_km", 100.0)
+# Opening hours are local times; Malaysia has one zone and no daylight saving
+LOCAL_TIMEZONE = timezone(timedelta(hours=geo_config.get("utc_offset_hours", 8)))
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+CLOSED = -1
+TIME_PATTERN = re.compile(r"^(\d{1,2})(?::(\d{2}))?\s*([ap]m)$", re.IGNORECASE)
+# What a question may call a service, by the text every matching service name contains
+SERVICE_TERMS = {
+    "drive-through": ("drive-through", "drive through", "drive-thru", "drive thru"),
+    "pickup": ("pickup", "pick-up", "pick up"),
+    "dine-in": ("dine-in", "dine in"),
+    "takeaway": ("takeaway", "take-away", "take away"),
+    "delivery": ("delivery",),
+}
+NEARBY_PATTERN = re.compile(r"\b(near|nearest|nearby|closest|close to|closer to|within\s+\d+(?:\.\d+)?\s*km)\b",
+                            re.IGNORECASE)
+PLACE_PATTERN = re.compile(r"\b(?:near|nearest to|closest to|close to|closer to|to|around|from|of|in|at)\s+"
+                           r"([a-z][a-z' .-]*?)\s*(?:[,?!;]|\b(?:that|which|with|open|within|near|nearest|closest)\b|$)",
+                           re.IGNORECASE)
+RADIUS_PATTERN = re.compile(r"within\s+(\d+(?:\.\d+)?)\s*km", re.IGNORECASE)
+RELATIVE_TIME_PATTERN = re.compile(r"\b(open now|open right now|currently open|still open|today|tonight|tomorrow)\b",
+                                   re.IGNORECASE)
+OPEN_AT_PATTERN = re.compile(r"open\w*\s+(?:at|after|until|till|past|by)\s+(\d{1,2}(?::\d{2})?\s*[ap]m)", re.IGNORECASE)
+
+
+def parse_time(text: str) -> Optional[int]:
+    """Minutes after midnight for "8am" or "9:40pm", or None"""
+    match = TIME_PATTERN.match(text.strip())
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3).lower()
+    if not 1 <= hour <= 12 or minute >= 60:
+        return None
+    hour %= 12
+    return (hour + (12 if meridiem == "pm" else 0)) * 60 + minute
+
+
+def parse_opening_hours(opens_at: Any) -> np.ndarray:
+    """Weekly hours as a (7, 2) array of opening and closing minutes, Monday first; CLOSED for closed or unknown days.
+
+    A closing time past midnight is stored as more than 1440 minutes.
+    """
+    hours = np.full((7, 2), CLOSED, dtype=np.int16)
+    parts = [p.strip() for p in str(opens_at or "").split(",")]
+    for day, span in zip(parts[::2], parts[1::2]):
+        if day not in DAYS:
+            continue
+        if span.lower().startswith("open 24"):
+            hours[DAYS.index(day)] = (0, 1440)
+            continue
+        times = re.split(r"\s*[–-]\s*", span)
+        if len(times) != 2:
+            continue
+        start, end = parse_time(times[0]), parse_time(times[1])
+        if start is None or end is None:
+            continue
+        hours[DAYS.index(day)] = (start, end if end > start else end + 1440)
+    return hours
+
+
+def parse_services(services: Any) -> List[str]:
+    """Service names of an outlet, without the "N/A" and "nan" placeholders"""
+    return [name.strip() for name in str(services or "").split(",") if name.strip() not in ("", "N/A", "nan")]
+
+
+def locate_outlet(row: Dict[str, Any], centroids: PostcodeCentroids) -> Tuple[float, float, str]:
+    """(lat, lng, source) of an outlet: its own latitude/longitude columns, its Google Maps link, then its postcode"""
+    try:
+        lat, lng = float(row["latitude"]), float(row["longitude"])
+        if not (np.isnan(lat) or np.isnan(lng)):
+            return lat, lng, "columns"
+    except (KeyError, TypeError, ValueError):
+        pass
+    point = coordinates_from_link(row.get("link"))
+    if point:
+        return point[0], point[1], "link"
+    code = postcode_of(row.get("address"))
+    found = centroids.postcode(code) if code else None
+    if found:
+        return found
+    return float("nan"), float("nan"), "unknown"
+
+
+class OutletColumns(NamedTuple):
+    """Every column of one outlet table version"""
+    ids: np.ndarray
+    names: Any
+    addresses: Any
+    hours: np.ndarray
+    services: np.ndarray
+    service_names: List[str]
+    grid: GridIndex
+
+
+class OutletTable:
+    """Read-only, column-oriented view of the outlets table for lookups that need no SQL.
+
+    Opening hours are parsed once into an int16 array of (outlet, weekday,
+    open/close) minutes, services into a bitmask per outlet, and locations
+    into coordinates with a grid index over them. Saved with `save` and
+    opened with `load`, the columns are memory-mapped and shared by every
+    worker on the host.
+
+    `build` and `load` swap in a complete `OutletColumns` as one reference;
+    a lookup that combines several masks takes a `snapshot` first, so a
+    reload in another thread cannot change the table halfway through it.
+    """
+
+    def __init__(self, columns: Optional[OutletColumns] = None):
+        self._columns = columns or OutletColumns(
+            np.zeros(0, dtype=np.int32), [], [], np.zeros((0, 7, 2), dtype=np.int16), np.zeros(0, dtype=np.uint32), [],
+            GridIndex.build(np.zeros((0, 2))))
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._columns.ids
+
+    @property
+    def names(self) -> Any:
+        return self._columns.names
+
+    @property
+    def addresses(self) -> Any:
+        return self._columns.addresses
+
+    @property
+    def hours(self) -> np.ndarray:
+        return self._columns.hours
+
+    @property
+    def services(self) -> np.ndarray:
+        return self._columns.services
+
+    @property
+    def service_names(self) -> List[str]:
+        return self._columns.service_names
+
+    @property
+    def grid(self) -> GridIndex:
+        return self._columns.grid
+
+    def snapshot(self) -> "OutletTable":
+        """A table fixed at the current version, unaffected by later reloads of this one"""
+        return OutletTable(self._columns)
+
+    def build(self, rows: Iterable[Dict[str, Any]], centroids: Optional[PostcodeCentroids] = None):
+        rows = list(rows)
+        centroids = centroids if centroids is not None else postcode_centroids
+        hours = np.stack([parse_opening_hours(row.get("opens_at")) for row in rows]) if rows else \
+            np.zeros((0, 7, 2), dtype=np.int16)
+        offered = [parse_services(row.get("services")) for row in rows]
+        service_names = sorted({name for names in offered for name in names})[:32]
+        bits = {name: 1 << i for i, name in enumerate(service_names)}
+        located = [locate_outlet(row, centroids) for row in rows]
+        coords = np.array([point[:2] for point in located], dtype=np.float64).reshape(-1, 2)
+        self._columns = OutletColumns(
+            ids=np.array([int(row["id"]) for row in rows], dtype=np.int32),
+            names=[str(row.get("name") or "") for row in rows],
+            addresses=[str(row.get("address") or "") for row in rows],
+            hours=hours,
+            services=np.array([sum(bits.get(name, 0) for name in set(names)) for names in offered], dtype=np.uint32),
+            service_names=service_names,
+            grid=GridIndex.build(coords, GRID_CELL_KM),
+        )
+        sources = {}
+        for point in located:
+            sources[point[2]] = sources.get(point[2], 0) + 1
+        logger.info(f"[Outlets] {len(rows)} outlets, {hours.nbytes} bytes of opening hours, "
+                    f"locations by source {sources}")
+
+    def build_from_db(self, db_path: str, table: str = "outlets"):
+        with sqlite3.connect(db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            self.build(dict(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY id"))
+
+    def save(self, path: str):
+        columns = self._columns
+        sections = {"ids": columns.ids, "hours": columns.hours, "services": columns.services,
+                    "coords": columns.grid.coords, "grid.order": columns.grid.order, "grid.starts": columns.grid.starts}
+        for column in ("names", "addresses"):
+            sections[f"{column}.data"], sections[f"{column}.offsets"] = TextColumn.encode(getattr(columns, column))
+        write_array_file(path, "outlets", {"service_names": columns.service_names, "grid": columns.grid.params}, sections)
+
+    def load(self, path: str):
+        """Replace the contents with a saved table, memory-mapped read-only"""
+        header, sections = read_array_file(path, "outlets")
+        self._columns = OutletColumns(
+            ids=sections["ids"],
+            names=TextColumn(sections["names.data"], sections["names.offsets"]),
+            addresses=TextColumn(sections["addresses.data"], sections["addresses.offsets"]),
+            hours=sections["hours"],
+            services=sections["services"],
+            service_names=header["service_names"],
+            grid=GridIndex(sections["coords"], sections["grid.order"], sections["grid.starts"], header["grid"]),
+        )
+        logger.info(f"[Outlets] Mapped {len(sections['ids'])} outlets from {path}")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def open_at(self, weekday: int, minute: int) -> np.ndarray:
+        """Boolean mask of outlets open at `minute` after midnight on `weekday` (0 is Monday)"""
+        hours = self.hours
+        today = hours[:, weekday]
+        open_today = (today[:, 0] <= minute) & (minute < today[:, 1])
+        # Still open from a closing time past midnight the day before
+        yesterday = hours[:, (weekday - 1) % 7]
+        open_late = (yesterday[:, 1] > 1440) & (minute + 1440 < yesterday[:, 1])
+        return open_today | open_late
+
+    def with_services(self, terms: Sequence[str]) -> np.ndarray:
+        """Boolean mask of outlets offering every term, each matching any service name that contains it"""
+        columns = self._columns
+        mask = np.ones(len(columns.ids), dtype=bool)
+        for term in terms:
+            bits = sum(1 << i for i, name in enumerate(columns.service_names) if term.lower() in name.lower())
+            mask &= (columns.services & np.uint32(bits)) != 0
+        return mask
+
+    def mentioning(self, text: str) -> np.ndarray:
+        """Boolean mask of outlets whose address mentions text as whole words"""
+        pattern = re.compile(rf"\b{re.escape(text)}\b", re.IGNORECASE)
+        return np.array([bool(pattern.search(address)) for address in self.addresses], dtype=bool)
+
+    def nearest(self, lat: float, lng: float, k: int, mask: Optional[np.ndarray] = None,
+                radius_km: Optional[float] = None, prefer: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(outlet id, km) of the k closest outlets passing mask, closest first.
+
+        Equal distances, common when outlets share a postcode centroid, are
+        ordered by `prefer` (e.g. outlets whose address names the place asked about).
+        """
+        columns = self._columns
+        rows, distances = columns.grid.nearest(lat, lng, k if prefer is None else len(columns.ids), mask, radius_km)
+        if prefer is not None:
+            ranked = np.lexsort((~prefer[rows], np.round(distances, 2)))[:k]
+            rows, distances = rows[ranked], distances[ranked]
+        return [(int(columns.ids[row]), float(distance)) for row, distance in zip(rows, distances)]
+
+
+def locate_place(name: str, table: Optional["OutletTable"] = None) -> Optional[Dict[str, Any]]:
+    """A known place, or else the middle of the outlets whose addresses name it"""
+    table = table if table is not None else outlet_table
+    point = postcode_centroids.place(name)
+    if point:
+        return {"lat": point[0], "lng": point[1], "label": name, "precision": "place"}
+    if len(name) < 3:
+        return None
+    mentions = table.mentioning(name)
+    coords = table.grid.coords[mentions]
+    coords = coords[~np.isnan(coords).any(axis=1)]
+    if not len(coords):
+        return None
+    lat, lng = coords.mean(axis=0)
+    return {"lat": float(lat), "lng": float(lng), "label": name, "precision": "address", "mentions": mentions}
+
+
+def resolve_location(question: str, table: Optional["OutletTable"] = None) -> Optional[Dict[str, Any]]:
+    """Where a question is asking about: a postcode, a known place, or a place named in outlet addresses"""
+    table = table if table is not None else outlet_table
+    code = postcode_of(question)
+    if code:
+        found = postcode_centroids.postcode(code)
+        if found:
+            return {"lat": found[0], "lng": found[1], "label": code, "precision": found[2]}
+    for match in PLACE_PATTERN.finditer(question):
+        words = match.group(1).strip(" .").split()
+        # Longest phrase first, so "bandar sunway" wins over "bandar"
+        for size in range(min(len(words), 4), 0, -1):
+            location = locate_place(" ".join(words[:size]), table)
+            if location:
+                return location
+    found = postcode_centroids.find_place(question)
+    if found:
+        return {"lat": found[1][0], "lng": found[1][1], "label": found[0], "precision": "place"}
+    return None
+
+
+def is_time_relative(question: str) -> bool:
+    """Whether the answer depends on when the question is asked, so it must not be cached"""
+    return bool(RELATIVE_TIME_PATTERN.search(question))
+
+
+def parse_nearby_filters(question: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Radius, opening time and service filters asked for alongside a proximity question"""
+    text = question.lower()
+    filters: Dict[str, Any] = {}
+    match = RADIUS_PATTERN.search(text)
+    if match:
+        filters["radius_km"] = float(match.group(1))
+    now = now or datetime.now(LOCAL_TIMEZONE)
+    day = next((i for i, name in enumerate(DAYS) if re.search(rf"\b{name.lower()}\b", text)), None)
+    weekday = day if day is not None else (now.weekday() + 1) % 7 if "tomorrow" in text else now.weekday()
+    match = OPEN_AT_PATTERN.search(text)
+    if match and parse_time(match.group(1).replace(" ", "")) is not None:
+        filters["weekday"], filters["minute"] = weekday, parse_time(match.group(1).replace(" ", ""))
+    elif re.search(r"\bopen (?:right )?now\b|\bcurrently open\b|\bstill open\b", text):
+        filters["weekday"], filters["minute"] = now.weekday(), now.hour * 60 + now.minute
+    services = [term for term, aliases in SERVICE_TERMS.items() if any(alias in text for alias in aliases)]
+    if services:
+        filters["services"] = services
+    return filters
+
+
+def nearby_outlets(lat: float, lng: float, k: int = NEARBY_DEFAULT_K, radius_km: Optional[float] = None,
+                   weekday: Optional[int] = None, minute: Optional[int] = None, services: Sequence[str] = (),
+                   prefer: Optional[np.ndarray] = None, table: Optional["OutletTable"] = None) -> List[Tuple[int, float]]:
+    """(outlet id, km) of the closest outlets matching the opening-time and service filters"""
+    table = table if table is not None else outlet_table
+    mask = np.ones(len(table), dtype=bool)
+    if minute is not None:
+        mask &= table.open_at(weekday if weekday is not None else datetime.now(LOCAL_TIMEZONE).weekday(), minute)
+    if services:
+        mask &= table.with_services(services)
+    k = max(1, min(k, NEARBY_MAX_K))
+    radius_km = min(radius_km, NEARBY_MAX_RADIUS_KM) if radius_km is not None else None
+    return table.nearest(lat, lng, k, mask, radius_km, prefer)
+
+
+def nearby_outlets_sql(matches: Sequence[Tuple[int, float]], table: str = "outlets") -> str:
+    """Deterministic SQL returning the given outlets closest first, with their distance_km"""
+    if not matches:
+        return f"SELECT * FROM {table} WHERE 0"
+    ids = ", ".join(str(int(outlet_id)) for outlet_id, _ in matches)
+    distances = " ".join(f"WHEN {int(outlet_id)} THEN {distance:.2f}" for outlet_id, distance in matches)
+    ranks = " ".join(f"WHEN {int(outlet_id)} THEN {rank}" for rank, (outlet_id, _) in enumerate(matches))
+    return (f"SELECT *, CASE id {distances} END AS distance_km FROM {table} WHERE id IN ({ids}) "
+            f"ORDER BY CASE id {ranks} END")
+
+
+def nearby_outlets_query(question: str) -> Optional[str]:
+    """SQL answering a proximity question from the spatial index, or None if it is not one or names no known place"""
+    from .utils import extract_top_k_from_query
+
+    # One version of the table throughout, so the address mask and the distances describe the same outlets
+    table = outlet_table.snapshot()
+    if not NEARBY_PATTERN.search(question) or not len(table):
+        return None
+    location = resolve_location(question, table)
+    if location is None:
+        return None
+    filters = parse_nearby_filters(question)
+    matches = nearby_outlets(location["lat"], location["lng"], extract_top_k_from_query(question), filters.get("radius_km"),
+                             filters.get("weekday"), filters.get("minute"), filters.get("services", ()),
+                             location.get("mentions"), table)
+    logger.info(f"[Outlets] Nearby {location['label']} ({location['precision']}): {len(matches)} outlets, filters {filters}")
+    return nearby_outlets_sql(matches)
+
+
+postcode_centroids = PostcodeCentroids.load(POSTCODE_CENTROIDS_PATH)
+outlet_table = OutletTable()
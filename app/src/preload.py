@@ -0,0 +1,161 @@
+"""Immutable startup data, built once per host and memory-mapped by every worker.
+
+The product catalog columns, the outlet hours, services and location
+arrays and the schema registry are written to SHARED_DATA_DIR next to a
+manifest recording the data version they were built from. Workers map
+the files read-only, so the pages exist once in the page cache however
+many workers there are, and no worker parses the CSVs or imports pandas. The first process to find the
+files missing or stale rebuilds them under a lock while the others wait.
+The local vector index file (vector_index.backend "local") is mapped the
+same way.
+
+Nothing here opens a network connection: clients are created in each
+worker after it starts, never inherited across fork.
+
+Usage (from the app directory):
+    python -m src.preload [--force]
+"""
+import os
+import json
+import logging
+import argparse
+from typing import Any, Dict, Optional
+from .utils import load_config, compute_data_version
+from .catalog import ProductCatalog, product_catalog
+from .outlets import outlet_table
+from .text2SQL import schema_registry
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+preload_config = config.get("preload", {})
+PRELOAD_ENABLED = preload_config.get("enabled", True)
+SHARED_DATA_DIR = os.getenv("SHARED_DATA_DIR", preload_config.get("shared_dir", "data/shared"))
+CATALOG_FILE = "catalog.zdat"
+OUTLETS_FILE = "outlets.zdat"
+SCHEMA_FILE = "schema.json"
+MANIFEST_FILE = "manifest.json"
+# Bumped when a file gains or changes sections, so files from an older release are rebuilt
+LAYOUT_VERSION = 2
+
+# What this process mapped, for /health
+preload_status: Dict[str, Any] = {"status": "not loaded"}
+
+
+def _outlet_paths() -> Dict[str, str]:
+    outlets_config = config.get("filepaths", {}).get("outlets", {})
+    return {
+        "csv": outlets_config.get("csv", "data/zus_outlets_final.csv"),
+        "sql": outlets_config.get("sql", "data/zus_outlets.sql"),
+        "db": outlets_config.get("db", "data/zus_outlets.db"),
+    }
+
+
+def _read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, value: Any):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _is_current(manifest: Optional[Dict[str, Any]], directory: str) -> bool:
+    return bool(manifest) and manifest.get("data_version") == compute_data_version() and \
+        manifest.get("layout") == LAYOUT_VERSION and all(
+        os.path.exists(os.path.join(directory, name)) for name in (CATALOG_FILE, OUTLETS_FILE, SCHEMA_FILE))
+
+
+def _lock(directory: str):
+    """Blocking exclusive lock on the shared directory, so one process builds while the others wait"""
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    handle = open(os.path.join(directory, ".lock"), "w")
+    fcntl.flock(handle, fcntl.LOCK_EX)
+    return handle
+
+
+def build_shared_data(directory: str = SHARED_DATA_DIR, force: bool = False) -> Dict[str, Any]:
+    """Write the shared files unless they are already current; returns the manifest"""
+    from .vectorstore import load_product_data
+    from .text2SQL import create_outlet_db_from_csv, SchemaRegistry
+    from .outlets import OutletTable
+
+    os.makedirs(directory, exist_ok=True)
+    lock = _lock(directory)
+    try:
+        paths = _outlet_paths()
+        # The outlet database is part of the data version, so it has to exist first
+        create_outlet_db_from_csv(paths["db"], paths["csv"], paths["sql"], table_name="outlets")
+        manifest = _read_manifest(directory)
+        if not force and _is_current(manifest, directory):
+            return manifest
+
+        catalog = ProductCatalog()
+        catalog.build(load_product_data())
+        catalog.save(os.path.join(directory, CATALOG_FILE))
+        outlets = OutletTable()
+        outlets.build_from_db(paths["db"])
+        outlets.save(os.path.join(directory, OUTLETS_FILE))
+        schema = SchemaRegistry()
+        schema.refresh(paths["db"])
+        _write_json(os.path.join(directory, SCHEMA_FILE), schema.tables)
+
+        manifest = {"data_version": compute_data_version(), "layout": LAYOUT_VERSION, "products": len(catalog),
+                    "outlets": len(outlets), "located_outlets": len(outlets.grid)}
+        # Written last: a manifest always describes complete files
+        _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+        logger.info(f"[Preload] Built shared data in {directory}: {manifest}")
+        return manifest
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+def load_shared_data(directory: str = SHARED_DATA_DIR) -> bool:
+    """Map the shared files into this process, building them first if missing or stale; False if that fails"""
+    global preload_status
+    try:
+        manifest = _read_manifest(directory)
+        if not _is_current(manifest, directory):
+            manifest = build_shared_data(directory)
+        product_catalog.load(os.path.join(directory, CATALOG_FILE))
+        outlet_table.load(os.path.join(directory, OUTLETS_FILE))
+        with open(os.path.join(directory, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            schema_registry.tables = json.load(f)
+    except Exception as e:
+        logger.error(f"[Preload] Could not load shared data from {directory}, building it in this worker: {e}")
+        preload_status = {"status": "failed", "error": str(e)}
+        return False
+    preload_status = {"status": "mapped", "directory": directory, "pid": os.getpid(), **manifest}
+    return True
+
+
+def preload_stats() -> Dict[str, Any]:
+    return dict(preload_status)
+
+
+def main():
+    from dotenv import load_dotenv
+    from .utils import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="rebuild even if the files are current")
+    parser.add_argument("--directory", default=SHARED_DATA_DIR)
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    print(json.dumps(build_shared_data(args.directory, force=args.force), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from .utils import load_config, UNAUTHENTICATED_USER
+from .background import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+query_log_config = config.get("query_log", {})
+QUERY_LOG_ENABLED = query_log_config.get("enabled", False)
+# Salts the user hashes so records cannot be joined back to usernames without it
+QUERY_LOG_SALT = os.getenv("QUERY_LOG_SALT", query_log_config.get("salt", ""))
+
+PII_PATTERNS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"\+?\d[\d\s-]{7,}\d"), "<phone>"),
+)
+
+
+def anonymize_prompt(prompt: str) -> str:
+    """Mask emails and phone numbers in a prompt"""
+    for pattern, placeholder in PII_PATTERNS:
+        prompt = pattern.sub(placeholder, prompt)
+    return prompt
+
+
+def anonymize_user(user_id: str) -> str:
+    """A stable pseudonym per user, so replays keep each user's traffic together"""
+    if user_id == UNAUTHENTICATED_USER:
+        return "anonymous"
+    return hashlib.sha256(f"{QUERY_LOG_SALT}:{user_id}".encode()).hexdigest()[:16]
+
+
+class QueryLog(BackgroundWriter):
+    """Append-only, gzip-compressed JSONL log of anonymized requests with size-based rotation.
+
+    Each batch is appended as its own gzip member, which gzip readers treat as
+    one continuous stream. Once the current file reaches `max_bytes` it is
+    renamed with a timestamp suffix, and only the newest `backups` are kept.
+    """
+
+    def __init__(self, path: str = "logs/queries.jsonl.gz", max_bytes: int = 50 * 1024 * 1024,
+                 backups: int = 10, **kwargs):
+        super().__init__("query-log", **kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def record(self, entry: Dict[str, Any]):
+        self.submit(entry)
+
+    def write_batch(self, batch: List[Dict[str, Any]]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(data)
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        stem = self.path[:-len(".jsonl.gz")] if self.path.endswith(".jsonl.gz") else self.path
+        os.replace(self.path, f"{stem}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz")
+        for old in rotated_files(self.path)[:-self.backups or None]:
+            os.remove(old)
+        logger.info(f"[QueryLog] Rotated {self.path}")
+
+
+def rotated_files(path: str) -> List[str]:
+    """Rotated log files for a log path, oldest first"""
+    directory = os.path.dirname(path) or "."
+    stem = os.path.basename(path)
+    stem = stem[:-len(".jsonl.gz")] if stem.endswith(".jsonl.gz") else stem
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith(f"{stem}-") and name.endswith(".jsonl.gz"))
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_records(paths: List[str]):
+    """Yield the records of one or more query logs, in file order"""
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _build_query_log() -> Optional[QueryLog]:
+    if not QUERY_LOG_ENABLED:
+        return None
+    settings = {key: query_log_config[key] for key in ("path", "max_bytes", "backups", "max_queue", "batch_size",
+                                                       "flush_interval") if key in query_log_config}
+    return QueryLog(**settings)
+
+
+query_log = _build_query_log()
+
+
+def log_chat_request(prompt: str, user_id: str, response: Any, cache: str, status: int, latency: float,
+                     timings: Optional[Dict[str, float]] = None, **fields: Any):
+    """Queue one anonymized /chat record when capture is enabled"""
+    if query_log is None:
+        return
+    if hasattr(response, "retrieved_products"):
+        intent, result_size = "product", len(response.retrieved_products)
+    elif hasattr(response, "executed_sql_result"):
+        intent, result_size = "outlet", len(response.executed_sql_result)
+    else:
+        intent, result_size = ("clarify" if response is not None else None), 0
+    query_log.record({
+        "ts": round(time.time(), 3),
+        "endpoint": "chat",
+        "user": anonymize_user(user_id),
+        "prompt": anonymize_prompt(prompt),
+        "intent": intent,
+        "cache": cache,
+        "status": status,
+        "latency_ms": round(latency * 1000, 1),
+        "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in (timings or {}).items()},
+        "result_size": result_size,
+        **fields,
+    })
+
+
+def query_log_stats() -> Dict[str, object]:
+    return {"enabled": query_log is not None, **(query_log.stats() if query_log else {})}
@@ -1,10 +1,14 @@
-from typing import Optional
+from typing import Optional, NamedTuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import time
-from collections import defaultdict
-from .utils import load_config
+import hashlib
+import threading
+from collections import defaultdict, OrderedDict
+from .utils import load_config, UNAUTHENTICATED_USER
+from .scheduler import current_user
+from .metrics import rejections
 import os
 import json
 from passlib.context import CryptContext
@@ -17,6 +21,7 @@ SECRET_KEY = config.get("auth", {}).get("secret_key", "a-string-secret-at-least-
 ALGORITHM = config.get("auth", {}).get("algorithm", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = config.get("auth", {}).get("access_token_expire_minutes", 60)
 USER_FILE = config.get("auth", {}).get("user_file", "data/users.json")
+TOKEN_CACHE_SIZE = config.get("auth", {}).get("token_cache_size", 1024)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def load_users():
@@ -39,17 +44,92 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-async def get_user_identifier(token: Optional[str] = Depends(oauth2_scheme)):
-    if token is None:
-        return "global_unauthenticated_user"
+class TokenCache:
+    """LRU cache of verified JWT claims keyed by token digest, expiring at the token's `exp`"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= now:
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, digest: bytes, claims: dict):
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            # Without an expiry we could not know when to drop the entry
+            return
+        with self._lock:
+            self._entries[digest] = (claims, float(expires_at))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+token_cache = TokenCache(max_size=TOKEN_CACHE_SIZE)
+
+class RequestIdentity(NamedTuple):
+    user_id: str
+    session_id: str
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def decode_token(token: str) -> Optional[dict]:
+    """Return the verified claims of a token, using the cache for tokens seen before"""
+    digest = token_digest(token)
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return "global_unauthenticated_user"
-        return username
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        return "global_unauthenticated_user"
+        return None
+    token_cache.put(digest, claims)
+    return claims
+
+def resolve_identity(token: Optional[str]) -> RequestIdentity:
+    """Resolve the user id and session id for a bearer token"""
+    if token is None:
+        return RequestIdentity(UNAUTHENTICATED_USER, UNAUTHENTICATED_USER)
+    claims = decode_token(token)
+    if claims is None or claims.get("sub") is None:
+        return RequestIdentity(UNAUTHENTICATED_USER, UNAUTHENTICATED_USER)
+    # The session id is derived from the token so the raw JWT never leaves this module
+    return RequestIdentity(claims["sub"], token_digest(token).hex()[:32])
+
+async def get_request_identity(token: Optional[str] = Depends(oauth2_scheme)) -> RequestIdentity:
+    identity = resolve_identity(token)
+    # Upstream LLM/embedding work is scheduled fairly per user
+    current_user.set(identity.user_id)
+    return identity
+
+async def get_user_identifier(identity: RequestIdentity = Depends(get_request_identity)) -> str:
+    return identity.user_id
 
 # --- Rate limiting constants ---
 rate_limit_config = config.get("rate_limit", {})
@@ -57,14 +137,21 @@ AUTH_RATE_LIMIT = rate_limit_config.get("auth_rate_limit", 5)
 AUTH_TIME_WINDOW_SECONDS = rate_limit_config.get("auth_time_window_seconds", 60)
 GLOBAL_RATE_LIMIT = rate_limit_config.get("global_rate_limit", 3)
 GLOBAL_TIME_WINDOW_SECONDS = rate_limit_config.get("global_time_window_seconds", 60)
+# Prompts sent through /chat/batch have their own quota over the same windows; counting each as a
+# request would turn away any batch larger than the request limit
+AUTH_BATCH_PROMPTS_PER_WINDOW = rate_limit_config.get("batch_prompts_per_window", 1000)
+GLOBAL_BATCH_PROMPTS_PER_WINDOW = rate_limit_config.get("global_batch_prompts_per_window", 100)
 
 # --- In-memory storage for user requests ---
 user_requests = defaultdict(list)
+# (time, prompt count) per batch
+batch_prompts = defaultdict(list)
 
 # --- Throttling dependency ---
-def apply_rate_limit(user_id: str = Depends(get_user_identifier)):
+def charge_rate_limit(user_id: str, cost: int = 1):
+    """Count `cost` requests against the user's window, or raise 429 if they do not all fit"""
     current_time = time.time()
-    if user_id == "global_unauthenticated_user":
+    if user_id == UNAUTHENTICATED_USER:
         rate_limit = GLOBAL_RATE_LIMIT
         time_window = GLOBAL_TIME_WINDOW_SECONDS
     else:
@@ -75,11 +162,34 @@ def apply_rate_limit(user_id: str = Depends(get_user_identifier)):
         t for t in user_requests[user_id] if t > current_time - time_window
     ]
     current_usage = len(user_requests[user_id])
-    print(f"[RateLimit] User {user_id}: {current_usage + 1}/{rate_limit} requests used in the last {time_window} seconds.")
-    if current_usage >= rate_limit:
+    print(f"[RateLimit] User {user_id}: {current_usage + cost}/{rate_limit} requests used in the last {time_window} seconds.")
+    if current_usage + cost > rate_limit:
+        rejections.inc("rate_limit")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many requests. Please try again later.",
         )
-    user_requests[user_id].append(current_time)
-    return True 
\ No newline at end of file
+    user_requests[user_id].extend([current_time] * cost)
+
+def batch_prompt_quota(user_id: str) -> int:
+    return GLOBAL_BATCH_PROMPTS_PER_WINDOW if user_id == UNAUTHENTICATED_USER else AUTH_BATCH_PROMPTS_PER_WINDOW
+
+def charge_batch_prompts(user_id: str, prompts: int):
+    """Count a batch's prompts against the user's batch quota, or raise 429 if they do not fit"""
+    current_time = time.time()
+    time_window = GLOBAL_TIME_WINDOW_SECONDS if user_id == UNAUTHENTICATED_USER else AUTH_TIME_WINDOW_SECONDS
+    quota = batch_prompt_quota(user_id)
+    batch_prompts[user_id] = [(t, n) for t, n in batch_prompts[user_id] if t > current_time - time_window]
+    used = sum(n for _, n in batch_prompts[user_id])
+    if used + prompts > quota:
+        rejections.inc("rate_limit")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Batch prompt quota of {quota} per {time_window} seconds reached. Please try again later.",
+        )
+    batch_prompts[user_id].append((current_time, prompts))
+
+# async so FastAPI runs it on the event loop; a plain def would cost a threadpool hop per request
+async def apply_rate_limit(user_id: str = Depends(get_user_identifier)):
+    charge_rate_limit(user_id)
+    return True
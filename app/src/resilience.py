@@ -0,0 +1,221 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+from .utils import load_config
+from .limiter import OverloadedError
+from .deadline import remaining, DeadlineExceededError
+from .metrics import stage_latency, upstream_errors, current_stage
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+resilience_config = config.get("resilience", {})
+STAGE_TIMEOUTS = resilience_config.get("timeouts", {})
+DEFAULT_TIMEOUT = resilience_config.get("default_timeout", 15.0)
+retry_config = resilience_config.get("retries", {})
+RETRY_ATTEMPTS = retry_config.get("max_attempts", 3)
+RETRY_BASE_DELAY = retry_config.get("base_delay", 0.2)
+RETRY_MAX_DELAY = retry_config.get("max_delay", 2.0)
+hedge_config = resilience_config.get("hedge", {})
+HEDGE_PERCENTILE = hedge_config.get("percentile", 95)
+HEDGE_MIN_SAMPLES = hedge_config.get("min_samples", 20)
+HEDGE_MIN_DELAY = hedge_config.get("min_delay", 0.05)
+breaker_config = resilience_config.get("breaker", {})
+
+
+class UpstreamTimeoutError(OverloadedError):
+    """An upstream stage did not answer within its timeout"""
+
+
+class CircuitOpenError(OverloadedError):
+    """An upstream is failing and its circuit breaker is rejecting calls"""
+
+
+def stage_timeout(stage: str) -> float:
+    return STAGE_TIMEOUTS.get(stage, DEFAULT_TIMEOUT)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient upstream failures worth retrying on an idempotent call"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)) or type(error) is OverloadedError:
+        return False
+    if isinstance(error, (asyncio.TimeoutError, UpstreamTimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in (429, 500, 502, 503, 504):
+        return True
+    # OpenAI SDK errors, and httpx transport errors from calls made on the pooled clients directly
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+                                    "ConnectError", "ConnectTimeout", "ReadError", "ReadTimeout", "WriteTimeout",
+                                    "PoolTimeout", "RemoteProtocolError")
+
+
+class LatencyTracker:
+    """Recent successful latencies per stage, for hedge delays"""
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, stage: str, latency: float):
+        self._samples.setdefault(stage, deque(maxlen=self.size)).append(latency)
+
+    def percentile(self, stage: str, pct: float):
+        samples = self._samples.get(stage)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+latency_tracker = LatencyTracker()
+
+
+class CircuitBreaker:
+    """Closed → open after consecutive failures; half-open trial call after reset_timeout"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"[CircuitBreaker] {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open", retry_after=int(self.reset_timeout))
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # A stage timeout around the caller (with_timeout on chain.ainvoke) arrives as a cancellation;
+            # one that comes with the request deadline spent is not the upstream's fault
+            left = remaining()
+            if left is None or left > 0:
+                self.record_failure()
+            raise
+        except Exception as e:
+            # Local load shedding and spent request budgets say nothing about the upstream's health
+            if type(e) is not OverloadedError and not isinstance(e, DeadlineExceededError):
+                self.record_failure()
+            raise
+        finally:
+            # Whatever ended the trial call, the next one may try again
+            self.trial_in_flight = False
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+def _build_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name, **breaker_config.get(name, {}))
+
+
+pinecone_breaker = _build_breaker("pinecone")
+embedding_breaker = _build_breaker("embedding")
+llm_breaker = _build_breaker("llm")
+
+
+async def with_timeout(stage: str, awaitable: Awaitable[Any]) -> Any:
+    """Await one upstream stage under its configured timeout, capped by the request deadline"""
+    timeout, left = stage_timeout(stage), remaining()
+    if left is not None and left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceededError(f"deadline passed before {stage}")
+    capped = left is not None and left < timeout
+    start = time.monotonic()
+    stage_token = current_stage.set(stage)
+    try:
+        result = await asyncio.wait_for(awaitable, left if capped else timeout)
+    except asyncio.TimeoutError:
+        upstream_errors.inc(stage, "timeout")
+        if capped:
+            raise DeadlineExceededError(f"deadline passed during {stage}")
+        raise UpstreamTimeoutError(f"{stage} timed out after {timeout}s")
+    except Exception as e:
+        upstream_errors.inc(stage, type(e).__name__)
+        raise
+    finally:
+        current_stage.reset(stage_token)
+    latency = time.monotonic() - start
+    latency_tracker.observe(stage, latency)
+    stage_latency.observe(latency, stage)
+    return result
+
+
+async def hedged(stage: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fn, firing one duplicate if it is still running after the stage's p95 latency"""
+    delay = latency_tracker.percentile(stage, HEDGE_PERCENTILE)
+    tasks = {asyncio.ensure_future(fn())}
+    try:
+        if delay is None:
+            return await next(iter(tasks))
+        done, _ = await asyncio.wait(tasks, timeout=max(delay, HEDGE_MIN_DELAY))
+        if not done:
+            logger.info(f"[Hedge] {stage}: firing duplicate after {delay * 1000:.0f}ms")
+            tasks.add(asyncio.ensure_future(fn()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def resilient_call(stage: str, fn: Callable[[], Awaitable[Any]], idempotent: bool = True,
+                         hedge: bool = False) -> Any:
+    """Timeout, and for idempotent calls jittered retries and optional hedging, around one upstream call"""
+    attempts = RETRY_ATTEMPTS if idempotent else 1
+    for attempt in range(1, attempts + 1):
+        try:
+            if hedge and idempotent:
+                return await hedged(stage, lambda: with_timeout(stage, fn()))
+            return await with_timeout(stage, fn())
+        except Exception as e:
+            if attempt >= attempts or not is_retryable(e):
+                raise
+            # Full jitter keeps retries from synchronizing across requests
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+            logger.warning(f"[Retry] {stage} attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
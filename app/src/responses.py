@@ -0,0 +1,79 @@
+import json
+import logging
+from typing import Any, Callable
+import numpy as np
+from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+responses_config = config.get("responses", {})
+# "auto" takes orjson, then msgspec, then the standard library, whichever is installed first
+JSON_ENCODER = responses_config.get("json_encoder", "auto")
+
+
+def _default(obj: Any) -> Any:
+    """Values the fast encoders do not know natively: models, numpy scalars, sets and the like"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return jsonable_encoder(obj)
+
+
+def _orjson_dumps() -> Callable[[Any], bytes]:
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    return lambda content: orjson.dumps(content, default=_default, option=options)
+
+
+def _msgspec_dumps() -> Callable[[Any], bytes]:
+    import msgspec
+
+    return msgspec.json.Encoder(enc_hook=_default).encode
+
+
+def _stdlib_dumps() -> Callable[[Any], bytes]:
+    # Same settings as Starlette's JSONResponse, without the whitespace
+    return lambda content: json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                                      separators=(",", ":")).encode("utf-8")
+
+
+ENCODERS = {"orjson": _orjson_dumps, "msgspec": _msgspec_dumps, "json": _stdlib_dumps}
+
+
+def _select_encoder(name: str):
+    if name != "auto":
+        try:
+            return name, ENCODERS[name]()
+        except ImportError as e:
+            raise RuntimeError(f"responses.json_encoder is {name} but the {name} package is not installed") from e
+    for candidate in ("orjson", "msgspec"):
+        try:
+            return candidate, ENCODERS[candidate]()
+        except ImportError:
+            continue
+    return "json", _stdlib_dumps()
+
+
+ENCODER_NAME, dumps = _select_encoder(JSON_ENCODER)
+logger.info(f"[Responses] Encoding JSON with {ENCODER_NAME}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with the fastest available encoder; bytes are taken as an already encoded body.
+
+    Pydantic models are encoded directly, so an endpoint can return
+    `FastJSONResponse(model)` and skip FastAPI's validate-then-encode pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
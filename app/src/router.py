@@ -1,21 +1,71 @@
-from fastapi import APIRouter, HTTPException, Depends, Form, Header
+from fastapi import APIRouter, HTTPException, Depends, Form, Response
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import asyncio
+import hashlib
 import logging
-from .vectorstore import search_products
+import time
+from datetime import datetime
+from .vectorstore import asearch_products, asearch_products_batch
+from .limiter import OverloadedError, llm_limiter, embedding_limiter
+from .scheduler import llm_scheduler, embedding_scheduler, current_user
+from .resilience import with_timeout, pinecone_breaker, embedding_breaker, llm_breaker
+from .singleflight import SingleFlight
+from .metrics import cache_requests
+from .tracing import span, tracing_stats
+from .query_log import log_chat_request, query_log_stats
+from .chat_memory import conversation_memory, compact_answer, is_follow_up, resolve_follow_up
+from .index_sync import index_sync_stats
+from .text2SQL import schema_registry
+from .outlets import (DAYS, LOCAL_TIMEZONE, NEARBY_DEFAULT_K, parse_time, postcode_centroids, locate_place,
+                      outlet_table, nearby_outlets, nearby_outlets_sql, nearby_outlets_query, is_time_relative)
+from .preload import preload_stats
+from .responses import FastJSONResponse, dumps
+from .outlet_aggregates import outlet_aggregates, refresh_outlet_aggregates
+from .http_clients import http_clients
+from .cache_warmer import cache_warmer
+from .vector_index import embedding_cache
+from .deadline import (get_request_deadline, start_request, timed, has_budget, degrade, is_degraded, server_timing,
+                       DeadlineExceededError, MIN_LLM_INTENT_BUDGET, MIN_LLM_SUMMARY_BUDGET)
+from .context_builder import build_product_context, build_outlet_context, context_stats
+from .utils import load_config, normalize_prompt, compute_data_version
 from sqlalchemy import inspect
-from .rate_limit import apply_rate_limit, get_user_identifier, load_users, save_users, pwd_context, create_access_token
-from fastapi.responses import JSONResponse
+from .rate_limit import apply_rate_limit, get_request_identity, RequestIdentity, load_users, save_users, pwd_context, create_access_token
+from .rate_limit import charge_rate_limit, charge_batch_prompts, batch_prompt_quota
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 
 logger = logging.getLogger(__name__)
 
+config = load_config()
+BATCH_MAX_PROMPTS = config.get("batch", {}).get("max_prompts", 500)
+BATCH_CONCURRENCY = config.get("batch", {}).get("concurrency", 4)
+
+# "three_call" (intent, SQL/search, summary), "combined" (one structured-output plan) or "ab"
+pipeline_config = config.get("pipeline", {})
+PIPELINE_MODE = pipeline_config.get("mode", "three_call")
+PIPELINE_AB_SPLIT = pipeline_config.get("ab_split", 0.5)
+PIPELINE_SKIP_SUMMARY = pipeline_config.get("skip_summary", True)
+PIPELINE_RENDER_MAX_ROWS = pipeline_config.get("render_max_rows", 5)
+
+# Template-rendered answers skip the summary chains, on request or automatically under load
+FAST_ANSWER_LOAD_THRESHOLD = config.get("fast_answer", {}).get("auto_load_threshold", 8)
+
 # Create router
 router = APIRouter()
 
 # Pydantic models
 class ChatInput(BaseModel):
     prompt: str
+    fast_answer: Optional[bool] = None
+    locale: Optional[str] = None
+
+class ChatBatchInput(BaseModel):
+    prompts: List[str]
+    ordered: bool = True
+    local_intent: bool = False
+    fast_answer: bool = False
+    locale: Optional[str] = None
 
 class ProductResponse(BaseModel):
     summary: str
@@ -26,6 +76,11 @@ class OutletResponse(BaseModel):
     sql_query: str = ""
     executed_sql_result: List[dict] = []
 
+class NearbyOutletsResponse(BaseModel):
+    origin: dict
+    sql_query: str = ""
+    outlets: List[dict] = []
+
 # Global variables (will be set by app.py)
 embedding_model = None
 product_summary_chain = None
@@ -33,16 +88,27 @@ outlet_write_query_chain = None
 outlet_summary_chain = None
 pinecone_index = None
 outlets_sql_db = None
+query_plan_chain = None
 
 # JWT Auth Dependency
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
 
-# Add in-memory cache for chat responses
+# Add in-memory cache for chat responses, keyed by (normalized prompt, data version)
 chat_cache = {}
+data_version = None
+# Encoded bodies of cached chat answers, so a hit is written out as stored bytes instead of re-encoded
+chat_bodies = {}
+# Generated SQL and combined query plans, keyed the same way, so a cached plan skips the planning LLM call
+plan_cache = {}
+
+# Concurrent identical requests share one pipeline execution
+chat_flight = SingleFlight("chat", upstream_calls=4)
+products_flight = SingleFlight("products", upstream_calls=3)
+outlets_flight = SingleFlight("outlets", upstream_calls=3)
 
-def set_global_variables(emb_model, prod_chain, outlet_write_chain, outlet_sum_chain, pinecone_idx, sql_db, intent_chain_):
+def set_global_variables(emb_model, prod_chain, outlet_write_chain, outlet_sum_chain, pinecone_idx, sql_db, intent_chain_, query_plan_chain_=None):
     """Set global variables from app.py"""
-    global embedding_model, product_summary_chain, outlet_write_query_chain, outlet_summary_chain, pinecone_index, outlets_sql_db, intent_chain
+    global embedding_model, product_summary_chain, outlet_write_query_chain, outlet_summary_chain, pinecone_index, outlets_sql_db, intent_chain, query_plan_chain, data_version
     embedding_model = emb_model
     product_summary_chain = prod_chain
     outlet_write_query_chain = outlet_write_chain
@@ -50,177 +116,588 @@ def set_global_variables(emb_model, prod_chain, outlet_write_chain, outlet_sum_c
     pinecone_index = pinecone_idx
     outlets_sql_db = sql_db
     intent_chain = intent_chain_
+    query_plan_chain = query_plan_chain_
+    data_version = compute_data_version()
 
-@router.get("/products", response_model=ProductResponse)
-async def get_products(query: str):
+def use_fast_answer(requested: Optional[bool]) -> bool:
+    """Honour an explicit request, otherwise switch to templates when too many pipelines are running"""
+    if requested is not None:
+        return requested
+    if not FAST_ANSWER_LOAD_THRESHOLD:
+        return False
+    in_flight = chat_flight.in_flight() + products_flight.in_flight() + outlets_flight.in_flight()
+    return in_flight >= FAST_ANSWER_LOAD_THRESHOLD
+
+@router.get("/products", response_model=ProductResponse, dependencies=[Depends(get_request_identity), Depends(get_request_deadline)])
+async def get_products(query: str, fast: Optional[bool] = None, locale: Optional[str] = None):
     """Get product information based on query"""
+    # Returned as a response, so FastAPI does not validate and encode the model a second time
+    return FastJSONResponse(await _answer_products(query, fast, locale))
+
+async def _answer_products(query: str, fast: Optional[bool] = None, locale: Optional[str] = None) -> ProductResponse:
     if not query:
         raise HTTPException(status_code=400, detail="Query parameter cannot be empty.")
     
     if not embedding_model or not product_summary_chain or not pinecone_index:
         raise HTTPException(status_code=503, detail="Models not loaded. Please try again later.")
-    
+
+    fast = use_fast_answer(fast)
+    key = (normalize_prompt(query), data_version, fast, locale)
+    return await products_flight.do(key, lambda: _run_products(query, fast, locale))
+
+async def _run_products(query: str, fast: bool = False, locale: Optional[str] = None) -> ProductResponse:
+    """Retrieve products and summarize them for a query"""
     try:
-        from .utils import extract_top_k_from_query, extract_final_answer
+        from .utils import extract_top_k_from_query
         
         actual_top_k = extract_top_k_from_query(query)
         logger.info(f"User query requested top_k: {actual_top_k}")
         
-        # Use vectorstore's search_products
-        products = search_products(query, top_k=actual_top_k)
-        
-        if not products:
-            return ProductResponse(summary="No relevant products found.", retrieved_products=[])
-        
-        # Process results
-        context_docs = []
-        retrieved_products_info = []
-        
-        for product in products:
-            context_docs.append(
-                f"Product Name: {product['name']}\n"
-                f"Category: {product['category_title']}\n"
-                f"Colors Available: {product['color']}\n"
-                f"Price: {product['price']}\n"
-                f"Description Snippet: {product.get('description', '')}"
-            )
-            
-            retrieved_products_info.append({
-                "name": product['name'],
-                "category": product['category_title'],
-                "price": product['price'],
-                "color": product['color'],
-                "image": product['image'],
-                "snippet": product.get('description', ''),
-                "score": product['score']
-            })
-        
-        if not context_docs:
-            summary = "I couldn't find any relevant products based on your query. Please try a different query."
-        else:
-            context = "\n\n---\n\n".join(context_docs)
-            full_llm_response = product_summary_chain.invoke({"context": context, "question": query})
-            if isinstance(full_llm_response, dict):
-                summary = extract_final_answer(full_llm_response.get('text', ''))
-            else:
-                summary = extract_final_answer(full_llm_response)
-        
-        return ProductResponse(summary=summary, retrieved_products=retrieved_products_info)
+        # Use vectorstore's asearch_products
+        with timed("retrieval"):
+            products = await asearch_products(query, top_k=actual_top_k)
+        return await _summarize_products(query, products, fast, locale)
         
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Error during product retrieval: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred during product retrieval: {e}")
 
-@router.get("/outlets", response_model=OutletResponse)
-async def get_outlets(query: str):
+async def _summarize_products(query: str, products: List[dict], fast: bool = False, locale: Optional[str] = None) -> ProductResponse:
+    """Summarize retrieved products for a query"""
+    from .utils import extract_final_answer
+    from .templates import render_product_answer
+
+    if not products:
+        return ProductResponse(summary="No relevant products found.", retrieved_products=[])
+    
+    retrieved_products_info = [
+        {
+            "name": product['name'],
+            "category": product['category_title'],
+            "price": product['price'],
+            "color": product['color'],
+            "image": product['image'],
+            "snippet": product.get('description', ''),
+            "score": product['score']
+        }
+        for product in products
+    ]
+    
+    if not fast and not has_budget(MIN_LLM_SUMMARY_BUDGET):
+        fast = True
+        degrade("summary")
+    if fast:
+        summary = render_product_answer(query, products, locale)
+    else:
+        context = build_product_context(query, products)
+        with timed("summary"), span("product_summary_chain.invoke", product_count=len(products)):
+            full_llm_response = await with_timeout("summary", product_summary_chain.ainvoke({"context": context, "question": query}))
+        if isinstance(full_llm_response, dict):
+            summary = extract_final_answer(full_llm_response.get('text', ''))
+        else:
+            summary = extract_final_answer(full_llm_response)
+    
+    return ProductResponse(summary=summary, retrieved_products=retrieved_products_info)
+
+@router.get("/outlets", response_model=OutletResponse, dependencies=[Depends(get_request_identity), Depends(get_request_deadline)])
+async def get_outlets(query: str, fast: Optional[bool] = None, locale: Optional[str] = None):
     """Get outlet information based on query"""
+    return FastJSONResponse(await _answer_outlets(query, fast, locale))
+
+async def _answer_outlets(query: str, fast: Optional[bool] = None, locale: Optional[str] = None) -> OutletResponse:
     if not query:
         raise HTTPException(status_code=400, detail="Query parameter cannot be empty.")
     
     if not outlet_write_query_chain or not outlet_summary_chain:
         raise HTTPException(status_code=503, detail="Models not loaded. Please try again later.")
-    
+
+    fast = use_fast_answer(fast)
+    key = (normalize_prompt(query), data_version, fast, locale)
+    return await outlets_flight.do(key, lambda: _run_outlets(query, fast, locale))
+
+async def _run_outlets(query: str, fast: bool = False, locale: Optional[str] = None) -> OutletResponse:
+    """Generate and execute SQL for a query, then summarize the rows"""
     try:
-        from .utils import extract_top_k_from_query
-        
-        actual_top_k = extract_top_k_from_query(query)
-        logger.info(f"User query requested top_k: {actual_top_k}")
-        
+        aggregate = _answer_outlet_aggregate(query, locale)
+        if aggregate is not None:
+            return aggregate
+
         # Initialize state
         state = {"question": query}
-        # Generate SQL query
-        inspector = inspect(outlets_sql_db)
-        columns = inspector.get_columns('outlets')
-        # Format table_info as a string for the prompt
-        table_info_str = 'outlets(' + ', '.join([col['name'] for col in columns]) + ')'
-        response = outlet_write_query_chain.invoke({
-            "question": state["question"],
-            "top_k": actual_top_k,
-            "dialect": outlets_sql_db.dialect,
-            "table_info": table_info_str
-        })
-        if isinstance(response, dict):
-            state["query"] = response.get('text', '')
-        else:
-            state["query"] = response
-
-        print("SQL query being used:", state["query"])
+        state["query"] = await _write_outlet_query(query)
         
         # Execute SQL query
-        from .text2SQL import execute_sql_query
-        state = execute_sql_query(state, outlets_sql_db)
-        
-        if len(state['result']) == 0:
-            state["answer"] = "I couldn't find any relevant outlets based on your query. Please try a different query."
-        else:
-            response = outlet_summary_chain.invoke({"question": state["question"], "query": state["query"], "result": state["result"]})
-            if isinstance(response, dict):
-                state["answer"] = response.get('text', '')
-            else:
-                state["answer"] = response
-        
-        return OutletResponse(
-            summary=state["answer"],
-            sql_query=state["query"],
-            executed_sql_result=state["result"]
-        )
+        state = await _execute_outlet_query(state)
+        return await _summarize_outlets(state, fast=fast, locale=locale)
         
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Error during outlet query: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred while querying outlet data: {e}")
 
+@router.get("/outlets/nearby", response_model=NearbyOutletsResponse, dependencies=[Depends(get_request_identity), Depends(get_request_deadline)])
+async def get_nearby_outlets(lat: Optional[float] = None, lng: Optional[float] = None, postcode: Optional[str] = None,
+                             place: Optional[str] = None, k: int = NEARBY_DEFAULT_K, radius_km: Optional[float] = None,
+                             open_now: bool = False, day: Optional[str] = None, at: Optional[str] = None,
+                             services: Optional[str] = None):
+    """Closest outlets to a point, postcode or place, optionally open at a time and offering services; no LLM involved"""
+    # One version of the table throughout, in case the data is reloaded meanwhile
+    table = outlet_table.snapshot()
+    if lat is not None and lng is not None:
+        origin = {"lat": lat, "lng": lng, "label": "coordinates", "precision": "exact"}
+    elif postcode:
+        found = postcode_centroids.postcode(postcode.strip())
+        origin = {"lat": found[0], "lng": found[1], "label": postcode.strip(), "precision": found[2]} if found else None
+    elif place:
+        origin = locate_place(place.strip(), table)
+    else:
+        raise HTTPException(status_code=400, detail="Give lat and lng, a postcode or a place.")
+    if origin is None:
+        raise HTTPException(status_code=404, detail="Unknown postcode or place.")
+
+    now = datetime.now(LOCAL_TIMEZONE)
+    weekday = minute = None
+    if day is not None:
+        names = [name.lower() for name in DAYS]
+        if day.lower() not in names:
+            raise HTTPException(status_code=400, detail=f"day must be one of {', '.join(DAYS)}.")
+        weekday = names.index(day.lower())
+    if at is not None:
+        minute = parse_time(at.replace(" ", ""))
+        if minute is None:
+            raise HTTPException(status_code=400, detail="at must be a time like 9pm or 9:30am.")
+    elif open_now:
+        minute = now.hour * 60 + now.minute
+    if minute is not None and weekday is None:
+        weekday = now.weekday()
+
+    terms = [term.strip() for term in (services or "").split(",") if term.strip()]
+    with timed("nearby"), span("nearby_outlets", k=k):
+        matches = nearby_outlets(origin["lat"], origin["lng"], k, radius_km, weekday, minute, terms,
+                                 origin.pop("mentions", None), table)
+    state = await _execute_outlet_query({"question": "", "query": nearby_outlets_sql(matches)})
+    return FastJSONResponse(NearbyOutletsResponse(origin=origin, sql_query=state["query"], outlets=state["result"]))
+
+def _answer_outlet_aggregate(query: str, locale: Optional[str] = None) -> Optional[OutletResponse]:
+    """Counting and rating-ranking questions answered from the precomputed aggregates, or None"""
+    with timed("aggregate"), span("outlet_aggregates.answer") as aggregate_span:
+        answer = outlet_aggregates.answer(query, locale)
+        aggregate_span.set_attribute("aggregate.hit", answer is not None)
+    if answer is None:
+        return None
+    return OutletResponse(summary=answer["summary"], sql_query=answer["sql_query"], executed_sql_result=answer["rows"])
+
+async def _write_outlet_query(query: str) -> str:
+    """Generate the SQL query that answers an outlet question"""
+    from .utils import extract_top_k_from_query
+
+    # Proximity questions are answered from the spatial index, without generating SQL
+    with span("nearby_outlets_query"):
+        sql_query = await asyncio.to_thread(nearby_outlets_query, query)
+    if sql_query is not None:
+        return sql_query
+
+    actual_top_k = extract_top_k_from_query(query)
+    logger.info(f"User query requested top_k: {actual_top_k}")
+    key = (normalize_prompt(query), data_version, "sql", actual_top_k)
+    if key in plan_cache:
+        return plan_cache[key]
+
+    with timed("sql_gen"), span("outlet_write_query_chain.invoke", top_k=actual_top_k):
+        response = await with_timeout("sql_gen", outlet_write_query_chain.ainvoke({
+            "question": query,
+            "top_k": actual_top_k,
+            "dialect": outlets_sql_db.dialect,
+            "table_info": _outlet_table_info()
+        }))
+    if isinstance(response, dict):
+        sql_query = response.get('text', '')
+    else:
+        sql_query = response
+
+    if sql_query:
+        plan_cache[key] = sql_query
+    return sql_query
+
+async def _execute_outlet_query(state: dict) -> dict:
+    """Run the generated SQL off the event loop"""
+    from .text2SQL import execute_sql_query
+
+    logger.info(f"[SQL] {state['query']}")
+    with timed("sql_exec"), span("execute_sql_query") as sql_span:
+        state = await with_timeout("sql_exec", asyncio.to_thread(execute_sql_query, state, outlets_sql_db))
+        sql_span.set_attribute("db.row_count", len(state.get("result") or []))
+    return state
+
+def _outlet_table_info() -> str:
+    if "outlets" not in schema_registry.tables:
+        inspector = inspect(outlets_sql_db)
+        schema_registry.tables["outlets"] = [col['name'] for col in inspector.get_columns('outlets')]
+    # Format table_info as a string for the prompt
+    return schema_registry.table_info("outlets")
+
+async def _summarize_outlets(state: dict, allow_render: bool = False, fast: bool = False, locale: Optional[str] = None) -> OutletResponse:
+    """Summarize executed SQL rows for an outlet question"""
+    from .templates import can_render_outlet_rows, render_outlet_answer
+
+    if not fast and state['result'] and not has_budget(MIN_LLM_SUMMARY_BUDGET):
+        fast = True
+        degrade("summary")
+    if fast or (allow_render and can_render_outlet_rows(state['result'], PIPELINE_RENDER_MAX_ROWS)):
+        state["answer"] = render_outlet_answer(state["question"], state["query"], state["result"], locale)
+    elif len(state['result']) == 0:
+        state["answer"] = "I couldn't find any relevant outlets based on your query. Please try a different query."
+    else:
+        result = build_outlet_context(state["question"], state["query"], state["result"])
+        with timed("summary"), span("outlet_summary_chain.invoke", row_count=len(state['result'])):
+            response = await with_timeout("summary", outlet_summary_chain.ainvoke({"question": state["question"], "query": state["query"], "result": result}))
+        if isinstance(response, dict):
+            state["answer"] = response.get('text', '')
+        else:
+            state["answer"] = response
+    
+    return OutletResponse(
+        summary=state["answer"],
+        sql_query=state["query"],
+        executed_sql_result=state["result"]
+    )
+
 @router.post("/chat")
 async def chat_endpoint(
     chat_input: ChatInput,
-    user_id: str = Depends(get_user_identifier),
-    _: bool = Depends(apply_rate_limit),
-    authorization: str = Header(None)
+    response: Response,
+    identity: RequestIdentity = Depends(get_request_identity),
+    timings: dict = Depends(get_request_deadline),
+    _: bool = Depends(apply_rate_limit)
 ):
-    prompt = chat_input.prompt
-    if prompt in chat_cache:
-        return chat_cache[prompt]
+    prompt = asked = chat_input.prompt
     if not prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
+    start = time.perf_counter()
+    cache, result, status, fast, reply = "miss", None, 200, False, None
+    session_id = identity.session_id
+    try:
+        # Follow-ups are rewritten into standalone questions, so everything after this stays stateless
+        history = await conversation_memory.ahistory(session_id)
+        if history and is_follow_up(prompt):
+            prompt = await _resolve_follow_up(prompt, history)
+
+        key = (normalize_prompt(prompt), data_version)
+        if key in chat_cache:
+            cache = "hit"
+            result = chat_cache[key]
+            reply = FastJSONResponse(_answer_body(key, result))
+            return reply
+
+        fast = use_fast_answer(chat_input.fast_answer)
+        if fast:
+            # Template answers are cached apart from LLM answers, which are preferred when present
+            key = key + ("fast", chat_input.locale)
+            if key in chat_cache:
+                cache = "hit"
+                result = chat_cache[key]
+                reply = FastJSONResponse(_answer_body(key, result))
+                return reply
+        if chat_flight.is_running(key):
+            cache = "coalesced"
+
+        result = await chat_flight.do(key, lambda: _run_chat(prompt, key, fast, chat_input.locale))
+        reply = FastJSONResponse(_answer_body(key, result))
+        return reply
+    except Exception as e:
+        status = getattr(e, "status_code", 504 if isinstance(e, DeadlineExceededError) else
+                         503 if isinstance(e, OverloadedError) else 500)
+        raise
+    finally:
+        if status == 200 and result is not None:
+            conversation_memory.add_turn(session_id, prompt, compact_answer(result))
+        cache_requests.inc("chat", "hit" if cache == "hit" else "miss")
+        # Per-stage time spent, for clients and browser devtools
+        if timings:
+            # The injected response's headers are not copied onto a returned one
+            (response if reply is None else reply).headers["Server-Timing"] = server_timing(timings)
+        log_chat_request(asked, identity.user_id, result, cache, status, time.perf_counter() - start, timings,
+                         fast=fast, mode=choose_pipeline_mode(prompt), degraded=is_degraded(), follow_up=prompt != asked)
+
+def _answer_body(key, answer) -> bytes:
+    """The encoded answer, kept alongside a cached answer so later hits reuse the bytes"""
+    if key not in chat_cache:
+        return dumps(answer)
+    body = chat_bodies.get(key)
+    if body is None:
+        body = chat_bodies[key] = dumps(answer)
+    return body
+
+async def _resolve_follow_up(prompt: str, history: str) -> str:
+    """Rewrite a follow-up against the session history, or take it as asked when the budget is short"""
+    if not has_budget(MIN_LLM_INTENT_BUDGET):
+        degrade("follow_up")
+        return prompt
+    with timed("follow_up"), span("follow_up_chain.invoke", history_lines=history.count("\n") + 1) as follow_up_span:
+        standalone = await resolve_follow_up(prompt, history)
+        follow_up_span.set_attribute("follow_up.rewritten", standalone != prompt)
+    logger.info(f"[Memory] Follow-up rewritten as: {standalone}")
+    return standalone
 
+async def _run_chat(prompt: str, key, fast: bool = False, locale: Optional[str] = None):
+    """Answer a chat prompt with the configured pipeline"""
     try:
-        from .utils import detect_intent
-        intent = detect_intent(prompt)
-        logger.info(f"Intent: {intent}")
-
-        # Extract JWT token from Authorization header
-        session_id = "global_unauthenticated_user"
-        if authorization and authorization.startswith("Bearer "):
-            session_id = authorization.split(" ", 1)[1]
-
-        if isinstance(intent, dict):
-            intent_type = intent.get("intent")
-            missing_info = intent.get("missing_info", "")
-            if missing_info:
-                return {"message": f"I need more information: {missing_info}"}
-            if intent_type == "product":
-                response = await get_products(prompt)
-                chat_cache[prompt] = response
-                return response
-            elif intent_type == "outlet":
-                response = await get_outlets(prompt)
-                chat_cache[prompt] = response
-                return response
-            else:
-                raise HTTPException(status_code=400, detail="Could not determine query type.")
-        elif intent == "product":
-            response = await get_products(prompt)
-            chat_cache[prompt] = response
-            return response
-        elif intent == "outlet":
-            response = await get_outlets(prompt)
-            chat_cache[prompt] = response
-            return response
-        else:
-            raise HTTPException(status_code=400, detail="Could not classify intent.")
+        mode = choose_pipeline_mode(prompt)
+        start = time.perf_counter()
+        response = await answer_with_mode(prompt, mode, fast, locale)
+        logger.info(f"[Pipeline] mode={mode} fast={fast} latency_ms={(time.perf_counter() - start) * 1000:.1f}")
+        if isinstance(response, (ProductResponse, OutletResponse)) and not is_degraded() and not is_time_relative(prompt):
+            chat_cache[key] = response
+        return response
+    except OverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Intent classification error: {e}")
         raise HTTPException(status_code=500, detail="Could not classify intent.")
 
+def choose_pipeline_mode(prompt: str) -> str:
+    """Pick the chat pipeline for a prompt; "ab" splits prompts deterministically by hash"""
+    if PIPELINE_MODE != "ab":
+        return PIPELINE_MODE
+    bucket = int(hashlib.md5(normalize_prompt(prompt).encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return "combined" if bucket < PIPELINE_AB_SPLIT else "three_call"
+
+async def answer_with_mode(prompt: str, mode: str, fast: bool = False, locale: Optional[str] = None):
+    """Answer a prompt with either the three-call or the combined pipeline"""
+    # No intent call needed: only outlet questions match the aggregate patterns
+    aggregate = _answer_outlet_aggregate(prompt, locale)
+    if aggregate is not None:
+        return aggregate
+    if mode == "combined" and query_plan_chain is not None:
+        return await _run_chat_combined(prompt, fast, locale)
+    return await _run_chat_three_call(prompt, fast, locale)
+
+async def _run_chat_three_call(prompt: str, fast: bool = False, locale: Optional[str] = None):
+    """Classify the prompt, then dispatch it to the product or outlet pipeline"""
+    from .utils import adetect_intent, classify_intent_local
+    with timed("intent"), span("detect_intent") as intent_span:
+        intent = classify_intent_local(prompt)
+        if intent == "general" or has_budget(MIN_LLM_INTENT_BUDGET):
+            intent = await adetect_intent(prompt)
+        else:
+            degrade("intent")
+            intent_span.set_attribute("intent.local", True)
+        intent_span.set_attribute("intent", str(intent))
+    logger.info(f"Intent: {intent}")
+
+    if isinstance(intent, dict):
+        intent_type = intent.get("intent")
+        missing_info = intent.get("missing_info", "")
+        if missing_info:
+            return {"message": f"I need more information: {missing_info}"}
+    else:
+        intent_type = intent
+
+    if intent_type == "product":
+        return await _answer_products(prompt, fast, locale)
+    elif intent_type == "outlet":
+        return await _answer_outlets(prompt, fast, locale)
+    raise HTTPException(status_code=400, detail="Could not classify intent.")
+
+async def _run_chat_combined(prompt: str, fast: bool = False, locale: Optional[str] = None):
+    """Classify the prompt and plan its retrieval in one structured-output call"""
+    from .utils import extract_top_k_from_query
+    from .openai_chain import QueryPlan
+
+    key = (normalize_prompt(prompt), data_version, "plan")
+    plan = plan_cache.get(key)
+    if plan is None:
+        with timed("plan"), span("query_plan_chain.invoke") as plan_span:
+            try:
+                plan = await with_timeout("plan", query_plan_chain.ainvoke({
+                    "question": prompt,
+                    "top_k": extract_top_k_from_query(prompt),
+                    "dialect": outlets_sql_db.dialect,
+                    "table_info": _outlet_table_info()
+                }))
+            except OverloadedError:
+                raise
+            except Exception as e:
+                logger.warning(f"[Pipeline] Query plan failed ({e})")
+                plan = None
+            # A refusal or an unparsed reply comes back as None; the separate calls can still answer
+            if not isinstance(plan, QueryPlan):
+                plan_span.set_attribute("plan.fallback", True)
+                logger.info("[Pipeline] No usable query plan; using the three-call pipeline")
+                return await _run_chat_three_call(prompt, fast, locale)
+            plan_span.set_attributes(intent=plan.intent, top_k=plan.top_k)
+        plan_cache[key] = plan
+    logger.info(f"Intent: {plan.intent}")
+
+    if plan.intent == "product":
+        with timed("retrieval"):
+            products = await asearch_products(plan.product_query or prompt, top_k=plan.top_k)
+        return await _summarize_products(prompt, products, fast, locale)
+    elif plan.intent == "outlet":
+        sql_query = await asyncio.to_thread(nearby_outlets_query, prompt) or plan.sql
+        if not sql_query.strip():
+            # The plan named the intent but left out the query; the outlet pipeline writes its own
+            return await _answer_outlets(prompt, fast, locale)
+        state = {"question": prompt, "query": sql_query}
+        state = await _execute_outlet_query(state)
+        return await _summarize_outlets(state, allow_render=PIPELINE_SKIP_SUMMARY, fast=fast, locale=locale)
+    raise HTTPException(status_code=400, detail="Could not classify intent.")
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(
+    batch: ChatBatchInput,
+    identity: RequestIdentity = Depends(get_request_identity)
+):
+    """Answer many prompts in one request, streamed back as NDJSON lines"""
+    if not batch.prompts:
+        raise HTTPException(status_code=400, detail="Prompts cannot be empty.")
+    max_prompts = min(BATCH_MAX_PROMPTS, batch_prompt_quota(identity.user_id))
+    if len(batch.prompts) > max_prompts:
+        raise HTTPException(status_code=400, detail=f"At most {max_prompts} prompts per batch.")
+    # The batch is one request, and its prompts draw on a quota of their own
+    charge_rate_limit(identity.user_id)
+    charge_batch_prompts(identity.user_id, len(batch.prompts))
+    if not embedding_model or not product_summary_chain or not outlet_write_query_chain or not outlet_summary_chain:
+        raise HTTPException(status_code=503, detail="Models not loaded. Please try again later.")
+
+    return StreamingResponse(_stream_batch(batch, identity.user_id), media_type="application/x-ndjson")
+
+async def _stream_batch(batch: ChatBatchInput, user_id: str):
+    """Run the shared batch stages once, then stream per-prompt summaries"""
+    from .utils import adetect_intents, extract_top_k_from_query
+    from .text2SQL import execute_sql_queries
+
+    # The body is streamed from the response's own task; its upstream calls still queue as this user
+    current_user.set(user_id)
+    prompts = batch.prompts
+    keys = [(normalize_prompt(prompt), data_version) for prompt in prompts]
+    pending = [i for i, prompt in enumerate(prompts) if prompt and keys[i] not in chat_cache]
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    # Aggregate questions need neither the intent call nor SQL generation
+    aggregates = {i: _answer_outlet_aggregate(prompts[i], batch.locale) for i in pending}
+    aggregates = {i: response for i, response in aggregates.items() if response is not None}
+    pending = [i for i in pending if i not in aggregates]
+
+    # One intent call for every uncached prompt
+    intents = await adetect_intents([prompts[i] for i in pending], use_local=batch.local_intent)
+    product_idx = [i for i, intent in zip(pending, intents) if intent == "product"]
+    outlet_idx = [i for i, intent in zip(pending, intents) if intent == "outlet"]
+
+    # One embeddings request for every product prompt
+    retrieved = await asearch_products_batch(
+        [prompts[i] for i in product_idx],
+        [extract_top_k_from_query(prompts[i]) for i in product_idx]
+    )
+    product_results = dict(zip(product_idx, retrieved))
+
+    # SQL generation with bounded concurrency, then execution on a shared connection
+    async def write_query(i):
+        async with semaphore:
+            return await _write_outlet_query(prompts[i])
+    queries = await asyncio.gather(*(write_query(i) for i in outlet_idx), return_exceptions=True)
+    outlet_errors = {i: q for i, q in zip(outlet_idx, queries) if isinstance(q, Exception)}
+    states = [
+        {"question": prompts[i], "query": q}
+        for i, q in zip(outlet_idx, queries) if i not in outlet_errors
+    ]
+    states = await asyncio.to_thread(execute_sql_queries, states, outlets_sql_db)
+    outlet_results = dict(zip([i for i in outlet_idx if i not in outlet_errors], states))
+
+    async def answer(i):
+        line = {"index": i, "prompt": prompts[i]}
+        try:
+            if not prompts[i]:
+                line["error"] = "Prompt cannot be empty."
+            elif keys[i] in chat_cache:
+                line["response"] = chat_cache[keys[i]]
+            elif i in aggregates:
+                chat_cache[keys[i]] = line["response"] = aggregates[i]
+            elif i in outlet_errors:
+                line["error"] = f"An error occurred while querying outlet data: {outlet_errors[i]}"
+            elif i in product_results or i in outlet_results:
+                async with semaphore:
+                    if i in product_results:
+                        response = await _summarize_products(prompts[i], product_results[i], batch.fast_answer, batch.locale)
+                    else:
+                        response = await _summarize_outlets(outlet_results[i], fast=batch.fast_answer, locale=batch.locale)
+                if not batch.fast_answer:
+                    chat_cache[keys[i]] = response
+                line["response"] = response
+            else:
+                line["error"] = "Could not classify intent."
+        except Exception as e:
+            logger.error(f"Error answering batch prompt {i}: {e}")
+            line["error"] = str(e)
+        return line
+
+    tasks = [asyncio.ensure_future(answer(i)) for i in range(len(prompts))]
+    try:
+        for next_line in (tasks if batch.ordered else asyncio.as_completed(tasks)):
+            line = await next_line
+            yield dumps(line) + b"\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def warm_chat_cache(prompt: str) -> str:
+    """Answer a prompt through the normal pipeline so its answer, plan and embedding land in the caches"""
+    key = (normalize_prompt(prompt), data_version)
+    if key in chat_cache:
+        return "cached"
+    # No deadline: warm-up is off the request path, so it gets the full rather than a degraded answer
+    start_request(0)
+    await chat_flight.do(key, lambda: _run_chat(prompt, key))
+    return "warmed" if key in chat_cache else "skipped"
+
+async def reload_data() -> bool:
+    """Reload product and outlet data if their files changed, dropping cache entries for the old data"""
+    global data_version
+    version = compute_data_version()
+    if version == data_version:
+        return False
+    logger.info(f"[Reload] Data changed ({data_version} -> {version}), reloading")
+    await asyncio.to_thread(_reload_data_files)
+    # Refreshing the outlet aggregates may have rewritten the database
+    data_version = version = compute_data_version()
+    for cache in (chat_cache, chat_bodies, plan_cache):
+        for key in [key for key in cache if key[1] != version]:
+            cache.pop(key, None)
+
+    from . import vectorstore
+    from .index_sync import SYNC_ON_STARTUP, run_index_sync
+    if SYNC_ON_STARTUP and pinecone_index is not None:
+        vectorstore.index_sync_task = asyncio.create_task(run_index_sync(pinecone_index, vectorstore.product_catalog))
+    return True
+
+def _reload_data_files():
+    from .preload import PRELOAD_ENABLED, load_shared_data
+    from .vectorstore import load_product_data, product_catalog
+    from .local_index import fallback_index
+    from .context_builder import precompute_snippets
+
+    db_path = config.get("filepaths", {}).get("outlets", {}).get("db", "data/zus_outlets.db")
+    # Each worker remaps the rebuilt shared files; the first one to get the lock rebuilds them
+    if not (PRELOAD_ENABLED and load_shared_data()):
+        refresh_outlet_aggregates(db_path)
+        product_catalog.build(load_product_data())
+        outlet_table.build_from_db(db_path)
+        schema_registry.refresh(db_path)
+    outlet_aggregates.open(db_path)
+    precompute_snippets(product_catalog.records())
+    fallback_index.build(product_catalog)
+
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: ready once the pipeline can answer; cache warm-up continues in the background"""
+    ready = data_version is not None
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "starting", "data_version": data_version, "warmup": cache_warmer.stats()}
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -234,7 +711,36 @@ async def health_check():
             "intent_chain": intent_chain is not None if 'intent_chain' in globals() else False,
             "outlets_sql_db": outlets_sql_db is not None,
             # add more as needed
-        }
+        },
+        "coalescing": {
+            "chat": chat_flight.stats(),
+            "products": products_flight.stats(),
+            "outlets": outlets_flight.stats(),
+        },
+        "limiters": {
+            "llm": llm_limiter.stats(),
+            "embedding": embedding_limiter.stats(),
+        },
+        "breakers": {
+            "pinecone": pinecone_breaker.stats(),
+            "embedding": embedding_breaker.stats(),
+            "llm": llm_breaker.stats(),
+        },
+        "schedulers": {
+            "llm": llm_scheduler.stats(),
+            "embedding": embedding_scheduler.stats(),
+        },
+        "tracing": tracing_stats(),
+        "query_log": query_log_stats(),
+        "chat_memory": conversation_memory.stats(),
+        "index_sync": index_sync_stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "shared_data": preload_stats(),
+        "http_clients": http_clients.stats(),
+        "cache_warmer": cache_warmer.stats(),
+        "outlet_aggregates": outlet_aggregates.stats(),
+        "plan_cache_entries": len(plan_cache),
+        "context_tokens_saved": context_stats
     }
 
 @router.post("/register")
@@ -245,7 +751,7 @@ def register(username: str = Form(...), password: str = Form(...)):
     hashed_pw = pwd_context.hash(password)
     users[username] = {"username": username, "hashed_password": hashed_pw}
     save_users(users)
-    return JSONResponse(content={"msg": "Registration successful"})
+    return FastJSONResponse(content={"msg": "Registration successful"})
 
 @router.post("/login")
 def login(username: str = Form(...), password: str = Form(...)):
@@ -254,4 +760,4 @@ def login(username: str = Form(...), password: str = Form(...)):
     if not user or not pwd_context.verify(password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(data={"sub": username})
-    return JSONResponse(content={"access_token": token, "token_type": "bearer"})
\ No newline at end of file
+    return FastJSONResponse(content={"access_token": token, "token_type": "bearer"})
\ No newline at end of file
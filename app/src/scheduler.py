@@ -0,0 +1,160 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from .utils import load_config, UNAUTHENTICATED_USER
+from .limiter import OverloadedError, llm_limiter, embedding_limiter
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+scheduler_config = config.get("scheduler", {})
+
+# The user the current request is running for, set by the auth dependency
+current_user: ContextVar[str] = ContextVar("current_user", default=UNAUTHENTICATED_USER)
+
+
+class _UserState:
+    __slots__ = ("active", "queued", "last_finish")
+
+    def __init__(self):
+        self.active = 0
+        self.queued = 0
+        self.last_finish = 0.0
+
+
+class FairScheduler:
+    """Weighted fair queuing of upstream work across user ids.
+
+    Uses start-time fair queuing: every job gets a virtual start tag of
+    max(virtual clock, the user's previous finish tag), and a finish tag one
+    `1 / weight` later. Free slots go to the queued job with the smallest start
+    tag whose user is under its own concurrency cap, so a user flooding the
+    queue only pushes its own later jobs back. Total concurrency follows
+    `capacity`, normally the adaptive limiter's current limit.
+    """
+
+    def __init__(self, name: str, capacity: Callable[[], int], authenticated_weight: float = 4.0,
+                 unauthenticated_weight: float = 1.0, max_concurrency_per_user: int = 4,
+                 unauthenticated_max_concurrency: int = 2, max_queue_per_user: int = 16,
+                 queue_timeout: float = 10.0):
+        self.name = name
+        self.capacity = capacity
+        self.authenticated_weight = authenticated_weight
+        self.unauthenticated_weight = unauthenticated_weight
+        self.max_concurrency_per_user = max_concurrency_per_user
+        self.unauthenticated_max_concurrency = unauthenticated_max_concurrency
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.rejected = 0
+        self.virtual_time = 0.0
+        self._users: Dict[str, _UserState] = {}
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def _weight(self, user_id: str) -> float:
+        return self.unauthenticated_weight if user_id == UNAUTHENTICATED_USER else self.authenticated_weight
+
+    def _max_concurrency(self, user_id: str) -> int:
+        if user_id == UNAUTHENTICATED_USER:
+            return self.unauthenticated_max_concurrency
+        return self.max_concurrency_per_user
+
+    def _tag(self, user_id: str, state: _UserState) -> float:
+        start = max(self.virtual_time, state.last_finish)
+        state.last_finish = start + 1.0 / self._weight(user_id)
+        return start
+
+    async def acquire(self, user_id: str, deadline: Optional[float] = None):
+        state = self._users.setdefault(user_id, _UserState())
+        start_tag = self._tag(user_id, state)
+        if not self._queue and self.running < self.capacity() and state.active < self._max_concurrency(user_id):
+            self._start(user_id, state, start_tag)
+            return
+        if state.queued >= self.max_queue_per_user:
+            self.rejected += 1
+            self._forget_if_idle(user_id)
+            raise OverloadedError(f"{self.name} queue for this user is full", retry_after=1)
+
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (start_tag, next(self._sequence), user_id, waiter))
+        state.queued += 1
+        # Capacity may be free while the queue head is only blocked by its own user's cap
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), max(timeout, 0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up: hand the slot back
+                self.release(user_id)
+            else:
+                waiter.cancel()
+                state.queued -= 1
+                self._forget_if_idle(user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise OverloadedError(f"{self.name} slot wait timed out", retry_after=1)
+            raise
+
+    def _start(self, user_id: str, state: _UserState, start_tag: float):
+        self.virtual_time = max(self.virtual_time, start_tag)
+        state.active += 1
+        self.running += 1
+
+    def release(self, user_id: str):
+        state = self._users[user_id]
+        state.active -= 1
+        self.running -= 1
+        self._dispatch()
+        self._forget_if_idle(user_id)
+
+    def _forget_if_idle(self, user_id: str):
+        state = self._users.get(user_id)
+        if state and state.active == 0 and state.queued == 0:
+            del self._users[user_id]
+
+    def _dispatch(self):
+        deferred = []
+        while self._queue and self.running < self.capacity():
+            entry = heapq.heappop(self._queue)
+            start_tag, _, user_id, waiter = entry
+            if waiter.done():
+                continue
+            state = self._users[user_id]
+            if state.active >= self._max_concurrency(user_id):
+                deferred.append(entry)
+                continue
+            state.queued -= 1
+            self._start(user_id, state, start_tag)
+            waiter.set_result(True)
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, deadline: Optional[float] = None):
+        user_id = user_id or current_user.get()
+        await self.acquire(user_id, deadline)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "running": self.running,
+            "queued": sum(state.queued for state in self._users.values()),
+            "active_users": len(self._users),
+            "rejected": self.rejected,
+        }
+
+
+llm_scheduler = FairScheduler("llm", lambda: max(1, int(llm_limiter.limit)), **scheduler_config)
+embedding_scheduler = FairScheduler("embedding", lambda: max(1, int(embedding_limiter.limit)), **scheduler_config)
@@ -0,0 +1,232 @@
+import os
+import abc
+import time
+import zlib
+import struct
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from .utils import load_config
+from .background import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+store_config = config.get("session_store", {})
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", store_config.get("backend", "sqlite"))
+LOCAL_TTL_SECONDS = store_config.get("local_ttl_seconds", 2.0)
+COMPRESS_MIN_BYTES = store_config.get("compress_min_bytes", 256)
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 1
+HEADER = struct.Struct("<BBIH")
+LENGTH = struct.Struct("<I")
+TOKENS = struct.Struct("<H")
+
+
+def _pack_text(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def _unpack_text(buffer: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = LENGTH.unpack_from(buffer, offset)
+    offset += LENGTH.size
+    return buffer[offset:offset + length].decode("utf-8"), offset + length
+
+
+def encode_session(revision: int, summary: str, turns: List[Tuple[str, str, int]]) -> bytes:
+    """Length-prefixed binary form of a session, zlib-compressed once it is worth it"""
+    body = b"".join([_pack_text(summary)] + [
+        _pack_text(question) + _pack_text(answer) + TOKENS.pack(min(tokens, 0xFFFF))
+        for question, answer, tokens in turns
+    ])
+    flags = 0
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body, flags = zlib.compress(body), FLAG_ZLIB
+    return HEADER.pack(FORMAT_VERSION, flags, revision, len(turns)) + body
+
+
+def decode_session(blob: bytes) -> Tuple[int, str, List[Tuple[str, str, int]]]:
+    version, flags, revision, count = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown session format version {version}")
+    body = blob[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    summary, offset = _unpack_text(body, 0)
+    turns = []
+    for _ in range(count):
+        question, offset = _unpack_text(body, offset)
+        answer, offset = _unpack_text(body, offset)
+        (tokens,) = TOKENS.unpack_from(body, offset)
+        offset += TOKENS.size
+        turns.append((question, answer, tokens))
+    return revision, summary, turns
+
+
+class SessionBackend(abc.ABC):
+    """Shared tier: session id -> serialized session, expiring at an absolute time"""
+
+    name = "none"
+
+    @abc.abstractmethod
+    def load(self, session_id: str) -> Optional[bytes]:
+        """The stored session, or None if it is missing or expired"""
+
+    @abc.abstractmethod
+    def save_many(self, items: List[Tuple[str, bytes, float]]):
+        """Store (session id, blob, expires at) items"""
+
+    def delete_expired(self):
+        pass
+
+
+class MemorySessionBackend(SessionBackend):
+    """In-process stand-in with the shared tier's semantics, for tests and single-worker runs"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._items: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(session_id)
+        if item is None or item[1] <= time.time():
+            return None
+        return item[0]
+
+    def save_many(self, items: List[Tuple[str, bytes, float]]):
+        with self._lock:
+            for session_id, blob, expires_at in items:
+                self._items[session_id] = (blob, expires_at)
+
+    def delete_expired(self):
+        now = time.time()
+        with self._lock:
+            for session_id in [k for k, (_, expires_at) in self._items.items() if expires_at <= now]:
+                del self._items[session_id]
+
+
+class SqliteSessionBackend(SessionBackend):
+    """One SQLite file in WAL mode, shared by every worker on the host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "data/sessions.db"):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process, since neither may be shared across fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, items: List[Tuple[str, bytes, float]]):
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)", items)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_expired(self):
+        self._connection().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+
+class RedisSessionBackend(SessionBackend):
+    """Any Redis-protocol server (Redis, Valkey, KeyDB); needs the optional `redis` package"""
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", key_prefix: str = "zus:session:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("session_store.backend is redis but the redis package is not installed") from e
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        return self.client.get(self.key_prefix + session_id)
+
+    def save_many(self, items: List[Tuple[str, bytes, float]]):
+        pipeline = self.client.pipeline(transaction=False)
+        now = time.time()
+        for session_id, blob, expires_at in items:
+            pipeline.set(self.key_prefix + session_id, blob, px=max(1, int((expires_at - now) * 1000)))
+        pipeline.execute()
+
+
+class SessionStore(BackgroundWriter):
+    """Write-behind front of a shared backend: saves are queued and flushed in batches off the request path"""
+
+    def __init__(self, backend: SessionBackend, cleanup_interval: float = 300.0, **kwargs):
+        super().__init__("session-store", **kwargs)
+        self.backend = backend
+        self.cleanup_interval = cleanup_interval
+        self.loads = 0
+        self.load_errors = 0
+        self._last_cleanup = time.monotonic()
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        """Blocking read from the shared tier; call it off the event loop"""
+        self.loads += 1
+        try:
+            return self.backend.load(session_id)
+        except Exception as e:
+            self.load_errors += 1
+            logger.warning(f"[SessionStore] Loading a session failed: {e}")
+            return None
+
+    def save(self, session_id: str, blob: bytes, ttl: float):
+        self.submit((session_id, blob, time.time() + ttl))
+
+    def write_batch(self, batch: List[Tuple[str, bytes, float]]):
+        # Only the newest state of each session in the batch needs writing
+        latest = {session_id: (session_id, blob, expires_at) for session_id, blob, expires_at in batch}
+        self.backend.save_many(list(latest.values()))
+        if time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = time.monotonic()
+            self.backend.delete_expired()
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.backend.name, "loads": self.loads, "load_errors": self.load_errors, **super().stats()}
+
+
+def _build_session_store() -> Optional[SessionStore]:
+    if SESSION_BACKEND == "sqlite":
+        backend = SqliteSessionBackend(store_config.get("path", "data/sessions.db"))
+    elif SESSION_BACKEND == "redis":
+        backend = RedisSessionBackend(os.getenv("REDIS_URL", store_config.get("redis_url", "redis://localhost:6379/0")),
+                                      store_config.get("key_prefix", "zus:session:"))
+    elif SESSION_BACKEND == "memory":
+        backend = MemorySessionBackend()
+    else:
+        return None
+    settings = {key: store_config[key] for key in ("cleanup_interval", "max_queue", "batch_size", "flush_interval")
+                if key in store_config}
+    return SessionStore(backend, **settings)
+
+
+session_store = _build_session_store()
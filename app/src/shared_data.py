@@ -0,0 +1,98 @@
+import os
+import json
+import struct
+import numpy as np
+from typing import Any, Dict, List, Sequence, Tuple
+
+# File layout: magic, header length, JSON header, then 64-byte aligned raw sections
+MAGIC = b"ZUSDATA\x00"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sI")
+ALIGNMENT = 64
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def write_array_file(path: str, kind: str, header: Dict[str, Any], sections: Dict[str, np.ndarray]):
+    """Write a versioned file of `kind` whose array sections can be memory-mapped back"""
+    layout, offset = {}, 0
+    for name, array in sections.items():
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += _aligned(array.nbytes)
+    header = dict(header, kind=kind, format_version=FORMAT_VERSION, sections=layout)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    data_start = _aligned(PREAMBLE.size + len(header_bytes))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, len(header_bytes)) + header_bytes)
+        for name, array in sections.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    # Readers that already mapped the old file keep it; new readers see the new one
+    os.replace(tmp_path, path)
+
+
+def read_array_file(path: str, kind: str, mmap: bool = True) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Header and sections of a file written by write_array_file; sections are read-only memory maps by default"""
+    with open(path, "rb") as f:
+        magic, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared data file")
+        header = json.loads(f.read(header_length))
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {header.get('format_version')}, expected {FORMAT_VERSION}")
+    if header.get("kind") != kind:
+        raise ValueError(f"{path} holds {header.get('kind')}, not {kind}")
+    data_start = _aligned(PREAMBLE.size + header_length)
+    sections = {}
+    for name, spec in header["sections"].items():
+        shape, dtype = tuple(spec["shape"]), np.dtype(spec["dtype"])
+        if not int(np.prod(shape)):
+            sections[name] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            # A plain ndarray view of the map: indexing a np.memmap subclass is several times slower
+            sections[name] = np.asarray(np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"],
+                                                  shape=shape))
+        else:
+            with open(path, "rb") as f:
+                f.seek(data_start + spec["offset"])
+                sections[name] = np.frombuffer(f.read(int(np.prod(shape)) * dtype.itemsize), dtype=dtype).reshape(shape)
+    return header, sections
+
+
+class TextColumn:
+    """Read-only list of strings kept as one UTF-8 buffer plus offsets, decoded on access.
+
+    Backed by a memory-mapped section, every worker on a host reads the
+    same pages instead of holding its own copy of each string.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = memoryview(np.asarray(data, dtype=np.uint8))
+        self._offsets = offsets
+
+    @staticmethod
+    def encode(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self._data[self._offsets.item(row):self._offsets.item(row + 1)].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def tolist(self) -> List[str]:
+        return list(self)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from .deadline import (MAX_BUDGET, DeadlineExceededError, start_request, remaining, stage_timings,
+                       degraded_stages)
+from .scheduler import current_user
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one shared execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is still running await the same task. Each caller waits
+    through `asyncio.shield`, so a client that disconnects only cancels its own
+    wait and never the execution the other callers depend on.
+
+    The execution does not run under the first caller's request state: it
+    gets the longest deadline any request may have, fresh stage timings and
+    a scheduler user of its own, so one client's short deadline cannot
+    degrade or time out the others. Each caller gives up at its own
+    deadline, then takes the execution's timings and degraded stages.
+    """
+
+    def __init__(self, name: str, upstream_calls: int = 1):
+        self.name = name
+        # Estimated upstream (LLM, embedding, vector, SQL) calls made by one execution
+        self.upstream_calls = upstream_calls
+        self.executions = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, Tuple[asyncio.Task, contextvars.Context]] = {}
+
+    def _shared_context(self) -> contextvars.Context:
+        context = contextvars.copy_context()
+
+        def reset():
+            start_request(MAX_BUDGET)
+            # Fair-scheduled as its own user, so the work is neither charged to nor capped by the first caller
+            current_user.set(f"singleflight:{self.name}:{self.executions}")
+        context.run(reset)
+        return context
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.executions += 1
+            context = self._shared_context()
+            # A task copies the context it is created in
+            task = context.run(asyncio.ensure_future, fn())
+            entry = self._inflight[key] = (task, context)
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+            logger.info(f"[SingleFlight] {self.name}: joined in-flight execution")
+        task, context = entry
+        left = remaining()
+        try:
+            if left is None:
+                return await asyncio.shield(task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), max(0.0, left))
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError(f"deadline passed waiting for {self.name}") from None
+        finally:
+            if task.done():
+                self._merge_request_state(context)
+
+    @staticmethod
+    def _merge_request_state(context: contextvars.Context):
+        """Copy the execution's stage timings and degraded stages into the caller's request"""
+        timings, shared_timings = stage_timings.get(), context.get(stage_timings)
+        if timings is not None and shared_timings:
+            for stage, seconds in shared_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        stages, shared_stages = degraded_stages.get(), context.get(degraded_stages)
+        if stages is not None and shared_stages:
+            stages.update(shared_stages)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+            "upstream_calls_saved": self.coalesced * self.upstream_calls,
+        }
@@ -0,0 +1,254 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+from .utils import load_config, extract_top_k_from_query
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+fast_answer_config = config.get("fast_answer", {})
+DEFAULT_LOCALE = fast_answer_config.get("locale", "en")
+MAX_LISTED = fast_answer_config.get("max_listed", 10)
+
+# Nouns carry their plural forms; Malay does not inflect for number
+MESSAGES = {
+    "en": {
+        "product": {"one": "product", "other": "products"},
+        "outlet": {"one": "outlet", "other": "outlets"},
+        "be": {"one": "is", "other": "are"},
+        "top": "Here {be} the top {count} {noun}{filters}:",
+        "found": "I found {count} {noun}{filters}:",
+        "count": "There {be} {count} {noun}{filters}.",
+        "none_products": "I couldn't find any products{filters}. Please try a different query.",
+        "none_outlets": "I couldn't find any relevant outlets{filters}. Please try a different query.",
+        "in": " in {value}",
+        "under": " under RM{value}",
+        "over": " over RM{value}",
+        "colour": " in {value}",
+        "with": " with {value}",
+        "open_after": " open after {value}",
+        "of_type": " of type {value}",
+        "hours": "Hours",
+        "rating": "{average:g}/5 from {count} reviews",
+        "more": "...and {count} more.",
+    },
+    "ms": {
+        "product": {"one": "produk", "other": "produk"},
+        "outlet": {"one": "cawangan", "other": "cawangan"},
+        "be": {"one": "", "other": ""},
+        "top": "Berikut ialah {count} {noun} teratas{filters}:",
+        "found": "Saya menemui {count} {noun}{filters}:",
+        "count": "Terdapat {count} {noun}{filters}.",
+        "none_products": "Saya tidak menemui sebarang produk{filters}. Sila cuba pertanyaan lain.",
+        "none_outlets": "Saya tidak menemui sebarang cawangan{filters}. Sila cuba pertanyaan lain.",
+        "in": " di {value}",
+        "under": " bawah RM{value}",
+        "over": " melebihi RM{value}",
+        "colour": " warna {value}",
+        "with": " dengan {value}",
+        "open_after": " dibuka selepas {value}",
+        "of_type": " jenis {value}",
+        "hours": "Waktu",
+        "rating": "{average:g}/5 daripada {count} ulasan",
+        "more": "...dan {count} lagi.",
+    },
+}
+
+COLOURS = (
+    "black", "white", "blue", "green", "red", "pink", "grey", "gray", "brown",
+    "purple", "yellow", "orange", "beige", "cream", "silver", "gold",
+)
+
+
+def _messages(locale: Optional[str]) -> Dict[str, Any]:
+    return MESSAGES.get(locale or DEFAULT_LOCALE, MESSAGES["en"])
+
+
+def _plural(forms: Dict[str, str], count: int) -> str:
+    return forms["one"] if count == 1 else forms["other"]
+
+
+def _format_price(price) -> str:
+    try:
+        return f"{float(price):.2f}"
+    except (TypeError, ValueError):
+        return str(price)
+
+
+def _has_explicit_top_k(question: str) -> bool:
+    return bool(re.search(r"\b(top|first|show me|give me|list)\s+\d+|\d+\s+(items?|products?|outlets?)", question.lower()))
+
+
+def parse_product_filters(question: str) -> Dict[str, Any]:
+    """Price bounds and colour requested in a product question"""
+    text = question.lower()
+    filters = {}
+    match = re.search(r"(under|below|less than|cheaper than|within)\s*rm\s*(\d+(?:\.\d+)?)", text)
+    if match:
+        filters["max_price"] = float(match.group(2))
+    match = re.search(r"(over|above|more than|at least)\s*rm\s*(\d+(?:\.\d+)?)", text)
+    if match:
+        filters["min_price"] = float(match.group(2))
+    colours = [c for c in COLOURS if re.search(rf"\b{c}\b", text)]
+    if colours:
+        filters["colour"] = colours[0]
+    return filters
+
+
+def parse_outlet_filters(question: str, sql_query: str) -> Dict[str, Any]:
+    """Location, service and opening-time filters behind an outlet answer"""
+    filters = {}
+    sql = sql_query or ""
+    match = re.search(r"address\s+LIKE\s+'%([^%']+)%'", sql, re.IGNORECASE)
+    if match:
+        filters["in"] = match.group(1).strip()
+    match = re.search(r"services\s+LIKE\s+'%([^%']+)%'", sql, re.IGNORECASE)
+    if match:
+        filters["with"] = match.group(1).strip()
+    match = re.search(r"open\w*\s+(?:after|until|till|past)\s+(\d{1,2}(?::\d{2})?\s*[ap]m)", question.lower())
+    if match:
+        filters["open_after"] = match.group(1).replace(" ", "")
+    return filters
+
+
+def _describe_filters(filters: Dict[str, Any], messages: Dict[str, Any]) -> str:
+    parts = []
+    for key, message_key in (("in", "in"), ("colour", "colour"), ("max_price", "under"),
+                             ("min_price", "over"), ("with", "with"), ("open_after", "open_after"),
+                             ("place_type", "of_type")):
+        if filters.get(key) is not None:
+            value = filters[key]
+            if isinstance(value, float):
+                value = f"{value:g}"
+            parts.append(messages[message_key].format(value=value))
+    return "".join(parts)
+
+
+def _header(question: str, count: int, noun: str, filters: str, messages: Dict[str, Any]) -> str:
+    template = messages["top"] if _has_explicit_top_k(question) else messages["found"]
+    return template.format(
+        count=count,
+        noun=_plural(messages[noun], count),
+        be=_plural(messages["be"], count),
+        filters=filters,
+    ).replace("  ", " ")
+
+
+def _limit(lines: List[str], total: int, messages: Dict[str, Any]) -> List[str]:
+    # lines[0] is the header, then one line per item
+    if total > MAX_LISTED:
+        return lines[:MAX_LISTED + 1] + [messages["more"].format(count=total - MAX_LISTED)]
+    return lines
+
+
+def apply_product_filters(products: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def keep(product):
+        try:
+            price = float(product.get("price"))
+        except (TypeError, ValueError):
+            price = None
+        if "max_price" in filters and price is not None and price > filters["max_price"]:
+            return False
+        if "min_price" in filters and price is not None and price < filters["min_price"]:
+            return False
+        if "colour" in filters and filters["colour"] not in str(product.get("color", "")).lower() \
+                and filters["colour"] not in str(product.get("name", "")).lower():
+            return False
+        return True
+    return [product for product in products if keep(product)]
+
+
+def render_product_answer(question: str, products: List[Dict[str, Any]], locale: str = None) -> str:
+    """Answer a product question from retrieved products, without an LLM"""
+    messages = _messages(locale)
+    filters = parse_product_filters(question)
+    products = apply_product_filters(products, filters)
+    description = _describe_filters(filters, messages)
+    if not products:
+        return messages["none_products"].format(filters=description)
+
+    top_k = extract_top_k_from_query(question)
+    products = products[:top_k] if _has_explicit_top_k(question) else products
+    lines = [_header(question, len(products), "product", description, messages)]
+    for i, product in enumerate(products, start=1):
+        line = f"{i}. {product['name']} - RM{_format_price(product.get('price'))}"
+        if product.get("color"):
+            line += f" ({product['color']})"
+        lines.append(line)
+    return "\n".join(_limit(lines, len(products), messages))
+
+
+def can_render_outlet_rows(rows: List[Dict[str, Any]], max_rows: int = 5) -> bool:
+    """Whether SQL rows are simple enough to answer without an LLM summary"""
+    if not rows or len(rows) > max_rows:
+        return False
+    if all("name" in row for row in rows):
+        return True
+    # Scalar results such as COUNT(*) or AVG(...)
+    return len(rows) == 1 and len(rows[0]) <= 3
+
+
+def render_outlet_answer(question: str, sql_query: str, rows: List[Dict[str, Any]], locale: str = None) -> str:
+    """Answer an outlet question from executed SQL rows, without an LLM"""
+    from .context_builder import compact_opening_hours
+
+    messages = _messages(locale)
+    description = _describe_filters(parse_outlet_filters(question, sql_query), messages)
+    if not rows:
+        return messages["none_outlets"].format(filters=description)
+
+    if "name" not in rows[0]:
+        values = list(rows[0].values())
+        if len(rows) == 1 and len(values) == 1 and re.search(r"count\s*\(", sql_query or "", re.IGNORECASE):
+            count = int(values[0] or 0)
+            return messages["count"].format(
+                count=count,
+                noun=_plural(messages["outlet"], count),
+                be=_plural(messages["be"], count),
+                filters=description,
+            ).replace("  ", " ")
+        return "\n".join(", ".join(f"{column}: {value}" for column, value in row.items()) for row in rows)
+
+    lines = [_header(question, len(rows), "outlet", description, messages)]
+    for i, row in enumerate(rows, start=1):
+        line = f"{i}. {row['name']}"
+        if row.get("address"):
+            line += f" - {row['address']}"
+        if row.get("opens_at") and str(row["opens_at"]) != "nan":
+            line += f" ({messages['hours']}: {compact_opening_hours(row['opens_at'])})"
+        if row.get("distance_km") is not None:
+            line += f" [{row['distance_km']:g} km]"
+        lines.append(line)
+    return "\n".join(_limit(lines, len(rows), messages))
+
+
+def render_outlet_count(count: int, filters: Dict[str, Any], locale: str = None) -> str:
+    """Answer a "how many outlets" question from a precomputed count"""
+    messages = _messages(locale)
+    return messages["count"].format(
+        count=count,
+        noun=_plural(messages["outlet"], count),
+        be=_plural(messages["be"], count),
+        filters=_describe_filters(filters, messages),
+    ).replace("  ", " ")
+
+
+def render_outlet_ranking(rows: List[Dict[str, Any]], filters: Dict[str, Any], locale: str = None) -> str:
+    """Answer a best-rated or most-reviewed question from leaderboard rows, best first"""
+    messages = _messages(locale)
+    description = _describe_filters(filters, messages)
+    if not rows:
+        return messages["none_outlets"].format(filters=description)
+    lines = [messages["top"].format(
+        count=len(rows),
+        noun=_plural(messages["outlet"], len(rows)),
+        be=_plural(messages["be"], len(rows)),
+        filters=description,
+    ).replace("  ", " ")]
+    for i, row in enumerate(rows, start=1):
+        line = f"{i}. {row['name']}"
+        if row.get("address"):
+            line += f" - {row['address']}"
+        line += f" ({messages['rating'].format(average=row['reviews_average'], count=row['reviews_count'])})"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,15 +1,35 @@
 import os
+import sqlite3
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from sqlalchemy import create_engine, text, inspect
-import pandas as pd
 from .utils import load_config
+from .outlets import outlet_table
+from .outlet_aggregates import outlet_aggregates, refresh_outlet_aggregates
 
 logger = logging.getLogger(__name__)
 
 config = load_config()
 
 
+class SchemaRegistry:
+    """Table -> column names of the outlets database, read once instead of inspected per request"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[str]] = {}
+
+    def refresh(self, db_path: str):
+        with sqlite3.connect(db_path) as conn:
+            names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            self.tables = {name: [row[1] for row in conn.execute(f"PRAGMA table_info('{name}')")] for name in names}
+
+    def table_info(self, table: str) -> str:
+        return f"{table}({', '.join(self.tables.get(table, []))})"
+
+
+schema_registry = SchemaRegistry()
+
+
 async def initialize_database():
     """Initialize the SQL database connection, creating from CSV if missing, using config.json filepaths."""
     try:
@@ -20,6 +40,12 @@ async def initialize_database():
         db_path = outlets_config.get("db", "data/zus_outlets.db")
 
         create_outlet_db_from_csv(db_path, csv_path, sql_path, table_name="outlets")
+        # Both are mapped from the shared data directory when it is in use
+        if not schema_registry.tables:
+            schema_registry.refresh(db_path)
+        if not len(outlet_table):
+            outlet_table.build_from_db(db_path)
+        outlet_aggregates.open(db_path)
         engine = create_engine(f"sqlite:///{db_path}")
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
@@ -47,6 +73,25 @@ def execute_sql_query(state: Dict[str, Any], db_engine) -> Dict[str, Any]:
         logger.error(f"Error executing SQL query: {e}")
         state["result"] = []
         return state
+
+def execute_sql_queries(states: List[Dict[str, Any]], db_engine) -> List[Dict[str, Any]]:
+    """Execute several SQL queries on one shared connection"""
+    with db_engine.connect() as conn:
+        for state in states:
+            sql_query = state.get("query", "")
+            if not sql_query:
+                state["result"] = []
+                continue
+            try:
+                result = conn.execute(text(sql_query))
+                rows = result.fetchall()
+                columns = result.keys()
+                state["result"] = [dict(zip(columns, row)) for row in rows]
+            except Exception as e:
+                logger.error(f"Error executing SQL query: {e}")
+                conn.rollback()
+                state["result"] = []
+    return states
     
 def is_db_empty(db_path: str) -> bool:
     """Check if a SQLite database is missing or contains no tables using SQLAlchemy."""
@@ -63,7 +108,8 @@ def is_db_empty(db_path: str) -> bool:
 
 def save_outlets_to_sql(outlets, sql_path: str):
     """Save outlet rows to an SQL file from iterable of dicts (e.g. csv.DictReader)"""
-        
+    import pandas as pd
+
     def safe_int(val, default=0):
         try:
             if pd.isna(val):
@@ -104,11 +150,12 @@ def save_outlets_to_sql(outlets, sql_path: str):
             )
 
 def create_outlet_db_from_csv(db_path: str, csv_path: str, sql_path: str = None, table_name: str = "outlets"):
-    """Create SQLite DB from CSV or SQL if it does not exist"""
+    """Create SQLite DB from CSV or SQL if it does not exist, then refresh the outlet aggregates"""
     if is_db_empty(db_path):
         logger.info(f"Database {db_path} not found. Creating from {csv_path} or {sql_path}...")
 
         if not os.path.exists(sql_path):
+            import pandas as pd
             df = pd.read_csv(csv_path, encoding='utf-8-sig')
             expanded_outlets_data = df.to_dict(orient='records')
             save_outlets_to_sql(expanded_outlets_data, sql_path)
@@ -127,3 +174,5 @@ def create_outlet_db_from_csv(db_path: str, csv_path: str, sql_path: str = None,
 
     else:
         logger.info(f"Database {db_path} already exists.")
+    # Counts and leaderboards are derived at ingest; a no-op when they already match the outlets rows
+    refresh_outlet_aggregates(db_path)
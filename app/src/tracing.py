@@ -0,0 +1,276 @@
+import os
+import abc
+import json
+import time
+import random
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from .utils import load_config
+from .background import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+tracing_config = config.get("tracing", {})
+TRACING_ENABLED = tracing_config.get("enabled", False)
+SAMPLE_RATE = tracing_config.get("sample_rate", 0.1)
+# A client could otherwise force every one of its requests to be recorded; only honour the
+# caller's sampled flag behind a gateway or service that sets it
+TRUST_TRACEPARENT_SAMPLING = tracing_config.get("trust_traceparent_sampling", False)
+SERVICE_NAME = tracing_config.get("service_name", "zus-chatbot-api")
+TRACE_HEADER = tracing_config.get("trace_id_header", "X-Trace-Id")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed operation in a trace, recorded in OTLP terms"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = (STATUS_OK, "")
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        for key, value in attributes.items():
+            self.attributes[key.replace("__", ".")] = value
+
+    def record_error(self, error: BaseException):
+        self.status = (STATUS_ERROR, f"{type(error).__name__}: {error}")
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.spans.append(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status[0], "message": self.status[1]} if self.status[1] else {"code": self.status[0]},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not sampled"""
+
+    trace_id = ""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    """An OTLP/JSON ExportTraceServiceRequest for a batch of spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "src.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+class BatchExporter(BackgroundWriter):
+    """Ships finished traces in OTLP/JSON batches from a background thread"""
+
+    def __init__(self, **kwargs):
+        super().__init__("trace-exporter", **kwargs)
+
+    def export(self, spans: List[Span]):
+        self.submit(spans)
+
+    def write_batch(self, batch: List[List[Span]]):
+        self.write(otlp_payload([span for trace_spans in batch for span in trace_spans]))
+
+    @abc.abstractmethod
+    def write(self, payload: Dict[str, Any]):
+        """Send one OTLP/JSON ExportTraceServiceRequest"""
+
+
+class FileExporter(BatchExporter):
+    """Appends one OTLP/JSON request per line, for local debugging or a collector's file receiver.
+
+    Like the query log, the file is rotated once it reaches `max_bytes`, and
+    only the newest `backups` rotated files are kept.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backups: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, payload: Dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        stem, extension = os.path.splitext(self.path)
+        os.replace(self.path, f"{stem}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}{extension}")
+        directory = os.path.dirname(self.path) or "."
+        name = os.path.basename(stem)
+        rotated = sorted(entry for entry in os.listdir(directory) if entry.startswith(f"{name}-") and entry.endswith(extension))
+        for old in rotated[:-self.backups or None]:
+            os.remove(os.path.join(directory, old))
+        logger.info(f"[Tracing] Rotated {self.path}")
+
+
+class OtlpHttpExporter(BatchExporter):
+    """Posts OTLP/JSON to a collector's /v1/traces endpoint"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def write(self, payload: Dict[str, Any]):
+        import requests
+        response = requests.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def _build_exporter() -> Optional[BatchExporter]:
+    kind = tracing_config.get("exporter", "file")
+    settings = {key: tracing_config[key] for key in ("max_queue", "batch_size", "flush_interval") if key in tracing_config}
+    if kind == "file":
+        return FileExporter(tracing_config.get("file_path", "traces.jsonl"), tracing_config.get("max_bytes", 50 * 1024 * 1024),
+                            tracing_config.get("backups", 5), **settings)
+    if kind == "otlp_http":
+        return OtlpHttpExporter(tracing_config.get("endpoint", "http://localhost:4318/v1/traces"), **settings)
+    return None
+
+
+exporter = _build_exporter()
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _parse_traceparent(header: Optional[str]):
+    """(trace id, parent span id, sampled) from a W3C traceparent header, or None"""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def start_trace(name: str, traceparent: Optional[str] = None) -> Span:
+    """Open the root span of a request, continuing the caller's trace when one is given"""
+    parent = _parse_traceparent(traceparent)
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, None
+    if sampled is None or not TRUST_TRACEPARENT_SAMPLING:
+        sampled = random.random() < SAMPLE_RATE
+    root = Span(Trace(trace_id, TRACING_ENABLED and sampled and exporter is not None), name, parent_id, SPAN_KIND_SERVER)
+    current_span.set(root)
+    return root
+
+
+def end_trace(root: Span):
+    """Close the root span and hand a sampled trace to the exporter"""
+    root.end()
+    current_span.set(None)
+    if root.trace.sampled:
+        exporter.export(root.trace.spans)
+
+
+def get_current_span():
+    """The active span, or a no-op span outside a sampled trace"""
+    span = current_span.get()
+    return span if span is not None and span.trace.sampled else NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Record a child span of the active one; attribute names use __ for dots (db__row_count)"""
+    parent = current_span.get()
+    if parent is None or not parent.trace.sampled:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id)
+    child.set_attributes(**attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+def tracing_stats() -> Dict[str, object]:
+    return {
+        "enabled": TRACING_ENABLED and exporter is not None,
+        "sample_rate": SAMPLE_RATE,
+        "trust_traceparent_sampling": TRUST_TRACEPARENT_SAMPLING,
+        **(exporter.stats() if exporter else {}),
+    }
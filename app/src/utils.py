@@ -1,6 +1,7 @@
 import os
 import json
 import re
+import hashlib
 import logging
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,8 @@ def load_config():
 
 config = load_config()
 
+UNAUTHENTICATED_USER = "global_unauthenticated_user"
+
 def extract_top_k_from_query(query: str) -> int:
     """Extract the number of results requested from the query"""
     patterns = [
@@ -50,17 +53,89 @@ def extract_final_answer(response: str) -> str:
             return match.group(1).strip()
     return response.strip()
 
-def detect_intent(query: str) -> str:
-    """Detect the intent of the user query using config prompts"""
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt for cache and in-flight keys (case and whitespace insensitive)"""
+    return " ".join(prompt.lower().split())
+
+def compute_data_version() -> str:
+    """Fingerprint the product and outlet data files so cached answers can tell when data changed"""
+    filepaths = config.get("filepaths", {})
+    paths = [
+        filepaths.get("products", {}).get("csv", "data/zus_products.csv"),
+        filepaths.get("outlets", {}).get("db", "data/zus_outlets.db"),
+        # Outlet coordinates are derived from it
+        config.get("geo", {}).get("postcode_centroids", "data/postcode_centroids.csv"),
+    ]
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        except OSError:
+            digest.update(f"{path}:missing;".encode())
+    return digest.hexdigest()[:12]
+
+OUTLET_KEYWORDS = (
+    "outlet", "store", "branch", "shop", "location", "where", "near", "address",
+    "open", "opening", "close", "hours", "pm", "am", "drive", "parking",
+    "pickup", "pick-up", "delivery", "dine", "selangor", "kuala lumpur", "petaling",
+)
+PRODUCT_KEYWORDS = (
+    "product", "tumbler", "cup", "mug", "bottle", "drinkware", "flask", "straw",
+    "glass", "lid", "accessor", "price", "rm", "colour", "color", "buy", "gift",
+)
+
+def classify_intent_local(query: str) -> str:
+    """Classify intent with keyword matching, without any LLM call"""
+    text = query.lower()
+    words = set(re.findall(r"[a-z\-]+", text))
+    def score(keywords):
+        return sum(1 for kw in keywords if (kw in words if len(kw) <= 3 else kw in text))
+    outlet_score = score(OUTLET_KEYWORDS)
+    product_score = score(PRODUCT_KEYWORDS)
+    if outlet_score > product_score:
+        return "outlet"
+    if product_score > outlet_score:
+        return "product"
+    return "general"
+
+async def adetect_intent(query: str) -> str:
+    """Detect the intent of the user query using config prompts, without blocking the event loop"""
+    from .limiter import OverloadedError
+    from .resilience import with_timeout
     try:
         from .openai_chain import create_intent_classification_chain
         chain = create_intent_classification_chain()
-        result = chain.invoke({"input": query})
+        result = await with_timeout("intent", chain.ainvoke({"input": query}))
         return result.strip().lower()
+    except OverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error detecting intent: {e}")
         return "general"
 
+async def adetect_intents(queries, use_local: bool = False) -> list:
+    """Classify many queries at once, with one batched LLM call or the local classifier"""
+    from .limiter import OverloadedError
+    from .resilience import with_timeout
+    if use_local or not queries:
+        return [classify_intent_local(q) for q in queries]
+    try:
+        from .openai_chain import create_batch_intent_classification_chain
+        chain = create_batch_intent_classification_chain()
+        numbered = "\n".join(f"{i + 1}. {' '.join(q.split())}" for i, q in enumerate(queries))
+        result = await with_timeout("intent", chain.ainvoke({"inputs": numbered}))
+        labels = {}
+        for match in re.finditer(r"^\s*(\d+)\s*[:.)-]\s*(product|outlet|general)", result, re.IGNORECASE | re.MULTILINE):
+            labels[int(match.group(1)) - 1] = match.group(2).lower()
+    except OverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"Error detecting batch intents: {e}")
+        labels = {}
+    # Anything the LLM skipped or mangled falls back to the local classifier
+    return [labels.get(i) or classify_intent_local(q) for i, q in enumerate(queries)]
+
 def setup_logging():
     """Setup logging configuration from environment variables"""
     log_level = os.getenv("LOG_LEVEL", "INFO")
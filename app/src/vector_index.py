@@ -0,0 +1,243 @@
+import os
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+from .utils import load_config
+from .shared_data import write_array_file, read_array_file
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+index_config = config.get("vector_index", {})
+VECTOR_BACKEND = index_config.get("backend", "pinecone")
+QUANTIZATIONS = ("float32", "float16", "int8", "binary")
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def quantize(matrix: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Codes for unit-normalized float32 rows, plus per-row scales for int8"""
+    if quantization == "float32":
+        return matrix.astype(np.float32), None
+    if quantization == "float16":
+        return matrix.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if quantization == "binary":
+        return np.packbits(matrix > 0, axis=1), None
+    raise ValueError(f"Unknown quantization {quantization!r}; use one of {QUANTIZATIONS}")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray], quantization: str, dimensions: int) -> np.ndarray:
+    if quantization == "binary":
+        return np.unpackbits(codes, axis=-1, count=dimensions).astype(np.float32) * 2 - 1
+    matrix = codes.astype(np.float32)
+    return matrix * scales[..., None] if scales is not None else matrix
+
+
+def approximate_scores(codes: np.ndarray, scales: Optional[np.ndarray], quantization: str, query: np.ndarray,
+                       chunk: int = 65536) -> np.ndarray:
+    """Similarity of a unit query to every coded row; for binary codes, the number of agreeing signs"""
+    if quantization == "float32" or not len(codes):
+        return np.asarray(codes @ query, dtype=np.float32)
+    if quantization == "binary":
+        query_bits = np.packbits(query > 0)
+        bits = codes.shape[1] * 8
+        score = lambda block: bits - POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1, dtype=np.int32)
+    else:
+        # float16 and int8 matmuls have no BLAS path, so widen a chunk at a time
+        score = lambda block: block.astype(np.float32) @ query
+    scores = np.concatenate([score(codes[i:i + chunk]) for i in range(0, len(codes), chunk)]).astype(np.float32)
+    return scores * scales if scales is not None else scores
+
+
+class LocalVectorIndex:
+    """In-process vector index with quantized codes and exact re-ranking, behind the Pinecone Index calls the app makes.
+
+    Queries score every row on its compact codes, then re-score the best
+    `top_k * oversample` candidates on the full-precision vectors. Saved
+    files are memory-mapped on load, so the full-precision section only
+    occupies memory for the rows that re-ranking touches.
+    """
+
+    def __init__(self, dimensions: int, quantization: str = "int8", rerank: bool = True, oversample: int = 4,
+                 path: Optional[str] = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; use one of {QUANTIZATIONS}")
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.rerank = rerank
+        self.oversample = oversample
+        self.path = path
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._full = np.zeros((0, dimensions), dtype=np.float32)
+        self._codes, self._scales = quantize(self._full, quantization)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, rerank: bool = True, oversample: int = 4) -> "LocalVectorIndex":
+        header, sections = read_array_file(path, "vectors")
+        index = cls(header["dimensions"], header["quantization"], rerank, oversample, path)
+        index.ids, index.metadata = header["ids"], header["metadata"]
+        index._full, index._codes, index._scales = sections["full"], sections["codes"], sections.get("scales")
+        logger.info(f"[VectorIndex] Loaded {len(index.ids)} {header['quantization']} vectors from {path}")
+        return index
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        sections = {"codes": self._codes, "full": self._full}
+        if self._scales is not None:
+            sections["scales"] = self._scales
+        write_array_file(path, "vectors", {
+            "dimensions": self.dimensions, "quantization": self.quantization,
+            "ids": self.ids, "metadata": self.metadata,
+        }, sections)
+
+    def _set_rows(self, full: np.ndarray):
+        self._full = np.ascontiguousarray(full, dtype=np.float32)
+        self._codes, self._scales = quantize(self._full, self.quantization)
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs):
+        with self._lock:
+            rows = {pid: i for i, pid in enumerate(self.ids)}
+            full = np.array(self._full)
+            added = []
+            for vector in vectors:
+                values = np.asarray(vector["values"], dtype=np.float32)
+                if values.shape != (self.dimensions,):
+                    raise ValueError(f"Vector {vector['id']} has {values.size} dimensions, index has {self.dimensions}")
+                values = _normalize(values)
+                if vector["id"] in rows:
+                    full[rows[vector["id"]]] = values
+                    self.metadata[rows[vector["id"]]] = vector.get("metadata", {})
+                else:
+                    rows[vector["id"]] = len(self.ids)
+                    self.ids.append(vector["id"])
+                    self.metadata.append(vector.get("metadata", {}))
+                    added.append(values)
+            self._set_rows(np.vstack([full] + [v[None, :] for v in added]) if added else full)
+
+    def update(self, id: str, set_metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            row = self.ids.index(id)
+            self.metadata[row] = {**self.metadata[row], **(set_metadata or {})}
+
+    def delete(self, ids: List[str], **kwargs):
+        removed = set(ids)
+        with self._lock:
+            keep = [i for i, pid in enumerate(self.ids) if pid not in removed]
+            self.ids = [self.ids[i] for i in keep]
+            self.metadata = [self.metadata[i] for i in keep]
+            self._set_rows(np.asarray(self._full)[keep])
+
+    def fetch(self, ids: List[str], **kwargs):
+        rows = {pid: i for i, pid in enumerate(self.ids)}
+        return SimpleNamespace(vectors={
+            pid: SimpleNamespace(id=pid, values=self._full[rows[pid]].tolist(), metadata=self.metadata[rows[pid]])
+            for pid in ids if pid in rows
+        })
+
+    def list(self, **kwargs):
+        for start in range(0, len(self.ids), 100):
+            yield self.ids[start:start + 100]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        return {"total_vector_count": len(self.ids), "dimension": self.dimensions}
+
+    def query(self, vector: List[float], top_k: int = 3, include_metadata: bool = False, **kwargs):
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        codes, scales, full, ids = self._codes, self._scales, self._full, self.ids
+        if not len(ids):
+            return SimpleNamespace(matches=[])
+        scores = approximate_scores(codes, scales, self.quantization, query)
+        exact = self.quantization == "float32" or not self.rerank
+        candidates = min(len(ids), top_k if exact else top_k * self.oversample)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if not exact:
+            top = np.sort(top)  # ascending rows read the memory-mapped section sequentially
+            scores = np.zeros(len(ids), dtype=np.float32)
+            scores[top] = full[top] @ query
+        top = top[np.argsort(-scores[top])][:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=ids[i], score=float(scores[i]), metadata=self.metadata[i] if include_metadata else None)
+            for i in top
+        ])
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes of the scanned codes, and of the full-precision rows kept for re-ranking"""
+        return {
+            "codes": int(self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)),
+            "full": int(self._full.nbytes),
+        }
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings, stored quantized to cut the memory of each entry"""
+
+    def __init__(self, max_entries: int = 10000, quantization: str = "int8"):
+        if quantization not in ("float32", "float16", "int8"):
+            raise ValueError("The embedding cache supports float32, float16 and int8")
+        self.max_entries = max_entries
+        self.quantization = quantization
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[np.ndarray, Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        codes, scale = entry
+        return dequantize(codes, scale, self.quantization, codes.shape[-1]).tolist()
+
+    def put(self, key: Tuple, embedding: List[float]):
+        if not self.max_entries:
+            return
+        codes, scales = quantize(_normalize(np.asarray(embedding, dtype=np.float32))[None, :], self.quantization)
+        with self._lock:
+            self._entries[key] = (codes[0], scales[0] if scales is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "quantization": self.quantization}
+
+
+def open_local_index(dimensions: int) -> LocalVectorIndex:
+    """The configured local index, loaded from its file when one exists"""
+    path = index_config.get("path", "data/product_vectors.zvec")
+    quantization = index_config.get("quantization", "int8")
+    rerank, oversample = index_config.get("rerank", True), index_config.get("oversample", 4)
+    if os.path.exists(path):
+        index = LocalVectorIndex.load(path, rerank, oversample)
+        if index.dimensions == dimensions:
+            if index.quantization != quantization:
+                # The full-precision rows are in the file, so switching codes needs no re-embedding
+                index.quantization = quantization
+                index._set_rows(np.array(index._full))
+                index.save()
+            return index
+        logger.warning(f"[VectorIndex] {path} holds {index.dimensions}-dim vectors, not {dimensions}; starting empty")
+    return LocalVectorIndex(dimensions, quantization, rerank, oversample, path)
+
+
+cache_config = config.get("embedding_cache", {})
+embedding_cache = EmbeddingCache(cache_config.get("max_entries", 10000), cache_config.get("quantization", "int8"))
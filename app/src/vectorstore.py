@@ -1,134 +1,139 @@
 import os
 import logging
-import numpy as np
-from typing import List, Dict, Any
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+import asyncio
 from .utils import load_config
+from .limiter import embedding_limiter, OverloadedError
+from .scheduler import embedding_scheduler
+from .resilience import resilient_call, pinecone_breaker, embedding_breaker
+from .local_index import fallback_index
+from .catalog import product_catalog
+from .vector_index import VECTOR_BACKEND, open_local_index, embedding_cache
+from .deadline import request_deadline
+from .tracing import span
+from .http_clients import http_clients, UpstreamHTTPError
 import openai
 from pinecone import Pinecone, ServerlessSpec
 
 logger = logging.getLogger(__name__)
 
 config = load_config()
+# Matches carry only ids and scores; products are hydrated from the local catalog
+INCLUDE_METADATA = config.get("pinecone", {}).get("include_metadata", False)
+embedding_config = config.get("models", {}).get("embedding_model", {})
+EMBEDDING_MODEL = embedding_config.get("name", "text-embedding-3-small")
+# text-embedding-3 models can return shortened vectors; None keeps the model's native size
+EMBEDDING_DIMENSIONS = embedding_config.get("dimensions")
 
 # Global variables
 pinecone_index = None
-product_data = []
+async_openai_client = None
+
+# Background index sync started at startup; kept so the task is not garbage collected
+index_sync_task = None
+
+def connect_index():
+    """Connect to the configured Pinecone index, creating it if it does not exist"""
+    # Load configuration
+    pinecone_config = config.get("pinecone", {})
+    
+    # Initialize Pinecone
+    pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    index_name = pinecone_config.get("index_name", "zus-products")
+    
+    if not pinecone_api_key:
+        raise ValueError("Pinecone API key not found. Please set the PINECONE_API_KEY environment variable.")
+    
+    # Initialize Pinecone client
+    pc = Pinecone(api_key=pinecone_api_key)
+    
+    # Get or create index
+    if index_name not in pc.list_indexes().names():
+        logger.info(f"Creating Pinecone index: {index_name}")
+        dimension = index_dimensions()
+        metric = pinecone_config.get("metric", "cosine")
+        cloud = pinecone_config.get("cloud", "aws")
+        region = pinecone_config.get("region", "us-east-1")
+        
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric=metric,
+            spec=ServerlessSpec(
+                cloud=cloud,
+                region=region
+            )
+        )
+    
+    # Connect to index
+    index = pc.Index(index_name)
+    logger.info(f"Connected to Pinecone index: {index_name}")
+    return PineconeQueryIndex(index, pc.describe_index(index_name).host, pinecone_api_key)
+
+class PineconeQueryIndex:
+    """A Pinecone index whose queries go over the pooled async HTTP client; other calls use the SDK's own"""
+
+    def __init__(self, index, host: str, api_key: str):
+        self._index = index
+        self.url = f"https://{host}/query"
+        self._headers = {"Api-Key": api_key, "Accept": "application/json"}
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    async def aquery(self, vector: list, top_k: int, include_metadata: bool = False):
+        response = await http_clients.async_client("pinecone").post(self.url, headers=self._headers, json={
+            "vector": vector, "topK": top_k, "includeMetadata": include_metadata, "includeValues": False,
+        })
+        if response.status_code >= 400:
+            raise UpstreamHTTPError("pinecone", response.status_code, response.text)
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=match["id"], score=match.get("score", 0.0), metadata=match.get("metadata"))
+            for match in response.json().get("matches", [])
+        ])
+
+def index_dimensions() -> int:
+    return EMBEDDING_DIMENSIONS or config.get("pinecone", {}).get("dimension", 1536)
+
+def open_vector_index():
+    """The configured vector index: Pinecone, or the quantized local index"""
+    if VECTOR_BACKEND == "local":
+        return open_local_index(index_dimensions())
+    return connect_index()
 
 async def initialize_vectorstore():
     """Initialize the vector store for semantic search using Pinecone"""
-    global pinecone_index, product_data
+    global pinecone_index, index_sync_task
     
     try:
-        # Load configuration
-        pinecone_config = config.get("pinecone", {})
-        
-        # Initialize Pinecone
-        pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        index_name = pinecone_config.get("index_name", "zus-products")
-        
-        if not pinecone_api_key:
-            raise ValueError("Pinecone API key not found. Please set the PINECONE_API_KEY environment variable.")
-        
-        # Initialize Pinecone client
-        pc = Pinecone(api_key=pinecone_api_key)
-        
-        # Get or create index
-        if index_name not in pc.list_indexes().names():
-            logger.info(f"Creating Pinecone index: {index_name}")
-            dimension = 1536  # OpenAI text-embedding-3-small outputs 1536-dim vectors
-            metric = pinecone_config.get("metric", "cosine")
-            cloud = pinecone_config.get("cloud", "aws")
-            region = pinecone_config.get("region", "us-east-1")
-            
-            pc.create_index(
-                name=index_name,
-                dimension=dimension,
-                metric=metric,
-                spec=ServerlessSpec(
-                    cloud=cloud,
-                    region=region
-                )
-            )
-        
-        # Connect to index
-        pinecone_index = pc.Index(index_name)
-        logger.info(f"Connected to Pinecone index: {index_name}")
+        pinecone_index = open_vector_index()
         
-        # Load product data
-        logger.info("Loading product data...")
-        product_data = load_product_data()
+        if not len(product_catalog):
+            # Not mapped from the shared data directory, so this worker loads its own copy
+            logger.info("Loading product data...")
+            product_catalog.build(load_product_data())
         
-        if not product_data:
+        if not len(product_catalog):
             logger.warning("No product data found")
             return pinecone_index
         
-        # Check if index is empty and needs to be populated
-        index_stats = pinecone_index.describe_index_stats()
-        if index_stats.get("total_vector_count", 0) == 0:
-            logger.info("Index is empty, populating with product data...")
-            await populate_pinecone_index()
+        from .context_builder import precompute_snippets
+        precompute_snippets(product_catalog.records())
+        fallback_index.build(product_catalog)
         
-        logger.info(f"Vector store initialized with {len(product_data)} products")
+        # Only new, changed and removed products are synced, in the background so startup does not wait on embeddings
+        from .index_sync import SYNC_ON_STARTUP, run_index_sync
+        if SYNC_ON_STARTUP:
+            index_sync_task = asyncio.create_task(run_index_sync(pinecone_index, product_catalog))
+        
+        logger.info(f"Vector store initialized with {len(product_catalog)} products")
         return pinecone_index
         
     except Exception as e:
         logger.error(f"Error initializing vector store: {e}")
         raise
 
-async def populate_pinecone_index():
-    """Populate Pinecone index with product data"""
-    global pinecone_index, product_data
-    
-    try:
-        # Prepare data for Pinecone
-        vectors = []
-        
-        for i, product in enumerate(product_data):
-            # Create text representation of product
-            text = f"{product.get('name', '')} {product.get('category_title', '')} {product.get('description', '')}"
-            
-            # Generate embedding
-            embedding = get_openai_embedding(text)
-            
-            # Prepare metadata
-            metadata = {
-                "text": str(text),
-                "name": str(safe_value(product.get('name', ''), "")),
-                "category_title": str(safe_value(product.get('category_title', ''), "")),
-                "image": str(safe_value(product.get('image', ''), "")),
-                "price": float(safe_value(product.get('price', 0), 0)),
-                "color": str(safe_value(product.get('color', ''), "")),
-                "description": str(safe_value(product.get('description', ''), ""))
-            }
-            
-            vectors.append({
-                "id": f"product_{i}",
-                "values": embedding,
-                "metadata": metadata
-            })
-        
-        # Upsert to Pinecone in batches
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            pinecone_index.upsert(vectors=batch)
-            logger.info(f"Upserted batch {i//batch_size + 1}/{(len(vectors) + batch_size - 1)//batch_size}")
-        
-        logger.info(f"Successfully populated Pinecone index with {len(vectors)} products")
-        
-    except Exception as e:
-        logger.error(f"Error populating Pinecone index: {e}")
-        raise
-
-def safe_value(val, default=""):
-    if val is None:
-        return default
-    if isinstance(val, float) and (np.isnan(val) or str(val).lower() == "nan"):
-        return default
-    if isinstance(val, str) and val.lower() == "nan":
-        return default
-    return val
-
 def load_product_data() -> List[Dict[str, Any]]:
     """Load product data from CSV file"""
     try:
@@ -155,54 +160,123 @@ def load_product_data() -> List[Dict[str, Any]]:
         logger.error(f"Error loading product data: {e}")
         return []
 
-def search_products(query: str, top_k: int = None) -> List[Dict[str, Any]]:
-    """Search for products using semantic similarity with Pinecone"""
-    global pinecone_index
-    
+async def asearch_products(query: str, top_k: int = None) -> List[Dict[str, Any]]:
+    """Search for products by semantic similarity, with timeouts, retries, hedging and a local fallback index"""
+    if top_k is None:
+        top_k = config.get("pinecone", {}).get("top_k", 3)
     if not pinecone_index:
         logger.error("Vector store not initialized")
-        return []
+        return fallback_index.search(query, top_k)
     
     try:
-        # Get top_k from config if not provided
-        if top_k is None:
-            top_k = config.get("pinecone", {}).get("top_k", 3)
-        
-        # Generate query embedding
-        query_embedding = get_openai_embedding(query)
-        
-        # Query Pinecone
-        results = pinecone_index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
-        
-        # Process results
-        products = []
-        for match in results.matches:
-            if match.metadata:
-                product = {
-                    "name": match.metadata.get("name", ""),
-                    "category_title": match.metadata.get("category_title", ""),
-                    "image": match.metadata.get("image", ""),
-                    "price": match.metadata.get("price", ""),
-                    "color": match.metadata.get("color", ""),
-                    "description": match.metadata.get("description", ""),
-                    "score": match.score
-                }
-                products.append(product)
-        
-        return products
-        
+        query_embedding = await aget_openai_embedding(query)
+        return await aquery_index(query_embedding, top_k)
     except Exception as e:
-        logger.error(f"Error searching products: {e}")
+        if type(e) is OverloadedError:
+            raise
+        logger.warning(f"Vector search unavailable ({e}); using local fallback index")
+        with span("fallback_index.search", top_k=top_k):
+            return fallback_index.search(query, top_k)
+
+async def asearch_products_batch(queries: List[str], top_ks: List[int] = None) -> List[List[Dict[str, Any]]]:
+    """Search products for many queries with one embeddings request and concurrent vector queries"""
+    if not queries:
         return []
+    if top_ks is None:
+        top_ks = [config.get("pinecone", {}).get("top_k", 3)] * len(queries)
+    if not pinecone_index:
+        logger.error("Vector store not initialized")
+        return [fallback_index.search(q, k) for q, k in zip(queries, top_ks)]
+    
+    try:
+        embeddings = await aget_openai_embeddings(queries)
+    except Exception as e:
+        if type(e) is OverloadedError:
+            raise
+        logger.warning(f"Embedding product queries failed ({e}); using local fallback index")
+        return [fallback_index.search(q, k) for q, k in zip(queries, top_ks)]
+    
+    async def query_one(query, embedding, top_k):
+        try:
+            return await aquery_index(embedding, top_k)
+        except Exception as e:
+            logger.warning(f"Vector search unavailable ({e}); using local fallback index")
+            return fallback_index.search(query, top_k)
+    
+    return await asyncio.gather(*(query_one(q, e, k) for q, e, k in zip(queries, embeddings, top_ks)))
+
+async def aquery_index(embedding: list, top_k: int) -> List[Dict[str, Any]]:
+    """Query Pinecone behind its circuit breaker, with timeout, jittered retries and hedging"""
+    def query():
+        if hasattr(pinecone_index, "aquery"):
+            return pinecone_index.aquery(vector=embedding, top_k=top_k, include_metadata=INCLUDE_METADATA)
+        return asyncio.to_thread(pinecone_index.query, vector=embedding, top_k=top_k, include_metadata=INCLUDE_METADATA)
+    with span("pinecone_index.query", top_k=top_k) as query_span:
+        results = await pinecone_breaker.call(lambda: resilient_call("vector_query", query, hedge=True))
+        query_span.set_attribute("match_count", len(results.matches))
+    return _hydrate(results.matches)
+
+def _hydrate(matches) -> List[Dict[str, Any]]:
+    """Products for vector matches, looked up in the catalog by id"""
+    products = []
+    for match in matches:
+        product = product_catalog.get(match.id, match.score)
+        # Ids the catalog lacks belong to products index sync has not deleted yet
+        if product is not None:
+            products.append(product)
+    return products
+
+def _dimension_args(model: str) -> Dict[str, Any]:
+    # Older models reject the parameter, so it is only sent when configured
+    return {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS and model.startswith("text-embedding-3") else {}
 
-def get_openai_embedding(text: str, model: str = "text-embedding-3-small") -> list:
-    """Get embedding from OpenAI for a given text and model."""
-    response = openai.embeddings.create(
-        input=[text],
-        model=model
-    )
-    return response.data[0].embedding
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    global async_openai_client
+    if async_openai_client is None:
+        # Retries are done by resilient_call, with jitter
+        async_openai_client = openai.AsyncOpenAI(max_retries=0, http_client=http_clients.async_client("openai"))
+    return async_openai_client
+
+def _reset_clients_after_fork():
+    # A child must not share the parent's sockets; the clients are created again on first use
+    global async_openai_client
+    async_openai_client = None
+
+os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+async def aget_openai_embedding(text: str, model: str = EMBEDDING_MODEL) -> list:
+    """Embedding for one text; see aget_openai_embeddings."""
+    return (await aget_openai_embeddings([text], model))[0]
+
+async def aget_openai_embeddings(texts: List[str], model: str = EMBEDDING_MODEL, use_cache: bool = True,
+                                 stage: str = "embedding", hedge: bool = True,
+                                 user_id: Optional[str] = None) -> List[list]:
+    """Embeddings for many texts in one request: cached, fair-scheduled, concurrency limited, hedged and retried.
+
+    `stage` picks the timeout and latency history; bulk callers pass their own
+    so they neither time out on nor skew the request path's hedge delays.
+    """
+    keys = [(model, EMBEDDING_DIMENSIONS, " ".join(text.split())) for text in texts]
+    embeddings = [embedding_cache.get(key) if use_cache else None for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return embeddings
+
+    async def create():
+        deadline = request_deadline.get()
+        async with embedding_scheduler.slot(user_id, deadline=deadline):
+            async with embedding_limiter.slot(deadline):
+                return await get_async_openai_client().embeddings.create(
+                    input=[texts[i] for i in missing],
+                    model=model,
+                    **_dimension_args(model)
+                )
+    with span("get_openai_embedding", model=model, batch_size=len(missing)) as embedding_span:
+        response = await embedding_breaker.call(lambda: resilient_call(stage, create, hedge=hedge))
+        embedding_span.set_attribute("llm.prompt_tokens", response.usage.prompt_tokens)
+    for item in response.data:
+        i = missing[item.index]
+        embeddings[i] = item.embedding
+        if use_cache:
+            embedding_cache.put(keys[i], item.embedding)
+    return embeddings
@@ -0,0 +1,56 @@
+import pytest
+from src.background import BackgroundWriter
+from src.session_store import MemorySessionBackend, SessionBackend, SessionStore
+
+
+class ListWriter(BackgroundWriter):
+    def __init__(self, **kwargs):
+        super().__init__("test-writer", **kwargs)
+        self.items = []
+
+    def write_batch(self, batch):
+        self.items.extend(batch)
+
+
+def test_close_writes_queued_items():
+    writer = ListWriter(batch_size=3, flush_interval=60.0)
+    for i in range(10):
+        writer.submit(i)
+    writer.close()
+    assert writer.items == list(range(10))
+    assert not writer._thread.is_alive()
+    writer.submit(10)
+    assert writer.stats() == {"written": 10, "dropped": 1}
+
+
+def test_close_without_items():
+    ListWriter().close()
+
+
+def test_session_saves_survive_shutdown():
+    backend = MemorySessionBackend()
+    store = SessionStore(backend, flush_interval=60.0)
+    store.save("session", b"blob", ttl=60)
+    store.close()
+    assert backend.load("session") == b"blob"
+
+
+def test_writers_and_backends_are_abstract():
+    with pytest.raises(TypeError):
+        BackgroundWriter("writer")
+    with pytest.raises(TypeError):
+        SessionBackend()
+
+
+def test_trace_exporter_flushes_at_close(tmp_path):
+    from src.tracing import BatchExporter, FileExporter, Span, Trace
+
+    with pytest.raises(TypeError):
+        BatchExporter()
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path), flush_interval=60.0)
+    root = Span(Trace("a" * 32, True), "GET /")
+    root.end()
+    exporter.export(root.trace.spans)
+    exporter.close()
+    assert path.read_text().count('"name": "GET /"') == 1
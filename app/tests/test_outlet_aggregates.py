@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import pytest
+from src.outlet_aggregates import OutletAggregates
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "zus_outlets.db")
+
+
+@pytest.fixture(scope="module")
+def aggregates():
+    aggregates = OutletAggregates()
+    aggregates.open(DB_PATH)
+    return aggregates
+
+
+@pytest.mark.parametrize("question", [
+    "how many outlets have wifi",
+    "how many outlets have parking",
+    "how many outlets serve breakfast",
+    "how many outlets accept credit cards",
+    "how many outlets are halal certified",
+    "how many new outlets opened this year",
+    "how many outlets were closed",
+    "how many outlets in Johor Bahru",
+    "how many outlets in Selangor open after 10pm",
+    "how many outlets near KLCC",
+    "how many outlets on Jalan Ampang",
+    "how many outlets in the Klang Valley",
+    "how many tumblers are under RM100",
+    "which outlets have the lowest ratings",
+    "show me the 5 highest rated stores",
+])
+def test_declines_unrecognised_conditions(aggregates, question):
+    assert aggregates.parse(question) is None
+    assert aggregates.answer(question) is None
+
+
+@pytest.mark.parametrize("question, filters", [
+    ("How many outlets are there?", {}),
+    ("How many outlets in Selangor?", {"state": "Selangor"}),
+    ("how many ZUS outlets are in KL", {"state": "Kuala Lumpur"}),
+    ("How many outlets in Kuala Selangor?", {"city": "Kuala Selangor"}),
+    ("How many outlets in Petaling Jaya offer delivery?", {"city": "Petaling Jaya", "service": ["delivery"]}),
+])
+def test_counts(aggregates, question, filters):
+    plan = aggregates.parse(question)
+    assert plan is not None and plan["kind"] == "count"
+    assert {dimension: [term for term, _ in value] if dimension == "service" else value
+            for dimension, value in plan["filters"].items()} == filters
+
+
+def test_count_answers(aggregates):
+    assert "160" in aggregates.answer("How many outlets in Selangor?")["summary"]
+    assert "87" in aggregates.answer("How many outlets in KL?")["summary"]
+
+
+def test_ranking_top_k(aggregates):
+    assert aggregates.parse("Show me 5 highest rated outlets")["top_k"] == 5
+    assert aggregates.parse("most reviewed 4 outlets in KL")["top_k"] == 4
+
+
+def test_ranking(aggregates):
+    plan = aggregates.parse("Which are the top 3 best rated outlets in Selangor?")
+    assert plan == {"kind": "ranking", "metric": "reviews_average", "filters": {"state": "Selangor"}, "top_k": 3}
+    assert len(aggregates.answer("Which are the top 3 best rated outlets in Selangor?")["rows"]) == 3
+
+
+def test_reopen_closes_the_previous_connection():
+    aggregates = OutletAggregates()
+    aggregates.open(DB_PATH)
+    first = aggregates.conn
+    aggregates.open(DB_PATH)
+    assert aggregates.conn is not first
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")
+    assert "160" in aggregates.answer("How many outlets in Selangor?")["summary"]
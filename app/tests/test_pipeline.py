@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src import router
+from src.openai_chain import QueryPlan
+
+
+class PlanChain:
+    def __init__(self, reply=None, error=None):
+        self.reply, self.error = reply, error
+
+    async def ainvoke(self, inputs):
+        if self.error:
+            raise self.error
+        return self.reply
+
+
+@pytest.fixture
+def combined(monkeypatch):
+    calls = []
+
+    async def three_call(prompt, fast=False, locale=None):
+        calls.append(prompt)
+        return "three-call answer"
+
+    monkeypatch.setattr(router, "_run_chat_three_call", three_call)
+    monkeypatch.setattr(router, "_outlet_table_info", lambda: "outlets(name, address)")
+    monkeypatch.setattr(router, "outlets_sql_db", SimpleNamespace(dialect="sqlite"))
+    router.plan_cache.clear()
+    yield calls
+    router.plan_cache.clear()
+
+
+@pytest.mark.parametrize("chain", [PlanChain(reply=None), PlanChain(error=ValueError("could not parse QueryPlan"))])
+def test_missing_plan_falls_back_to_three_call(combined, monkeypatch, chain):
+    monkeypatch.setattr(router, "query_plan_chain", chain)
+    prompt = "Which outlets open late?"
+    assert asyncio.run(router._run_chat_combined(prompt)) == "three-call answer"
+    assert combined == [prompt]
+    assert not router.plan_cache
+
+
+def test_general_plan_is_not_a_fallback(combined, monkeypatch):
+    monkeypatch.setattr(router, "query_plan_chain", PlanChain(reply=QueryPlan(intent="general")))
+    with pytest.raises(router.HTTPException):
+        asyncio.run(router._run_chat_combined("Tell me a joke"))
+    assert combined == []
+
+
+def test_outlet_plan_without_sql_uses_the_outlet_pipeline(combined, monkeypatch):
+    async def answer_outlets(prompt, fast=False, locale=None):
+        return "outlet pipeline answer"
+
+    monkeypatch.setattr(router, "query_plan_chain", PlanChain(reply=QueryPlan(intent="outlet", sql="")))
+    monkeypatch.setattr(router, "_answer_outlets", answer_outlets)
+    assert asyncio.run(router._run_chat_combined("Which outlets have parking?")) == "outlet pipeline answer"
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from src import rate_limit, router
+from src.rate_limit import RequestIdentity
+
+
+@pytest.fixture(autouse=True)
+def clean_logs():
+    rate_limit.user_requests.clear()
+    rate_limit.batch_prompts.clear()
+    yield
+    rate_limit.user_requests.clear()
+    rate_limit.batch_prompts.clear()
+
+
+@pytest.fixture
+def models_loaded(monkeypatch):
+    for name in ("embedding_model", "product_summary_chain", "outlet_write_query_chain", "outlet_summary_chain"):
+        monkeypatch.setattr(router, name, object())
+
+
+def batch(user_id: str, prompts: int):
+    body = router.ChatBatchInput(prompts=[f"question {i}" for i in range(prompts)])
+    return asyncio.run(router.chat_batch_endpoint(body, RequestIdentity(user_id, user_id)))
+
+
+def test_batch_larger_than_request_limit_is_admitted(models_loaded):
+    prompts = rate_limit.AUTH_RATE_LIMIT * 10
+    assert isinstance(batch("alice", prompts), StreamingResponse)
+    assert len(rate_limit.user_requests["alice"]) == 1
+
+
+def test_batch_prompt_quota(models_loaded, monkeypatch):
+    monkeypatch.setattr(rate_limit, "AUTH_BATCH_PROMPTS_PER_WINDOW", 30)
+    batch("alice", 20)
+    with pytest.raises(HTTPException) as error:
+        batch("alice", 20)
+    assert error.value.status_code == 429
+
+
+def test_batch_over_quota_is_rejected_up_front(models_loaded):
+    with pytest.raises(HTTPException) as error:
+        batch(rate_limit.UNAUTHENTICATED_USER, rate_limit.GLOBAL_BATCH_PROMPTS_PER_WINDOW + 1)
+    assert error.value.status_code == 400
+    assert not rate_limit.batch_prompts
@@ -0,0 +1,50 @@
+from src.catalog import ProductCatalog
+from src.local_index import LocalProductIndex
+from src.outlets import OutletTable
+
+OLD_PRODUCTS = [
+    {"name": "Steel Tumbler", "category_title": "Tumbler", "price": 55.0, "color": "black", "description": "Keeps coffee hot"},
+    {"name": "Glass Cup", "category_title": "Cup", "price": 25.0, "color": "clear", "description": "For cold brew"},
+]
+NEW_PRODUCTS = [
+    {"name": "Ceramic Mug", "category_title": "Mug", "price": 39.0, "color": "white", "description": "A daily mug"},
+]
+
+
+def test_catalog_snapshot_keeps_its_version_through_a_rebuild():
+    catalog = ProductCatalog()
+    catalog.build(OLD_PRODUCTS)
+    snapshot = catalog.snapshot()
+    catalog.build(NEW_PRODUCTS)
+    assert [p["name"] for p in snapshot.records()] == ["Steel Tumbler", "Glass Cup"]
+    assert snapshot.price.tolist() == [55.0, 25.0]
+    assert [p["name"] for p in catalog.records()] == ["Ceramic Mug"]
+    assert catalog.get(snapshot.ids[0], 1.0) is None
+
+
+def test_fallback_index_reads_the_catalog_it_was_built_from():
+    catalog = ProductCatalog()
+    catalog.build(OLD_PRODUCTS)
+    index = LocalProductIndex()
+    index.build(catalog)
+    # The shared catalog is rebuilt before the index, as in a data reload
+    catalog.build(NEW_PRODUCTS)
+    assert index.search("glass cup", 1)[0]["name"] == "Glass Cup"
+    index.build(catalog)
+    assert index.search("ceramic mug", 1)[0]["name"] == "Ceramic Mug"
+
+
+def test_outlet_table_snapshot_keeps_its_version_through_a_rebuild():
+    table = OutletTable()
+    table.build([{"id": 1, "name": "ZUS Coffee SS2", "address": "Jalan SS 2/55, 47300 Petaling Jaya, Selangor",
+                  "services": "Dine-in, Takeaway", "opens_at": "Monday, 8am-10pm"},
+                 {"id": 2, "name": "ZUS Coffee Bangsar", "address": "Jalan Telawi, 59100 Kuala Lumpur",
+                  "services": "Delivery", "opens_at": "Monday, 8am-6pm"}])
+    snapshot = table.snapshot()
+    table.build([{"id": 7, "name": "ZUS Coffee Penang", "address": "Lebuh Chulia, 10200 George Town, Penang",
+                  "services": "Takeaway", "opens_at": "Monday, 9am-9pm"}])
+    assert snapshot.ids.tolist() == [1, 2]
+    assert snapshot.open_at(0, 20 * 60).tolist() == [True, False]
+    assert snapshot.with_services(["delivery"]).tolist() == [False, True]
+    assert table.ids.tolist() == [7]
+    assert table.with_services(["delivery"]).tolist() == [False]
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from src.resilience import CircuitBreaker, CircuitOpenError
+
+
+async def _slow():
+    await asyncio.sleep(10)
+
+
+async def _ok():
+    return "ok"
+
+
+def _half_open(breaker: CircuitBreaker):
+    breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout
+    assert breaker.state == "half_open"
+
+
+def test_cancelled_trial_counts_as_failure_and_frees_the_trial():
+    async def run():
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+        _half_open(breaker)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(breaker.call(_slow), 0.01)
+        assert not breaker.trial_in_flight
+        # The failed trial reopened the breaker
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+        breaker.opened_at -= breaker.reset_timeout
+        assert await breaker.call(_ok) == "ok"
+        assert breaker.state == "closed"
+    asyncio.run(run())
+
+
+def test_timeouts_open_the_breaker():
+    async def run():
+        breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30.0)
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(breaker.call(_slow), 0.01)
+        assert breaker.state == "open"
+    asyncio.run(run())
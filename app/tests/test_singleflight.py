@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from src.deadline import MAX_BUDGET, DeadlineExceededError, degrade, is_degraded, remaining, start_request, timed
+from src.scheduler import current_user
+from src.singleflight import SingleFlight
+
+
+def test_callers_with_different_deadlines():
+    async def run():
+        flight = SingleFlight("test")
+        seen = {}
+
+        async def work():
+            seen["remaining"] = remaining()
+            seen["user"] = current_user.get()
+            with timed("work"):
+                await asyncio.sleep(0.2)
+            return "answer"
+
+        async def caller(user, budget):
+            current_user.set(user)
+            timings = start_request(budget)
+            result = await flight.do("key", work)
+            return result, timings
+
+        impatient = asyncio.ensure_future(caller("impatient", 0.05))
+        await asyncio.sleep(0.01)
+        patient = asyncio.ensure_future(caller("patient", 5.0))
+        with pytest.raises(DeadlineExceededError):
+            await impatient
+        result, timings = await patient
+        assert result == "answer"
+        assert flight.stats()["coalesced"] == 1
+        # The shared execution ran with neither the first caller's deadline nor its user
+        assert seen["remaining"] > MAX_BUDGET - 1
+        assert seen["user"] not in ("impatient", "patient")
+        assert timings["work"] >= 0.2
+    asyncio.run(run())
+
+
+def test_degraded_stages_reach_every_caller():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def work():
+            degrade("summary")
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def caller():
+            start_request(5.0)
+            await flight.do("key", work)
+            return is_degraded()
+
+        assert await asyncio.gather(caller(), caller()) == [True, True]
+    asyncio.run(run())
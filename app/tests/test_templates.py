@@ -0,0 +1,25 @@
+import re
+from src.templates import MAX_LISTED, render_outlet_answer, render_product_answer
+
+
+def test_outlet_answer_lists_max_items_and_counts_the_rest():
+    rows = [{"name": f"Outlet {i}", "address": f"{i} Jalan Test"} for i in range(MAX_LISTED + 2)]
+    answer = render_outlet_answer("Which outlets are in Shah Alam?", "SELECT * FROM outlets", rows, "en")
+    items = [line for line in answer.splitlines() if re.match(r"\d+\. ", line)]
+    assert len(items) == MAX_LISTED
+    assert items[-1].startswith(f"{MAX_LISTED}. Outlet {MAX_LISTED - 1}")
+    assert answer.splitlines()[-1] == "...and 2 more."
+
+
+def test_product_answer_lists_max_items_and_counts_the_rest():
+    products = [{"name": f"Tumbler {i}", "price": 50} for i in range(MAX_LISTED + 3)]
+    answer = render_product_answer("Which tumblers do you sell?", products, "en")
+    items = [line for line in answer.splitlines() if re.match(r"\d+\. ", line)]
+    assert len(items) == MAX_LISTED
+    assert answer.splitlines()[-1] == "...and 3 more."
+
+
+def test_short_answer_is_not_cut():
+    rows = [{"name": f"Outlet {i}"} for i in range(MAX_LISTED)]
+    answer = render_outlet_answer("Which outlets are in Shah Alam?", "SELECT * FROM outlets", rows, "en")
+    assert len(answer.splitlines()) == MAX_LISTED + 1
@@ -0,0 +1,193 @@
+"""Offline load test of the real FastAPI app against stub LLM, embedding and vector backends.
+
+Drives /chat, /products and /outlets through an in-process ASGI client at the
+given concurrency, and reports throughput, p50/p95/p99 latency and mean time
+per upstream stage (from the app's own stage histograms) for each endpoint.
+Needs no keys: see bench/stubs.py for the stand-ins and their latencies.
+
+Results can be saved as a baseline and later runs compared against it; the
+comparison exits non-zero when any latency percentile or the throughput
+regresses by more than --tolerance. The stub latencies dominate, but event
+loop overhead does not, so compare runs from the same machine.
+
+Usage (from the repository root):
+    python bench/bench_app.py --requests 200 --concurrency 16 --output run.json
+    python bench/bench_app.py --baseline bench/baselines/offline.json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+
+from common import use_app_dir, user_path, percentile, load_queries
+
+use_app_dir()
+
+import httpx
+
+from stubs import install_stubs
+
+DEFAULT_QUERIES = [
+    "Where are ZUS Coffee outlets in Petaling Jaya?",
+    "Which outlets in Selangor open after 9pm?",
+    "List 5 outlets in Kuala Lumpur.",
+    "Show outlets with parking near Damansara.",
+    "Show me the top 3 black drinkware items.",
+    "Which ZUS tumblers are under RM50?",
+    "List elegant glass cups for gifts.",
+    "Do you have a stainless steel bottle?",
+]
+
+ENDPOINTS = ("chat", "products", "outlets")
+
+
+class _NoStore(dict):
+    """A cache that never keeps anything, so every request runs the pipeline"""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def configure_app(args):
+    from src import rate_limit, router
+
+    # The load test is the only client, so per-user rate limits would only measure themselves
+    rate_limit.GLOBAL_RATE_LIMIT = rate_limit.AUTH_RATE_LIMIT = 10 ** 9
+    if not args.cache:
+        router.chat_cache = _NoStore()
+        router.plan_cache = _NoStore()
+    tokens = [rate_limit.create_access_token({"sub": f"bench-user-{i}"}) for i in range(args.users)]
+    return [{"Authorization": f"Bearer {token}"} for token in tokens]
+
+
+def request_for(endpoint, query):
+    if endpoint == "chat":
+        return "POST", "/api/v1/chat", {"json": {"prompt": query}}
+    return "GET", f"/api/v1/{endpoint}", {"params": {"query": query}}
+
+
+def endpoint_queries(endpoint, queries):
+    from src.utils import classify_intent_local
+
+    if endpoint == "chat":
+        return queries
+    wanted = "product" if endpoint == "products" else "outlet"
+    return [q for q in queries if classify_intent_local(q) == wanted] or queries
+
+
+def stage_totals():
+    from src.metrics import stage_latency
+    return stage_latency.snapshot()
+
+
+def stage_breakdown(before, after, requests):
+    """Mean time per request and calls per request for each stage between two snapshots"""
+    breakdown = {}
+    for labels, series in after.items():
+        previous = before.get(labels, [0] * len(series))
+        calls = sum(series[:-1]) - sum(previous[:-1])
+        if calls:
+            breakdown[labels[0]] = {
+                "calls_per_request": calls / requests,
+                "mean_ms": (series[-1] - previous[-1]) / calls * 1000,
+            }
+    return breakdown
+
+
+async def drive(client, endpoint, queries, headers, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        method, url, kwargs = request_for(endpoint, queries[i % len(queries)])
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers[i % len(headers)], **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    before = stage_totals()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": args.requests,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": args.requests / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "stages": stage_breakdown(before, stage_totals(), args.requests),
+    }
+
+
+async def main_async(args):
+    await install_stubs(args.llm_latency, args.tokens_per_second, args.embedding_latency, args.vector_latency)
+    headers = configure_app(args)
+    queries = load_queries(args.queries, DEFAULT_QUERIES)
+
+    import app as server
+
+    transport = httpx.ASGITransport(app=server.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for endpoint in args.endpoints:
+            results[endpoint] = await drive(client, endpoint, endpoint_queries(endpoint, queries), headers, args)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Relative change per metric against a baseline, and whether any regressed past tolerance"""
+    report, regressed = {}, False
+    for endpoint, metrics in results.items():
+        old = baseline.get("results", {}).get(endpoint)
+        if not old:
+            continue
+        report[endpoint] = {}
+        for metric in ("throughput_rps", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms"):
+            change = (metrics[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            worse = -change if metric == "throughput_rps" else change
+            report[endpoint][metric] = {"baseline": old[metric], "current": metrics[metric], "change": round(change, 4)}
+            if worse > tolerance:
+                report[endpoint][metric]["regressed"] = True
+                regressed = True
+    return report, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=8, help="distinct authenticated users to spread requests over")
+    parser.add_argument("--cache", action="store_true", help="keep the chat answer cache enabled")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM base latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="stub LLM completion rate")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--vector-latency", type=float, default=0.02)
+    parser.add_argument("--output", help="write the results JSON here (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    output = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "python": platform.python_version(),
+        "results": asyncio.run(main_async(args)),
+    }
+    regressed = False
+    if args.baseline:
+        with open(user_path(args.baseline), "r", encoding="utf-8") as f:
+            output["comparison"], regressed = compare(output["results"], json.load(f), args.tolerance)
+    if args.output:
+        with open(user_path(args.output), "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+    print(json.dumps(output, indent=2))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark per-request auth overhead with and without the verified-token cache.
+
+Usage (from the repository root):
+    python bench/bench_auth.py --requests 50000 --tokens 50
+"""
+import time
+import random
+import argparse
+import statistics
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from jose import JWTError, jwt
+from src import rate_limit
+from src.rate_limit import create_access_token, resolve_identity, SECRET_KEY, ALGORITHM
+
+
+def baseline_identity(authorization: str):
+    """The pre-cache path: a full jwt.decode plus a separate header parse for the session id"""
+    token = authorization.split(" ", 1)[1]
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub") or "global_unauthenticated_user"
+    except JWTError:
+        user_id = "global_unauthenticated_user"
+    session_id = "global_unauthenticated_user"
+    if authorization.startswith("Bearer "):
+        session_id = authorization.split(" ", 1)[1]
+    return user_id, session_id
+
+
+def cached_identity(authorization: str):
+    return resolve_identity(authorization.split(" ", 1)[1])
+
+
+def run(fn, headers):
+    timings = []
+    for header in headers:
+        start = time.perf_counter()
+        fn(header)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:>10}: mean {statistics.mean(timings) * 1e6:8.2f} us  "
+          f"p50 {percentile(timings, 50) * 1e6:8.2f} us  p99 {percentile(timings, 99) * 1e6:8.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--tokens", type=int, default=50, help="distinct tokens in the workload")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tokens = [create_access_token({"sub": f"user{i}"}) for i in range(args.tokens)]
+    headers = [f"Bearer {rng.choice(tokens)}" for _ in range(args.requests)]
+
+    rate_limit.token_cache.clear()
+    baseline = run(baseline_identity, headers)
+    cached = run(cached_identity, headers)
+
+    print(f"{args.requests} requests over {args.tokens} distinct tokens")
+    report("baseline", baseline)
+    report("cached", cached)
+    print(f"speedup: {statistics.mean(baseline) / statistics.mean(cached):.1f}x  "
+          f"(cache hits {rate_limit.token_cache.hits}, misses {rate_limit.token_cache.misses})")
+
+
+if __name__ == "__main__":
+    main()
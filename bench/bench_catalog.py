@@ -0,0 +1,117 @@
+"""Benchmark ID-only vector queries with local catalog hydration against metadata-carrying ones.
+
+For each top_k, reports the JSON size of a Pinecone query response with and
+without metadata, and the time to parse it and turn its matches into product
+dicts: from the columnar catalog by id, or from each match's metadata as
+before. Also
+reports the per-worker memory of the catalog next to the row dicts it
+replaces, measured with tracemalloc. Runs offline on the product CSV.
+
+Usage (from the repository root):
+    python bench/bench_catalog.py --top-k 3 10 --repeat 20000
+"""
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+from types import SimpleNamespace
+
+from common import use_app_dir
+
+use_app_dir()
+
+from src.catalog import ProductCatalog
+from src.vectorstore import load_product_data, _hydrate
+from src import vectorstore
+
+
+def allocated(build):
+    """Bytes still allocated after build() returns, and its result"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, result
+
+
+def full_metadata(product):
+    # What the index used to store with every vector
+    text = f"{product['name']} {product['category_title']} {product['description']}"
+    return {"text": text, **{key: product[key] for key in
+                             ("name", "category_title", "image", "price", "color", "description")}}
+
+
+def product_from_metadata(match):
+    # How results were built when every vector carried the full product
+    return {key: match.metadata.get(key, "") for key in
+            ("name", "category_title", "image", "price", "color", "description")} | {"score": match.score}
+
+
+def response_body(matches, include_metadata):
+    body = {"matches": [
+        {"id": m.id, "score": m.score, "values": [], **({"metadata": m.metadata} if include_metadata else {})}
+        for m in matches
+    ], "namespace": ""}
+    return json.dumps(body, separators=(",", ":")).encode("utf-8")
+
+
+def parse(body):
+    return [SimpleNamespace(id=m["id"], score=m["score"], metadata=m.get("metadata")) for m in json.loads(body)["matches"]]
+
+
+def build_catalog():
+    catalog = ProductCatalog()
+    catalog.build(load_product_data())
+    return catalog
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    load_product_data()  # imports pandas, which would otherwise be counted below
+    records_bytes, records = allocated(load_product_data)
+    catalog_bytes, catalog = allocated(build_catalog)
+    vectorstore.product_catalog = catalog
+    rows = list(catalog.records())
+
+    results = {}
+    for top_k in args.top_k:
+        top_k = min(top_k, len(catalog))
+        with_metadata = [SimpleNamespace(id=catalog.ids[i], score=0.9 - i / 100, metadata=full_metadata(rows[i]))
+                         for i in range(top_k)]
+        full_body, ids_body = response_body(with_metadata, True), response_body(with_metadata, False)
+        results[f"top_{top_k}"] = {
+            "payload_bytes_with_metadata": len(full_body),
+            "payload_bytes_ids_only": len(ids_body),
+            "parse_and_hydrate_from_metadata_us": per_call_us(
+                lambda: [product_from_metadata(m) for m in parse(full_body)], args.repeat),
+            "parse_and_hydrate_from_catalog_us": per_call_us(lambda: _hydrate(parse(ids_body)), args.repeat),
+        }
+
+    print(json.dumps({
+        "products": len(catalog),
+        "memory": {
+            "row_dicts_bytes": records_bytes,
+            "catalog_bytes": catalog_bytes,
+            "catalog_estimated_bytes": catalog.memory_bytes(),
+        },
+        "queries": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
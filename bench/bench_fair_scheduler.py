@@ -0,0 +1,95 @@
+"""Simulate an abusive unauthenticated client against well-behaved users.
+
+Compares tail latency for the well-behaved users when upstream slots are
+handed out FIFO (a plain semaphore) against the weighted fair scheduler.
+Upstream calls are simulated with asyncio.sleep, so no keys are needed.
+
+Usage (from the repository root):
+    python bench/bench_fair_scheduler.py --duration 5 --capacity 8 --abusive 64 --users 10
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from src.limiter import OverloadedError
+from src.scheduler import FairScheduler
+from src.utils import UNAUTHENTICATED_USER
+
+
+class FifoSlots:
+    """The baseline: one shared FIFO queue in front of the upstream"""
+
+    def __init__(self, capacity):
+        self._semaphore = asyncio.Semaphore(capacity)
+
+    @asynccontextmanager
+    async def slot(self, user_id=None):
+        async with self._semaphore:
+            yield
+
+
+async def simulate(slots, args):
+    rng = random.Random(args.seed)
+    latencies = {"good": [], "abusive": []}
+    rejected = {"good": 0, "abusive": 0}
+    stop_at = time.monotonic() + args.duration
+
+    async def upstream():
+        await asyncio.sleep(max(0.005, rng.gauss(args.latency, args.latency / 5)))
+
+    async def client(kind, user_id, think):
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            try:
+                async with slots.slot(user_id):
+                    await upstream()
+                latencies[kind].append(time.monotonic() - start)
+            except OverloadedError:
+                rejected[kind] += 1
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(think)
+
+    clients = [client("abusive", UNAUTHENTICATED_USER, 0) for _ in range(args.abusive)]
+    clients += [client("good", f"user{i}", args.think) for i in range(args.users)]
+    await asyncio.gather(*clients)
+
+    def summary(kind):
+        values = latencies[kind]
+        return {
+            "completed": len(values),
+            "rejected": rejected[kind],
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+
+    return {"good_users": summary("good"), "abusive_client": summary("abusive")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--capacity", type=int, default=8, help="upstream concurrency")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean upstream latency in seconds")
+    parser.add_argument("--abusive", type=int, default=64, help="concurrent loops of the abusive client")
+    parser.add_argument("--users", type=int, default=10, help="well-behaved authenticated users")
+    parser.add_argument("--think", type=float, default=0.05, help="pause between a user's requests")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {
+        "fifo": asyncio.run(simulate(FifoSlots(args.capacity), args)),
+        "fair": asyncio.run(simulate(FairScheduler("sim", lambda: args.capacity), args)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
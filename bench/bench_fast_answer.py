@@ -0,0 +1,88 @@
+"""Benchmark template-rendered fast answers against the LLM summary chains.
+
+Retrieval (vector search / SQL) runs once per query up front, so the
+comparison isolates the summary step. Each mode is then driven at the given
+concurrency to report latency percentiles and throughput. Requires
+OPENAI_API_KEY and PINECONE_API_KEY.
+
+Usage (from the repository root):
+    python bench/bench_fast_answer.py --requests 40 --concurrency 8
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from common import use_app_dir, percentile, load_queries
+
+use_app_dir()
+
+DEFAULT_QUERIES = [
+    "Which outlets in Selangor open after 9pm?",
+    "Where are ZUS Coffee outlets in Petaling Jaya?",
+    "Show me the top 3 black drinkware items.",
+    "Which ZUS tumblers are under RM50?",
+]
+
+
+async def retrieve(router, query):
+    from src.utils import classify_intent_local, extract_top_k_from_query
+    from src.text2SQL import execute_sql_query
+
+    if classify_intent_local(query) == "outlet":
+        state = {"question": query, "query": await router._write_outlet_query(query)}
+        state = execute_sql_query(state, router.outlets_sql_db)
+        return lambda fast: router._summarize_outlets(dict(state), fast=fast)
+    products = await router.asearch_products(query, top_k=extract_top_k_from_query(query))
+    return lambda fast: router._summarize_products(query, products, fast)
+
+
+async def drive(summarizers, fast, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await summarizers[i % len(summarizers)](fast)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "throughput_rps": requests / elapsed,
+        "latency_mean_ms": statistics.mean(latencies) * 1000,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+async def main_async(args):
+    import app as server
+    from src import router, cache_warmer
+
+    # Warm-up traffic would compete with the measured requests
+    cache_warmer.WARMER_ENABLED = False
+    await server.startup_event()
+    queries = load_queries(args.queries, DEFAULT_QUERIES)
+    summarizers = [await retrieve(router, query) for query in queries]
+    return {
+        "llm_summary": await drive(summarizers, False, args.requests, args.concurrency),
+        "fast_answer": await drive(summarizers, True, args.requests, args.concurrency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Microbenchmark of per-request framework overhead: middleware, response encoding and cached bodies.
+
+Calls ASGI apps directly (no sockets and no HTTP client), so what is measured
+is the time FastAPI, Starlette and the app's own middleware spend per
+request. Three comparisons:
+
+- middleware: the security header and tracing middleware as
+  @app.middleware("http") (BaseHTTPMiddleware, as before) and as pure ASGI
+  (src.middleware), around an endpoint returning a small dict
+- encoding: a cached ProductResponse with five products returned the old
+  way (FastAPI validates it against response_model, then encodes it with the
+  stdlib json module), encoded with src.responses, and written out as the
+  stored bytes of a cached answer
+- app: the real app's /chat cache hit and the /outlets aggregate answer, with
+  the full dependency stack (auth, rate limit, deadline), against stubbed
+  backends; see bench/stubs.py
+
+Usage (from the repository root):
+    python bench/bench_framework.py --requests 20000 --concurrency 64
+"""
+import json
+import time
+import asyncio
+import argparse
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from stubs import install_stubs
+
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "Referrer-Policy": "no-referrer",
+    "Permissions-Policy": "geolocation=(), microphone=()",
+}
+
+
+def sample_answer():
+    from src.router import ProductResponse
+
+    products = [{
+        "name": f"ZUS All-Can Tumbler 500ml ({colour})", "category": "Tumbler", "price": "RM 79.00", "color": colour,
+        "image": f"https://shop.zuscoffee.com/cdn/shop/products/tumbler-{colour}.jpg",
+        "snippet": "Double-wall stainless steel keeps drinks cold for 24 hours and hot for 12. " * 3,
+        "score": 0.87 - i / 100,
+    } for i, colour in enumerate(("black", "white", "blue", "green", "pink"))]
+    return ProductResponse(summary="Here are the top 5 tumblers under RM100: " + "; ".join(p["name"] for p in products),
+                           retrieved_products=products)
+
+
+def legacy_middleware(app: FastAPI):
+    """The security header and tracing middleware as they were, on BaseHTTPMiddleware"""
+    from src.tracing import start_trace, end_trace, TRACE_HEADER
+
+    @app.middleware("http")
+    async def add_security_headers(request: Request, call_next):
+        response: Response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        root = start_trace(f"{request.method} {request.url.path}", request.headers.get("traceparent"))
+        try:
+            response: Response = await call_next(request)
+            root.set_attribute("http.status_code", response.status_code)
+        finally:
+            end_trace(root)
+        response.headers[TRACE_HEADER] = root.trace_id
+        return response
+
+
+def asgi_middleware(app: FastAPI):
+    from src.middleware import SecurityHeadersMiddleware, TraceMiddleware
+
+    app.add_middleware(SecurityHeadersMiddleware, headers=SECURITY_HEADERS)
+    app.add_middleware(TraceMiddleware)
+
+
+def middleware_app(add_middleware):
+    app = FastAPI()
+    add_middleware(app)
+
+    @app.get("/")
+    async def root():
+        return {"message": "ZUS Coffee Chatbot API", "version": "1.0.0", "status": "running"}
+    return app
+
+
+def encoding_apps():
+    from src.router import ProductResponse
+    from src.responses import FastJSONResponse, dumps
+
+    answer = sample_answer()
+    body = dumps(answer)
+    apps = {"validate_and_stdlib_json": FastAPI(default_response_class=JSONResponse),
+            "fast_json_response": FastAPI(default_response_class=FastJSONResponse),
+            "cached_bytes": FastAPI(default_response_class=FastJSONResponse)}
+
+    @apps["validate_and_stdlib_json"].get("/", response_model=ProductResponse)
+    async def validated():
+        return answer
+
+    @apps["fast_json_response"].get("/", response_model=ProductResponse)
+    async def encoded():
+        return FastJSONResponse(answer)
+
+    @apps["cached_bytes"].get("/", response_model=ProductResponse)
+    async def cached():
+        return FastJSONResponse(body)
+    return apps
+
+
+def make_call(app, method, path, body=b"", headers=()):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path.split("?")[0], "raw_path": path.split("?")[0].encode(), "root_path": "",
+        "query_string": path.partition("?")[2].encode(), "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-length", str(len(body)).encode()),
+                    (b"content-type", b"application/json"), *headers],
+    }
+
+    async def call():
+        sent = False
+        status = 0
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Like uvicorn: the client is connected until the response is complete
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                done.set()
+
+        await app(dict(scope), receive, send)
+        return status
+    return call
+
+
+async def drive(call, requests, concurrency):
+    for _ in range(min(200, requests)):
+        await call()
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            status = await call()
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 1),
+        # Event loop time per request; latency at this concurrency includes queueing behind the others
+        "cpu_us_per_request": round(elapsed / requests * 1e6, 1),
+        "latency_p50_us": round(percentile(latencies, 50) * 1e6, 1),
+        "latency_p99_us": round(percentile(latencies, 99) * 1e6, 1),
+    }
+
+
+async def run(args):
+    await install_stubs(0.0, 1e9, 0.0, 0.0)
+    from src import rate_limit, router
+
+    # The benchmark is the only client; a short window keeps the per-user request log from growing into the measurement
+    rate_limit.GLOBAL_RATE_LIMIT = rate_limit.AUTH_RATE_LIMIT = 10 ** 9
+    rate_limit.GLOBAL_TIME_WINDOW_SECONDS = rate_limit.AUTH_TIME_WINDOW_SECONDS = 0.01
+    results = {"middleware": {}, "encoding": {}, "app": {}}
+    for name, add in (("base_http_middleware", legacy_middleware), ("pure_asgi", asgi_middleware)):
+        results["middleware"][name] = await drive(make_call(middleware_app(add), "GET", "/"), args.requests, args.concurrency)
+    for name, app in encoding_apps().items():
+        results["encoding"][name] = await drive(make_call(app, "GET", "/"), args.requests, args.concurrency)
+
+    import app as server
+
+    token = rate_limit.create_access_token({"sub": "bench-user"})
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    prompt = "Which ZUS tumblers are under RM100?"
+    key = (router.normalize_prompt(prompt), router.data_version)
+    router.chat_cache[key] = sample_answer()
+    calls = {
+        "chat_cache_hit": make_call(server.app, "POST", "/api/v1/chat", json.dumps({"prompt": prompt}).encode(), headers),
+        "outlets_aggregate": make_call(server.app, "GET", "/api/v1/outlets?query=how+many+outlets+in+selangor",
+                                       headers=headers),
+    }
+    for name, call in calls.items():
+        results["app"][name] = await drive(call, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    from src.responses import ENCODER_NAME
+
+    output = {"requests": args.requests, "concurrency": args.concurrency, "json_encoder": ENCODER_NAME,
+              "results": asyncio.run(run(args))}
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Benchmark pooled keep-alive HTTP clients against a new connection per request.
+
+Sends the same requests two ways: through one client with the app's pool
+settings (src.http_clients), and through a fresh client per request, which
+pays TCP and TLS setup every time. Reports per-request latency for each, how many
+connections the server accepted, and the setup time saved per request.
+
+By default the target is a local HTTPS server with a throwaway self-signed
+certificate (needs the openssl command; plain HTTP otherwise).
+--connect-delay-ms adds a delay to every new connection's first response,
+standing in for the extra round trips of a handshake to a remote API.
+Pass --url to measure a real endpoint instead; any status code counts.
+
+Usage (from the repository root):
+    python bench/bench_http_clients.py --requests 200 --concurrency 8
+    python bench/bench_http_clients.py --connect-delay-ms 40
+    python bench/bench_http_clients.py --url https://api.openai.com/v1/models
+"""
+import os
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from src.http_clients import HttpClients, http_config
+
+BODY = json.dumps({"matches": [{"id": "prod-1", "score": 0.9}]}).encode()
+
+
+class LocalServer:
+    """Minimal HTTP/1.1 keep-alive server that counts accepted connections"""
+
+    def __init__(self, connect_delay: float, tls: bool):
+        self.connect_delay = connect_delay
+        self.tls = tls
+        self.connections = 0
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def _ssl_context(self):
+        cert, key = os.path.join(self._tmp.name, "cert.pem"), os.path.join(self._tmp.name, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                        "-keyout", key, "-out", cert], check=True, capture_output=True)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        return context
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        first = True
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length:
+                    await reader.readexactly(length)
+                if first and self.connect_delay:
+                    await asyncio.sleep(self.connect_delay)
+                first = False
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n%s" % (len(BODY), BODY))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        context = None
+        if self.tls:
+            try:
+                context = self._ssl_context()
+            except (OSError, subprocess.CalledProcessError):
+                self.tls = False
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0, ssl=context)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"{'https' if self.tls else 'http'}://localhost:{port}/query"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self._tmp.cleanup()
+
+
+async def drive(send, requests, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await send()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+def summary(latencies, elapsed):
+    return {
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+async def run(args):
+    server = None
+    url = args.url
+    if not url:
+        server = LocalServer(args.connect_delay_ms / 1000, tls=not args.plain)
+        url = await server.start()
+    verify = bool(args.url)  # the local certificate is self-signed
+    payload = {"vector": [0.1] * 8, "topK": 3}
+
+    # The app's pool settings for Pinecone; certificate checks are off only for the throwaway local certificate
+    options = HttpClients(http_config).client_options("pinecone")
+    pooled = httpx.AsyncClient(verify=verify, **options)
+
+    async def send_pooled():
+        await pooled.post(url, json=payload)
+
+    async def send_fresh():
+        async with httpx.AsyncClient(verify=verify, timeout=options["timeout"]) as client:
+            await client.post(url, json=payload)
+
+    results = {}
+    for mode, send in (("new_connection_per_request", send_fresh), ("pooled", send_pooled)):
+        await send()  # warm-up, so the pooled run starts with a live connection like a running server
+        accepted = server.connections if server else None
+        latencies, elapsed = await drive(send, args.requests, args.concurrency)
+        results[mode] = summary(latencies, elapsed)
+        if server:
+            results[mode]["connections_opened"] = server.connections - accepted
+
+    await pooled.aclose()
+    if server:
+        await server.stop()
+    saved = results["new_connection_per_request"]["mean_ms"] - results["pooled"]["mean_ms"]
+    return {
+        "target": url if args.url else f"local {'https' if server.tls else 'http'} server",
+        "connect_delay_ms": 0 if args.url else args.connect_delay_ms,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        **results,
+        "connection_setup_saved_ms_per_request": round(saved, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="measure a real endpoint instead of the local server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--connect-delay-ms", type=float, default=0.0,
+                        help="extra delay on each new connection, standing in for handshake round trips")
+    parser.add_argument("--plain", action="store_true", help="plain HTTP instead of HTTPS for the local server")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark the outlet aggregate fast path against scanning the outlets table.
+
+Each question is answered by src.outlet_aggregates (parse, one lookup or
+indexed join on the precomputed tables, template render) and, for
+comparison, by the kind of LIKE-scan SQL the LLM writes for it today. Both
+run against data/zus_outlets.db with no network calls; the LLM SQL-writing
+and summary calls the fast path also skips are not included. Reports
+per-answer latency percentiles in microseconds.
+
+Usage (from the repository root):
+    python bench/bench_outlet_aggregates.py --iterations 2000
+"""
+import json
+import time
+import sqlite3
+import argparse
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from src.outlet_aggregates import outlet_aggregates, refresh_outlet_aggregates
+
+DB_PATH = "data/zus_outlets.db"
+# Question, and an LLM-style query answering it from the outlets table alone
+QUERIES = [
+    ("How many outlets in Selangor?",
+     "SELECT COUNT(*) FROM outlets WHERE address LIKE '%Selangor%'"),
+    ("How many outlets offer delivery?",
+     "SELECT COUNT(*) FROM outlets WHERE services LIKE '%delivery%'"),
+    ("How many outlets in Petaling Jaya have dine-in?",
+     "SELECT COUNT(*) FROM outlets WHERE address LIKE '%Petaling Jaya%' AND services LIKE '%Dine-in%'"),
+    ("Which outlets have the best reviews?",
+     "SELECT name, address, reviews_average, reviews_count FROM outlets WHERE reviews_count >= 20 "
+     "ORDER BY reviews_average DESC, reviews_count DESC LIMIT 3"),
+    ("Top 5 most reviewed outlets in Kuala Lumpur",
+     "SELECT name, address, reviews_average, reviews_count FROM outlets WHERE address LIKE '%Kuala Lumpur%' "
+     "ORDER BY reviews_count DESC LIMIT 5"),
+]
+
+
+def measure(fn, iterations):
+    fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return {"p50_us": round(percentile(latencies, 50), 1), "p95_us": round(percentile(latencies, 95), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    refresh_outlet_aggregates(DB_PATH)
+    outlet_aggregates.open(DB_PATH)
+    conn = sqlite3.connect(DB_PATH)
+    results = []
+    for question, scan_sql in QUERIES:
+        answer = outlet_aggregates.answer(question)
+        results.append({
+            "question": question,
+            "answered": answer is not None,
+            "fast_path": measure(lambda: outlet_aggregates.answer(question), args.iterations),
+            "table_scan_sql": measure(lambda: conn.execute(scan_sql).fetchall(), args.iterations),
+        })
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""A/B benchmark of the three-call chat pipeline against the combined structured-output plan.
+
+Replays a query set through both pipelines and reports end-to-end latency,
+LLM round trips and token cost per mode. Requires OPENAI_API_KEY and
+PINECONE_API_KEY, since it runs the real chains.
+
+Usage (from the repository root):
+    python bench/bench_pipeline_ab.py --queries queries.txt --repeat 2
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from common import use_app_dir, percentile, load_queries
+
+use_app_dir()
+
+from langchain_community.callbacks import get_openai_callback
+
+DEFAULT_QUERIES = [
+    "Where are ZUS Coffee outlets in Petaling Jaya?",
+    "Which outlets in Selangor open after 9pm?",
+    "List outlets with self-pickup in Kuala Lumpur.",
+    "Show outlets with parking near Damansara.",
+    "Show me the top 3 black drinkware items.",
+    "Which ZUS tumblers are under RM50?",
+    "List elegant glass cups for gifts.",
+]
+
+MODES = ("three_call", "combined")
+
+
+async def replay(queries, repeat):
+    import app as server
+    from src import router, cache_warmer
+
+    # Warm-up traffic would compete with the measured requests
+    cache_warmer.WARMER_ENABLED = False
+    await server.startup_event()
+    results = {mode: [] for mode in MODES}
+    for round_ in range(repeat):
+        for i, query in enumerate(queries):
+            # Alternate the order so neither mode always benefits from a warm connection
+            for mode in (MODES if (round_ + i) % 2 == 0 else MODES[::-1]):
+                # Every round pays for its own plan, as a first-time question does
+                router.plan_cache.clear()
+                with get_openai_callback() as cb:
+                    start = time.perf_counter()
+                    try:
+                        await router.answer_with_mode(query, mode)
+                        ok = True
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - start
+                results[mode].append({
+                    "query": query,
+                    "ok": ok,
+                    "latency_s": elapsed,
+                    "llm_calls": cb.successful_requests,
+                    "prompt_tokens": cb.prompt_tokens,
+                    "completion_tokens": cb.completion_tokens,
+                    "cost_usd": cb.total_cost,
+                })
+    return results
+
+
+def summarize(records):
+    latencies = [r["latency_s"] for r in records]
+    return {
+        "requests": len(records),
+        "errors": sum(1 for r in records if not r["ok"]),
+        "latency_mean_s": statistics.mean(latencies),
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "llm_calls_per_request": statistics.mean(r["llm_calls"] for r in records),
+        "prompt_tokens_per_request": statistics.mean(r["prompt_tokens"] for r in records),
+        "completion_tokens_per_request": statistics.mean(r["completion_tokens"] for r in records),
+        "cost_usd_total": sum(r["cost_usd"] for r in records),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="write the raw records and summary as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries, DEFAULT_QUERIES)
+    results = asyncio.run(replay(queries, args.repeat))
+    summary = {mode: summarize(records) for mode, records in results.items()}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "records": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark reduced-dimension and quantized embeddings against full-precision search.
+
+For every combination of embedding size and code type, builds a
+LocalVectorIndex and reports recall@k against exact float32 search at the
+full size, query latency, and memory per 1M vectors: the scanned codes that
+stay resident, and the full-precision rows that re-ranking reads from the
+memory-mapped file. Shorter sizes keep the leading dimensions and
+re-normalize, like the `dimensions` parameter of text-embedding-3 models.
+
+By default the vectors are synthetic, clustered and with variance that
+decays across dimensions, so recall figures are only indicative; pass real
+embeddings (an N x D .npy file) with --vectors for numbers that hold.
+
+Usage (from the repository root):
+    python bench/bench_quantization.py --count 20000 --queries 200
+    python bench/bench_quantization.py --vectors embeddings.npy --dimensions 1536 512 256
+"""
+import json
+import time
+import argparse
+import numpy as np
+
+from common import use_app_dir, percentile, user_path
+
+use_app_dir()
+
+from src.vector_index import LocalVectorIndex, QUANTIZATIONS
+
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count, dimensions, clusters, seed):
+    """Clustered vectors whose leading dimensions carry the most variance"""
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dimensions) / 64.0)
+    centers = rng.standard_normal((clusters, dimensions)) * decay
+    noise = rng.standard_normal((count, dimensions)) * decay * 0.6
+    return normalize((centers[rng.integers(0, clusters, count)] + noise).astype(np.float32))
+
+
+def query_vectors(vectors, count, seed):
+    """Perturbed copies of stored vectors, so each query has a meaningful neighbourhood"""
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.choice(len(vectors), count, replace=False)
+    return normalize(vectors[rows] + rng.standard_normal((count, vectors.shape[1])).astype(np.float32) * 0.02)
+
+
+def truncate(matrix, dimensions):
+    return normalize(np.ascontiguousarray(matrix[:, :dimensions]))
+
+
+def run(index, queries, top_k, truth):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        matches = index.query(vector=query, top_k=top_k).matches
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({int(m.id) for m in matches} & expected) / top_k)
+    return latencies, float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", help="N x D .npy file of real embeddings (default: synthetic)")
+    parser.add_argument("--count", type=int, default=20000, help="synthetic vectors to generate")
+    parser.add_argument("--full-dimensions", type=int, default=1536)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[1536, 512, 256])
+    parser.add_argument("--quantizations", nargs="+", default=list(QUANTIZATIONS), choices=QUANTIZATIONS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = normalize(np.load(user_path(args.vectors)).astype(np.float32))
+    else:
+        vectors = synthetic_vectors(args.count, args.full_dimensions, max(8, args.count // 200), args.seed)
+    queries = query_vectors(vectors, min(args.queries, len(vectors)), args.seed)
+    # Ground truth: exact search on the full-size float32 vectors
+    truth = [set(np.argsort(-(vectors @ q))[:args.top_k].tolist()) for q in queries]
+
+    results = []
+    for dimensions in args.dimensions:
+        stored, asked = truncate(vectors, dimensions), truncate(queries, dimensions)
+        for quantization in args.quantizations:
+            for rerank in ([False] if quantization == "float32" else [False, True]):
+                index = LocalVectorIndex(dimensions, quantization, rerank=rerank, oversample=args.oversample)
+                index.upsert(vectors=[{"id": str(i), "values": row} for i, row in enumerate(stored)])
+                latencies, recall = run(index, asked, args.top_k, truth)
+                memory = index.memory_bytes()
+                per_million = 1_000_000 / len(vectors)
+                results.append({
+                    "dimensions": dimensions,
+                    "quantization": quantization,
+                    "rerank": rerank,
+                    f"recall_at_{args.top_k}": round(recall, 4),
+                    "p50_ms": round(percentile(latencies, 50), 3),
+                    "p95_ms": round(percentile(latencies, 95), 3),
+                    "resident_mb_per_1m": round(memory["codes"] * per_million / 2 ** 20, 1),
+                    "rerank_file_mb_per_1m": round(memory["full"] * per_million / 2 ** 20, 1) if rerank else 0,
+                })
+
+    print(json.dumps({
+        "vectors": len(vectors),
+        "source": args.vectors or "synthetic",
+        "baseline": f"exact float32 search at {vectors.shape[1]} dimensions",
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
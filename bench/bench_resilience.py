@@ -0,0 +1,92 @@
+"""Simulate a flaky vector store to show hedging and the circuit breaker at work.
+
+The upstream is an asyncio.sleep stand-in with a heavy latency tail and an
+optional outage window, so no keys are needed. Reports tail latency with and
+without hedged requests, and how many calls were served by the local fallback
+index while the breaker was open.
+
+Usage (from the repository root):
+    python bench/bench_resilience.py --requests 400 --concurrency 16 --tail 0.05
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from common import use_app_dir, percentile
+
+use_app_dir()
+
+from src import resilience
+from src.resilience import CircuitBreaker, LatencyTracker, resilient_call
+
+
+def make_upstream(args, rng, outage):
+    async def query():
+        now = time.monotonic()
+        if outage[0] <= now < outage[1]:
+            await asyncio.sleep(args.latency)
+            raise ConnectionError("simulated outage")
+        slow = rng.random() < args.tail
+        await asyncio.sleep(args.latency * (args.tail_factor if slow else rng.uniform(0.8, 1.2)))
+        return "vector"
+    return query
+
+
+async def simulate(args, hedge):
+    rng = random.Random(args.seed)
+    # Fresh tracker per run so hedge delays are learned from this run only
+    resilience.latency_tracker = LatencyTracker()
+    breaker = CircuitBreaker("sim", failure_threshold=args.threshold, reset_timeout=args.reset)
+    start = time.monotonic()
+    outage = (start + args.outage_start, start + args.outage_start + args.outage) if args.outage else (0, 0)
+    upstream = make_upstream(args, rng, outage)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, served = [], {"vector": 0, "fallback": 0}
+
+    async def one():
+        async with semaphore:
+            t0 = time.monotonic()
+            try:
+                await breaker.call(lambda: resilient_call("sim_query", upstream, hedge=hedge))
+                served["vector"] += 1
+            except Exception:
+                served["fallback"] += 1
+            latencies.append(time.monotonic() - t0)
+            await asyncio.sleep(args.interval)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return {
+        "served": served,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "breaker_state": breaker.state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.03, help="typical upstream latency in seconds")
+    parser.add_argument("--tail", type=float, default=0.05, help="fraction of calls that are slow")
+    parser.add_argument("--tail-factor", type=float, default=20.0, help="slow calls take this many times longer")
+    parser.add_argument("--interval", type=float, default=0.005, help="pause after each request")
+    parser.add_argument("--outage", type=float, default=0.0, help="seconds of hard failures (0 disables)")
+    parser.add_argument("--outage-start", type=float, default=0.3)
+    parser.add_argument("--threshold", type=int, default=5, help="breaker failure threshold")
+    parser.add_argument("--reset", type=float, default=0.5, help="breaker reset timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {
+        "no_hedge": asyncio.run(simulate(args, hedge=False)),
+        "hedged": asyncio.run(simulate(args, hedge=True)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
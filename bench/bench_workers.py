@@ -0,0 +1,156 @@
+"""Benchmark per-worker memory of naive multi-process startup against shared, memory-mapped startup.
+
+Starts N worker processes the way uvicorn does (spawn) and runs each
+worker's data startup in one of two modes:
+
+  naive   every worker parses the product CSV with pandas, builds the
+          catalog, outlet hours and schema registry itself, and reads the
+          local vector index file into private memory
+  shared  the parent builds the shared data once (src.preload) and every
+          worker maps those files and the vector index file read-only
+
+Each worker then serves a few vector queries and, once all workers are
+up, reports RSS, PSS (shared pages divided among the processes mapping
+them) and USS (private pages) from /proc/self/smaps_rollup, plus its
+startup time. A synthetic local vector index of --vectors rows stands in
+for the embedding matrix, since the product CSV alone is small. Linux only.
+
+Usage (from the repository root):
+    python bench/bench_workers.py --workers 4 --vectors 100000 --dimensions 512
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from common import use_app_dir
+
+use_app_dir()
+
+MB = 2 ** 20
+
+
+def memory_usage():
+    """RSS, PSS and USS of this process in bytes"""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def build_vector_file(path, count, dimensions, quantization, seed=7):
+    from src.vector_index import LocalVectorIndex
+    rng = np.random.default_rng(seed)
+    index = LocalVectorIndex(dimensions, quantization, path=path)
+    index.ids = [f"vec-{i}" for i in range(count)]
+    index.metadata = [{} for _ in range(count)]
+    index._set_rows(rng.standard_normal((count, dimensions), dtype=np.float32))
+    index.save()
+
+
+def worker(mode, shared_dir, vector_path, queries, barrier, results):
+    import stubs
+    stubs.use_offline_tokenizer()
+    from src import router  # the app's full import graph, as a uvicorn worker has it
+    from src.catalog import product_catalog
+    from src.outlets import outlet_table
+    from src.text2SQL import schema_registry
+    from src.local_index import fallback_index
+    from src.context_builder import precompute_snippets
+    from src.shared_data import read_array_file
+    from src.vector_index import LocalVectorIndex
+
+    start = time.perf_counter()
+    if mode == "naive":
+        from src.vectorstore import load_product_data
+        db_path = "data/zus_outlets.db"
+        product_catalog.build(load_product_data())
+        outlet_table.build_from_db(db_path)
+        schema_registry.refresh(db_path)
+        # What loading the embedding matrix without a shared mapping costs: a private copy per worker
+        header, sections = read_array_file(vector_path, "vectors", mmap=False)
+        index = LocalVectorIndex(header["dimensions"], header["quantization"])
+        index.ids, index.metadata = header["ids"], header["metadata"]
+        index._full, index._codes, index._scales = sections["full"], sections["codes"], sections.get("scales")
+    else:
+        from src.preload import load_shared_data
+        assert load_shared_data(shared_dir)
+        index = LocalVectorIndex.load(vector_path)
+    precompute_snippets(product_catalog.records())
+    fallback_index.build(product_catalog)
+    startup = time.perf_counter() - start
+
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        index.query(vector=rng.standard_normal(index.dimensions), top_k=10)
+    barrier.wait()  # every worker is mapped before any is measured, so PSS splits the shared pages
+    results.put({"pid": os.getpid(), "startup_s": startup, "pandas_loaded": "pandas" in sys.modules,
+                 **memory_usage()})
+    barrier.wait()
+
+
+def run_mode(mode, args, shared_dir, vector_path):
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(args.workers), context.Queue()
+    processes = [context.Process(target=worker, args=(mode, shared_dir, vector_path, args.queries, barrier, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=600) for _ in processes]
+    for process in processes:
+        process.join()
+    mean = lambda key: sum(r[key] for r in reports) / len(reports)
+    return {
+        "rss_mb_per_worker": round(mean("rss") / MB, 1),
+        "pss_mb_per_worker": round(mean("pss") / MB, 1),
+        "uss_mb_per_worker": round(mean("uss") / MB, 1),
+        "total_pss_mb": round(sum(r["pss"] for r in reports) / MB, 1),
+        "startup_s_per_worker": round(mean("startup_s"), 3),
+        "pandas_loaded": any(r["pandas_loaded"] for r in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--vectors", type=int, default=100000, help="rows in the synthetic local vector index")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--quantization", default="int8")
+    parser.add_argument("--queries", type=int, default=20, help="vector queries per worker before measuring")
+    args = parser.parse_args()
+
+    from src.preload import build_shared_data
+    with tempfile.TemporaryDirectory() as tmp:
+        vector_path = os.path.join(tmp, "vectors.zdat")
+        build_vector_file(vector_path, args.vectors, args.dimensions, args.quantization)
+        shared_dir = os.path.join(tmp, "shared")
+        start = time.perf_counter()
+        build_shared_data(shared_dir)
+        build_seconds = time.perf_counter() - start
+
+        results = {mode: run_mode(mode, args, shared_dir, vector_path) for mode in ("naive", "shared")}
+
+    print(json.dumps({
+        "workers": args.workers,
+        "vectors": args.vectors,
+        "dimensions": args.dimensions,
+        "quantization": args.quantization,
+        "shared_build_s": round(build_seconds, 3),
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_DIR, "app")
+# Where the script was started from, before use_app_dir() changes directory
+START_DIR = os.getcwd()
+
+
+def use_app_dir():
+    """Make `src.*` importable and resolve the config's relative data paths like the server does"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def user_path(path):
+    """Resolve a command-line path against the directory the script was started from"""
+    return os.path.join(START_DIR, path) if path else path
+
+
+def load_queries(path=None, default=()):
+    """Read one query per line from a file, or fall back to the given defaults"""
+    if not path:
+        return list(default)
+    with open(user_path(path), "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
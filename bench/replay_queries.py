@@ -0,0 +1,137 @@
+"""Replay captured /chat traffic against the app.
+
+Reads query logs written with query_log.enabled (gzip JSONL, rotated files
+included) and re-sends each prompt as its original user at the original
+spacing divided by --speed, or back to back with --speed 0. Without --url
+the real app runs in-process on the offline stubs from bench/stubs.py, so
+no keys are needed. Reports replayed latency and cache hit rate next to the
+recorded ones, and how often the replayed intent matches the recorded one.
+
+Usage (from the repository root):
+    python bench/replay_queries.py app/logs/queries*.jsonl.gz --speed 4
+    python bench/replay_queries.py app/logs/queries.jsonl.gz --url http://localhost:8000 --speed 1
+"""
+import glob
+import json
+import time
+import asyncio
+import argparse
+
+from common import use_app_dir, user_path, percentile
+
+use_app_dir()
+
+import httpx
+
+from src.query_log import read_records
+
+
+def load_records(patterns, limit=None):
+    paths = sorted({path for pattern in patterns for path in glob.glob(user_path(pattern))})
+    records = [r for r in read_records(paths) if r.get("endpoint") == "chat" and r.get("prompt")]
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def user_headers(records, in_process, token):
+    """Headers per recorded user: a fresh token per pseudonym in-process, or one shared token"""
+    if not in_process:
+        return {user: ({"Authorization": f"Bearer {token}"} if token else {}) for user in {r["user"] for r in records}}
+    from src.rate_limit import create_access_token
+    return {
+        user: {} if user == "anonymous" else {"Authorization": f"Bearer {create_access_token({'sub': f'replay-{user}'})}"}
+        for user in {r["user"] for r in records}
+    }
+
+
+def response_intent(body):
+    if "retrieved_products" in body:
+        return "product"
+    if "executed_sql_result" in body:
+        return "outlet"
+    return "clarify" if "message" in body else None
+
+
+async def replay(client, records, headers, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+    t0, start = records[0]["ts"], time.monotonic()
+
+    async def one(record):
+        if args.speed > 0:
+            await asyncio.sleep(max(0.0, start + (record["ts"] - t0) / args.speed - time.monotonic()))
+        async with semaphore:
+            sent = time.perf_counter()
+            response = await client.post("/api/v1/chat", json={"prompt": record["prompt"]}, headers=headers[record["user"]])
+            latency = time.perf_counter() - sent
+        body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+        results.append({
+            "latency_s": latency,
+            "status": response.status_code,
+            "intent": response_intent(body) if response.status_code == 200 else None,
+            "recorded": record,
+        })
+
+    await asyncio.gather(*(one(record) for record in records))
+    return results
+
+
+def summarize(results, elapsed):
+    replayed = [r["latency_s"] * 1000 for r in results]
+    recorded = [r["recorded"]["latency_ms"] for r in results if r["recorded"].get("latency_ms") is not None]
+    comparable = [r for r in results if r["intent"] and r["recorded"].get("intent")]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        "statuses": statuses,
+        "replayed_latency_ms": {p: percentile(replayed, p) for p in (50, 95, 99)},
+        "recorded_latency_ms": {p: percentile(recorded, p) for p in (50, 95, 99)},
+        "recorded_cache_hit_rate": sum(r["recorded"].get("cache") == "hit" for r in results) / len(results),
+        "intent_agreement": (sum(r["intent"] == r["recorded"]["intent"] for r in comparable) / len(comparable)
+                             if comparable else None),
+    }
+
+
+async def main_async(args, records):
+    in_process = not args.url
+    if in_process:
+        from stubs import install_stubs
+        from src import rate_limit
+        import app as server
+
+        await install_stubs(args.llm_latency)
+        if not args.keep_rate_limits:
+            rate_limit.GLOBAL_RATE_LIMIT = rate_limit.AUTH_RATE_LIMIT = 10 ** 9
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://replay", timeout=120)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    headers = user_headers(records, in_process, args.token)
+    async with client:
+        start = time.perf_counter()
+        results = await replay(client, records, headers, args)
+        return summarize(results, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="query log files or glob patterns")
+    parser.add_argument("--url", help="base URL of a running server; in-process with stubs when omitted")
+    parser.add_argument("--token", help="bearer token for every request when replaying against --url")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing scale; 2 = twice as fast, 0 = no pauses")
+    parser.add_argument("--concurrency", type=int, default=64, help="cap on requests in flight")
+    parser.add_argument("--limit", type=int, help="replay only the first N records")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM base latency (in-process only)")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep per-user rate limits (in-process only)")
+    args = parser.parse_args()
+
+    records = load_records(args.logs, args.limit)
+    if not records:
+        parser.error("no /chat records found in the given logs")
+    print(json.dumps(asyncio.run(main_async(args, records)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
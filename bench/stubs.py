@@ -0,0 +1,266 @@
+"""Deterministic offline stand-ins for OpenAI and Pinecone.
+
+`install_stubs` wires the real router, chains, limiters and SQLite database
+to a fake chat model, hash-based embeddings and an in-memory vector index,
+so the whole app can be driven without keys or network. Latencies are
+simulated with sleeps and are configurable, so results are comparable run
+to run.
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# The OpenAI client refuses to construct without a key, even though no request will be sent
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("PINECONE_API_KEY", "stub")
+
+from src.utils import classify_intent_local, extract_top_k_from_query
+from src.openai_chain import LimitedChatOpenAI
+
+EMBEDDING_DIM = 256
+LOCATIONS = (
+    "petaling jaya", "kuala lumpur", "selangor", "shah alam", "subang", "damansara",
+    "cheras", "puchong", "klang", "bangsar", "putrajaya", "cyberjaya", "seremban",
+)
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Sum of per-word pseudo-random vectors, so texts sharing words land close together"""
+    vector = np.zeros(dim)
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        seed = int.from_bytes(hashlib.sha1(word.encode()).digest()[:4], "little")
+        vector += np.random.default_rng(seed).standard_normal(dim)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatBackend(ChatOpenAI):
+    """Answers each of the app's prompts plausibly, after a latency of base + tokens / rate"""
+
+    base_latency: float = 0.2
+    tokens_per_second: float = 200.0
+    summary_tokens: int = 40
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        tool_calls = []
+        if "standalone question" in prompt:
+            content = fake_standalone(prompt)
+        elif "Classify each numbered user input" in prompt:
+            inputs = prompt.split("User inputs:", 1)[1].split("Respond with", 1)[0]
+            lines = re.findall(r"^\s*(\d+)\.\s*(.+)$", inputs, re.MULTILINE)
+            content = "\n".join(f"{n}: {self._intent(text)}" for n, text in lines)
+        elif "Classify the user's intent" in prompt:
+            content = self._intent(_field(prompt, "User input:"))
+        elif "query planner" in prompt:
+            question = _field(prompt, "User Question:")
+            intent = self._intent(question)
+            top_k = extract_top_k_from_query(question)
+            tool_calls = [{
+                "name": "QueryPlan",
+                "args": {
+                    "intent": intent,
+                    "sql": fake_sql(question, top_k) if intent == "outlet" else "",
+                    "product_query": question if intent == "product" else "",
+                    "top_k": top_k,
+                },
+                "id": "call_stub",
+                "type": "tool_call",
+            }]
+            content = ""
+        elif "SQL expert" in prompt:
+            question = _field(prompt, "Question:")
+            content = fake_sql(question, extract_top_k_from_query(question))
+        else:
+            content = " ".join(["Here is a short answer from the stub model."] * max(1, self.summary_tokens // 10))
+
+        completion_tokens = count_tokens(content) + 10 * len(tool_calls)
+        await asyncio.sleep(self.base_latency + completion_tokens / self.tokens_per_second)
+        usage = {
+            "prompt_tokens": count_tokens(prompt),
+            "completion_tokens": completion_tokens,
+            "total_tokens": count_tokens(prompt) + completion_tokens,
+        }
+        message = AIMessage(content=content, tool_calls=tool_calls)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": usage, "model_name": self.model_name},
+        )
+
+    @staticmethod
+    def _intent(text: str) -> str:
+        intent = classify_intent_local(text)
+        return "product" if intent == "general" else intent
+
+
+class StubChatModel(LimitedChatOpenAI, FakeChatBackend):
+    """The app's limited, scheduled, circuit-broken model with the fake backend underneath"""
+
+
+def _field(prompt: str, label: str) -> str:
+    match = re.search(re.escape(label) + r"\s*(.+)", prompt)
+    return match.group(1).strip() if match else prompt
+
+
+def fake_sql(question: str, top_k: int) -> str:
+    text = question.lower()
+    for location in LOCATIONS:
+        if location in text:
+            return f"SELECT * FROM outlets WHERE LOWER(address) LIKE '%{location}%' LIMIT {top_k};"
+    return f"SELECT * FROM outlets LIMIT {top_k};"
+
+
+def fake_standalone(prompt: str) -> str:
+    """Carry the last location mentioned in the conversation over to a follow-up that has none"""
+    history = prompt.split("Conversation so far:", 1)[-1].split("Latest message:", 1)[0].lower()
+    latest = _field(prompt, "Latest message:")
+    if any(location in latest.lower() for location in LOCATIONS):
+        return latest
+    mentioned = [(history.rfind(location), location) for location in LOCATIONS if location in history]
+    return f"{latest.rstrip('?.! ')} in {max(mentioned)[1]}?" if mentioned else latest
+
+
+class FakeAsyncOpenAI:
+    """Just enough of openai.AsyncOpenAI for the embeddings calls"""
+
+    def __init__(self, latency: float = 0.05):
+        self.embeddings = SimpleNamespace(create=self._create)
+        self.latency = latency
+
+    async def _create(self, input: List[str], model: str, dimensions: Optional[int] = None):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=fake_embedding(text, dimensions or EMBEDDING_DIM), index=i) for i, text in enumerate(input)],
+            usage=SimpleNamespace(prompt_tokens=sum(count_tokens(text) for text in input)),
+        )
+
+
+class ApproximateEncoding:
+    """About four characters per token, for when tiktoken cannot download its BPE files"""
+
+    def encode(self, text: str) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+def use_offline_tokenizer():
+    from src import context_builder
+    try:
+        context_builder._encoding()
+    except Exception:
+        context_builder._encoding = ApproximateEncoding
+
+
+class InMemoryIndex:
+    """A brute-force cosine index with the parts of the Pinecone Index API the app uses"""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, EMBEDDING_DIM))
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        rows = {pid: i for i, pid in enumerate(self.ids)}
+        new = []
+        for vector in vectors:
+            if vector["id"] in rows:
+                self.matrix[rows[vector["id"]]] = vector["values"]
+                self.metadata[rows[vector["id"]]] = vector.get("metadata", {})
+            else:
+                rows[vector["id"]] = len(self.ids)
+                self.ids.append(vector["id"])
+                self.metadata.append(vector.get("metadata", {}))
+                new.append(np.array(vector["values"])[None, :])
+        if new:
+            self.matrix = np.vstack([self.matrix] + new)
+
+    def update(self, id: str, set_metadata: Dict[str, Any] = None, **kwargs):
+        row = self.ids.index(id)
+        self.metadata[row] = {**self.metadata[row], **(set_metadata or {})}
+
+    def delete(self, ids: List[str], **kwargs):
+        removed = set(ids)
+        keep = [i for i, pid in enumerate(self.ids) if pid not in removed]
+        self.ids = [self.ids[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.matrix = self.matrix[keep]
+
+    def fetch(self, ids: List[str], **kwargs):
+        rows = {pid: i for i, pid in enumerate(self.ids)}
+        return SimpleNamespace(vectors={
+            pid: SimpleNamespace(id=pid, values=self.matrix[rows[pid]].tolist(), metadata=self.metadata[rows[pid]])
+            for pid in ids if pid in rows
+        })
+
+    def list(self, **kwargs):
+        for start in range(0, len(self.ids), 100):
+            yield self.ids[start:start + 100]
+
+    def query(self, vector: List[float], top_k: int = 3, include_metadata: bool = False, **kwargs):
+        # Called from a worker thread by the app, so a blocking sleep is what Pinecone would cost
+        time.sleep(self.latency)
+        scores = self.matrix @ np.array(vector)
+        top = np.argsort(-scores)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=self.ids[i], score=float(scores[i]),
+                            metadata=self.metadata[i] if include_metadata else None)
+            for i in top
+        ])
+
+    def describe_index_stats(self) -> Dict[str, int]:
+        return {"total_vector_count": len(self.ids)}
+
+
+async def install_stubs(llm_latency: float = 0.2, tokens_per_second: float = 200.0,
+                        embedding_latency: float = 0.05, vector_latency: float = 0.02,
+                        query_plan: bool = True) -> Optional[InMemoryIndex]:
+    """Initialize the app like startup_event does, but against the stand-ins"""
+    from src import openai_chain, vectorstore, router
+    from src.text2SQL import initialize_database
+    from src.context_builder import precompute_snippets
+    from src.local_index import fallback_index
+    from src.catalog import product_catalog
+
+    use_offline_tokenizer()
+    openai_chain.llm = StubChatModel(
+        model=openai_chain.llm.model_name, openai_api_key="stub", max_retries=0,
+        base_latency=llm_latency, tokens_per_second=tokens_per_second,
+    )
+    vectorstore.async_openai_client = FakeAsyncOpenAI(embedding_latency)
+
+    products = vectorstore.load_product_data()
+    precompute_snippets(products)
+    product_catalog.build(products)
+    fallback_index.build(product_catalog)
+    index = InMemoryIndex(vector_latency)
+    vectors = []
+    for pid, product in zip(product_catalog.ids, product_catalog.records()):
+        text = f"{product['name']} {product['category_title']} {product['description']}"
+        metadata = {key: product[key] for key in ("name", "category_title", "price")}
+        vectors.append({"id": pid, "values": fake_embedding(text), "metadata": metadata})
+    if vectors:
+        index.upsert(vectors)
+    vectorstore.pinecone_index = index
+
+    chains = await openai_chain.initialize_chains()
+    router.set_global_variables(
+        vectorstore.aget_openai_embedding, *chains[:3], index, await initialize_database(), chains[3],
+        openai_chain.create_query_plan_chain() if query_plan else None,
+    )
+    return index
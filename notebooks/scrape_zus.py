@@ -24,6 +24,8 @@ class GMapDetails:
     services: str = ""
     place_type: str = ""
     opens_at: str = ""
+    # The short link resolved to the full Google Maps URL, which carries the place's coordinates
+    maps_url: str = ""
 
 class ZUSScraper:
     def __init__(self, headless=True, base_delay=2):
@@ -312,6 +314,7 @@ class ZUSScraper:
                     services=services_list,
                     place_type=safe_find('//div[@class="LBgpqf"]//button[@class="DkEaL "]'),
                     opens_at=opens_at,
+                    maps_url=self.driver.current_url,
                 )
 
 
@@ -390,7 +393,7 @@ class ZUSScraper:
                     expanded_row = [
                         name,
                         final_address,
-                        outlet_link,
+                        details.maps_url or outlet_link,
                         details.reviews_count if details.reviews_count else 'N/A',
                         details.reviews_average if details.reviews_average else 'N/A',
                         details.phone_number if details.phone_number else 'N/A',
@@ -17,6 +17,18 @@ print(API_BASE_URL)
 
 USER_SESSION_PATH = os.path.join("data", "user_session.json")
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """One keep-alive connection pool to the API, shared by every script rerun and browser session"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=int(os.getenv("API_POOL_MAXSIZE", "10")),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -116,7 +128,7 @@ with st.sidebar:
             login_error = ""
             if submitted:
                 try:
-                    response = requests.post(
+                    response = get_http_session().post(
                         f"{API_BASE_URL}/login",
                         data={"username": username, "password": password},
                         timeout=10
@@ -154,7 +166,7 @@ with st.sidebar:
                 reg_submit = st.form_submit_button("Register")
             if reg_submit:
                 try:
-                    response = requests.post(
+                    response = get_http_session().post(
                         f"{API_BASE_URL}/register",
                         data={"username": reg_username, "password": reg_password},
                         timeout=10
@@ -192,7 +204,7 @@ with st.sidebar:
     st.header("🔧 API Status")
     # Check API health
     try:
-        health_response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        health_response = get_http_session().get(f"{API_BASE_URL}/health", timeout=5)
         if health_response.status_code == 200:
             st.success("✅ API Connected")
         else:
@@ -210,8 +222,10 @@ def get_auth_headers():
 def call_chat_api(prompt: str) -> Dict[str, Any]:
     """Call the chat API endpoint from the /zus-api backend"""
     headers = get_auth_headers()
+    # Leave the server a little less than our own timeout so it answers before we give up
+    headers["X-Request-Timeout-Ms"] = "28000"
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_BASE_URL}/chat",
             json={"prompt": prompt},
             headers=headers,